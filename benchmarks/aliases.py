@@ -0,0 +1,64 @@
+"""
+Alias lookup with a large amount of aliases.
+
+Compares the compiled AliasMatcher with the previous approach (dict of Path objects + walking `Path.parents`).
+    python benchmarks/aliases.py --aliases 10000
+"""
+import argparse
+import json
+from pathlib import PureWindowsPath
+
+from bench_utils import sr, measure
+
+
+def legacy_get_alias(executable_path, aliases_dict):
+    exe_path = PureWindowsPath(executable_path)
+    if exe_path in aliases_dict:
+        return aliases_dict[exe_path]
+
+    for parent in exe_path.parents:
+        if parent in aliases_dict:
+            return aliases_dict[parent]
+
+
+def gen_aliases(amount: int) -> list[dict]:
+    aliases = [{"value": f"D:\\SteamLibrary\\steamapps\\common\\Game {i} > Game {i}"} for i in range(amount - 2)]
+    aliases.append({"value": "E:\\Games\\* > *"})
+    aliases.append({"value": "C:\\Windows\\explorer.exe > Desktop"})
+    return aliases
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--aliases", type=int, default=10000, help="amount of aliases")
+    args = parser.parse_args()
+
+    settings = {sr.PN.PROP_ALIASES_LIST: gen_aliases(args.aliases)}
+    legacy_aliases = {PureWindowsPath(sr.parse_alias(i["value"])[0]): sr.parse_alias(i["value"])[1]
+                      for i in settings[sr.PN.PROP_ALIASES_LIST]}
+
+    deep_exe = f"D:\\SteamLibrary\\steamapps\\common\\Game {args.aliases // 2}\\bin\\win64\\shipping\\game.exe"
+    wildcard_exe = "E:\\Games\\Some Game\\bin\\game.exe"
+    unknown_exe = "F:\\Other\\Folder\\With\\Some\\Depth\\app.exe"
+
+    def matcher_uncached(path):
+        # Skip memo to measure the trie walk.
+        return sr.VARIABLES.aliases._match(path)
+
+    sr.parse_alias.cache_clear()
+    sr.AliasMatcher.compile_path.cache_clear()
+    results = {"benchmark": "aliases", "aliases": args.aliases,
+               "load_cold": measure(lambda: sr.load_aliases(settings), number=1, repeat=1)}
+    results["load_warm"] = measure(lambda: sr.load_aliases(settings), number=3, repeat=3)
+
+    for name, path in (("deep", deep_exe), ("wildcard", wildcard_exe), ("no_match", unknown_exe)):
+        results[name] = {
+            "legacy": measure(lambda: legacy_get_alias(path, legacy_aliases), number=5000),
+            "trie": measure(lambda: matcher_uncached(path), number=5000),
+            "memoized": measure(lambda: sr.get_alias(path, sr.VARIABLES.aliases), number=50000),
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Helpers shared by the benchmarks.
+"""
+import os
+import sys
+import timeit
+from pathlib import Path
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+sys.path[:0] = [str(BENCHMARKS_DIR), str(BENCHMARKS_DIR.parent)]
+
+import obspython as obs  # fake obspython from this directory
+import smart_replays as sr
+
+
+def create_settings_data(**values):
+    """
+    Creates script settings data object with default values (like OBS does) and applies `values` over them.
+    """
+    data = obs.obs_data_create()
+    sr.script_defaults(data)
+    for name, value in values.items():
+        data.values[name] = value
+    return data
+
+
+class FakeProcessInfoBackend(sr.ProcessInfoBackend):
+    """
+    Process info backend that knows only the processes of `FakeForegroundWindow`.
+    """
+    pins_pid = True
+
+    def __init__(self, processes: dict[int, str]):
+        self.processes = processes
+
+    def open_process(self, pid: int):
+        if pid not in self.processes:
+            raise OSError(f"No such process: {pid}")
+        return pid
+
+    def close_process(self, handle):
+        pass
+
+    def get_creation_time(self, handle) -> int:
+        return handle
+
+    def get_image_path(self, handle) -> Path:
+        return Path(self.processes[handle])
+
+
+class FakeForegroundWindow:
+    """
+    Foreground window provider for running the script without Windows.
+    `pid` is the process of the active window, `idle_seconds` is the time since the last user input.
+    """
+    def __init__(self, processes: dict[int, str]):
+        """
+        :param processes: {pid: executable path}
+        """
+        self.processes = processes
+        self.pid = next(iter(processes))
+        self.idle_seconds = 0
+
+    def activate(self, pid: int):
+        self.pid = pid
+
+
+def host_path(windows_path: str) -> str:
+    """
+    Maps a Windows path to the host OS (C:\\Games\\game.exe -> /c/Games/game.exe outside of Windows),
+    so `Path(...).stem` and friends behave the same way as on Windows.
+    """
+    if os.name == "nt":
+        return windows_path
+    return "/" + windows_path[0].lower() + windows_path[2:].replace("\\", "/")
+
+
+def install_fake_platform(processes: dict[int, str] | None = None) -> FakeForegroundWindow:
+    """
+    Replaces the Windows-only hooks of the script (active window, last input time, executable resolver).
+
+    :param processes: {pid: executable path}, by default a few games and a browser.
+    """
+    window = FakeForegroundWindow(processes or {
+        1000: host_path("C:\\Windows\\explorer.exe"),
+        1001: host_path("D:\\SteamLibrary\\steamapps\\common\\Game\\bin\\game.exe"),
+        1002: host_path("E:\\Games\\Other Game\\other.exe"),
+        1003: host_path("C:\\Program Files\\Browser\\browser.exe"),
+    })
+    sr.get_active_window_pid = lambda: window.pid
+    sr.get_time_since_last_input = lambda: window.idle_seconds
+    sr.VARIABLES.exe_resolver = sr.ExecutableResolver(FakeProcessInfoBackend(window.processes),
+                                                      max_size=sr.CONSTANTS.EXE_RESOLVER_CACHE_SIZE)
+    return window
+
+
+def measure(fn, number: int = 1000, repeat: int = 5) -> dict:
+    """
+    Runs `fn` `number` times, `repeat` times in a row.
+
+    :return: dict with the best and the median time per call (in microseconds).
+    """
+    timings = sorted(t / number * 1e6 for t in timeit.repeat(fn, number=number, repeat=repeat))
+    return {"best_us": round(timings[0], 3), "median_us": round(timings[len(timings) // 2], 3)}
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Stand-in for ffmpeg, so the remux pool can be run without ffmpeg.
+
+Copies the input file (-i) to the output file (the last argument), `-sseof` is ignored.
+With `-f concat` before the input, concatenates the files from the input list.
+With `-f null` only checks that the input file can be read.
+Set "ffmpeg executable" in the script settings to this file.
+"""
+import shutil
+import sys
+
+
+def main(args: list[str]) -> int:
+    input_index = args.index("-i")
+    src = args[input_index + 1]
+    if "concat" in args[:input_index] and args[args.index("concat") - 1] == "-f":
+        with open(src, "r", encoding="utf-8") as f:
+            files = [line[len("file '"):-1].replace("'\\''", "'") for line in f.read().splitlines() if line]
+        with open(args[-1], "wb") as out:
+            for i in files:
+                with open(i, "rb") as f:
+                    shutil.copyfileobj(f, out)
+        return 0
+
+    if args[-3:-1] == ["-f", "null"]:
+        with open(src, "rb") as f:
+            while f.read(1024 * 1024):
+                pass
+        return 0
+
+    shutil.copyfile(src, args[-1])
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main(sys.argv[1:]))
+    except (OSError, ValueError, IndexError) as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
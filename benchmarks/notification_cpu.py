@@ -0,0 +1,76 @@
+"""
+CPU time per popup notification.
+
+Runs the notification host (`smart_replays.py --notification-host`), sends it N notifications and
+measures CPU time of the host process. Host startup (interpreter + Tk init) is measured separately
+by a run without notifications and subtracted.
+
+Linux only: CPU time of the host is taken from `resource.getrusage(RUSAGE_CHILDREN)`, which doesn't exist
+on Windows. Needs a display, on a headless machine run it under Xvfb:
+    xvfb-run -a python benchmarks/notification_cpu.py --count 5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+SCRIPT_PATH = Path(__file__).resolve().parent.parent / "smart_replays.py"
+
+
+def run_host(count: int) -> tuple[float, float]:
+    """
+    Runs notification host, sends `count` notifications and waits until the host exits.
+
+    :return: (host CPU time, wall time) in seconds.
+    """
+    import resource  # Linux only, see the module docstring.
+
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.perf_counter()
+
+    process = subprocess.Popen([sys.executable, str(SCRIPT_PATH), "--notification-host"],
+                               stdin=subprocess.PIPE,
+                               stdout=subprocess.DEVNULL,
+                               text=True)
+    for i in range(count):
+        item = {"title": "Clip saved",
+                "message": f"Clip saved to D:\\Clips\\Some Game\\Some Game_01.01.2025_00-00-{i:02}.mkv",
+                "color": "#76B900",
+                "created_at": time.time()}
+        process.stdin.write(json.dumps(item) + "\n")
+    process.stdin.close()
+    process.wait()
+
+    wall_time = time.perf_counter() - start
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu_time = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+    return cpu_time, wall_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=5, help="amount of notifications")
+    args = parser.parse_args()
+
+    if not sys.platform.startswith("linux"):
+        sys.exit("This benchmark runs on Linux only (under Xvfb on a headless machine).")
+    if not os.environ.get("DISPLAY"):
+        sys.exit("No display found. Run this benchmark under Xvfb (xvfb-run -a python ...).")
+
+    startup_cpu, startup_wall = run_host(0)
+    total_cpu, total_wall = run_host(args.count)
+
+    print(json.dumps({
+        "benchmark": "notification_cpu",
+        "notifications": args.count,
+        "host_startup_cpu_s": round(startup_cpu, 4),
+        "cpu_per_notification_s": round((total_cpu - startup_cpu) / args.count, 4),
+        "wall_per_notification_s": round((total_wall - startup_wall) / args.count, 4),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""
+Minimal stand-in for the `obspython` module, so smart_replays.py can be imported and benchmarked without OBS.
+
+Only the functions used by the script are implemented. Behaviour mimics OBS where it matters for the script
+(data objects with default values, profile config, replay buffer output, timers, frontend callbacks).
+Put this directory first in `sys.path` before importing smart_replays.
+"""
+import json
+
+# -------------------- constants --------------------
+(OBS_FRONTEND_EVENT_STREAMING_STARTING, OBS_FRONTEND_EVENT_STREAMING_STARTED,
+ OBS_FRONTEND_EVENT_STREAMING_STOPPING, OBS_FRONTEND_EVENT_STREAMING_STOPPED,
+ OBS_FRONTEND_EVENT_RECORDING_STARTING, OBS_FRONTEND_EVENT_RECORDING_STARTED,
+ OBS_FRONTEND_EVENT_RECORDING_STOPPING, OBS_FRONTEND_EVENT_RECORDING_STOPPED,
+ OBS_FRONTEND_EVENT_SCENE_CHANGED, OBS_FRONTEND_EVENT_SCENE_LIST_CHANGED,
+ OBS_FRONTEND_EVENT_TRANSITION_CHANGED, OBS_FRONTEND_EVENT_TRANSITION_STOPPED,
+ OBS_FRONTEND_EVENT_TRANSITION_LIST_CHANGED, OBS_FRONTEND_EVENT_SCENE_COLLECTION_CHANGED,
+ OBS_FRONTEND_EVENT_SCENE_COLLECTION_LIST_CHANGED, OBS_FRONTEND_EVENT_PROFILE_CHANGED,
+ OBS_FRONTEND_EVENT_PROFILE_LIST_CHANGED, OBS_FRONTEND_EVENT_EXIT,
+ OBS_FRONTEND_EVENT_REPLAY_BUFFER_STARTING, OBS_FRONTEND_EVENT_REPLAY_BUFFER_STARTED,
+ OBS_FRONTEND_EVENT_REPLAY_BUFFER_STOPPING, OBS_FRONTEND_EVENT_REPLAY_BUFFER_STOPPED,
+ OBS_FRONTEND_EVENT_STUDIO_MODE_ENABLED, OBS_FRONTEND_EVENT_STUDIO_MODE_DISABLED,
+ OBS_FRONTEND_EVENT_PREVIEW_SCENE_CHANGED, OBS_FRONTEND_EVENT_SCENE_COLLECTION_CLEANUP,
+ OBS_FRONTEND_EVENT_FINISHED_LOADING, OBS_FRONTEND_EVENT_RECORDING_PAUSED,
+ OBS_FRONTEND_EVENT_RECORDING_UNPAUSED, OBS_FRONTEND_EVENT_TRANSITION_DURATION_CHANGED,
+ OBS_FRONTEND_EVENT_REPLAY_BUFFER_SAVED, OBS_FRONTEND_EVENT_VIRTUALCAM_STARTED,
+ OBS_FRONTEND_EVENT_VIRTUALCAM_STOPPED, OBS_FRONTEND_EVENT_TBAR_VALUE_CHANGED,
+ OBS_FRONTEND_EVENT_SCENE_COLLECTION_CHANGING, OBS_FRONTEND_EVENT_PROFILE_CHANGING,
+ OBS_FRONTEND_EVENT_SCRIPTING_SHUTDOWN, OBS_FRONTEND_EVENT_PROFILE_RENAMED,
+ OBS_FRONTEND_EVENT_SCENE_COLLECTION_RENAMED, OBS_FRONTEND_EVENT_THEME_CHANGED,
+ OBS_FRONTEND_EVENT_SCREENSHOT_TAKEN) = range(41)
+
+OBS_PATH_FILE, OBS_PATH_FILE_SAVE, OBS_PATH_DIRECTORY = range(3)
+OBS_TEXT_DEFAULT, OBS_TEXT_PASSWORD, OBS_TEXT_MULTILINE, OBS_TEXT_INFO = range(4)
+OBS_TEXT_INFO_NORMAL, OBS_TEXT_INFO_WARNING, OBS_TEXT_INFO_ERROR = range(3)
+OBS_COMBO_TYPE_INVALID, OBS_COMBO_TYPE_EDITABLE, OBS_COMBO_TYPE_LIST, OBS_COMBO_TYPE_RADIO = range(4)
+OBS_COMBO_FORMAT_INVALID, OBS_COMBO_FORMAT_INT, OBS_COMBO_FORMAT_FLOAT, OBS_COMBO_FORMAT_STRING = range(4)
+OBS_EDITABLE_LIST_TYPE_STRINGS, OBS_EDITABLE_LIST_TYPE_FILES, OBS_EDITABLE_LIST_TYPE_FILES_AND_URLS = range(3)
+OBS_GROUP_NORMAL, OBS_GROUP_CHECKABLE = 1, 2
+
+VERSION_STRING = "31.0.3"
+
+
+def obs_get_version_string():
+    return VERSION_STRING
+
+
+# -------------------- obs_data --------------------
+class _Data:
+    def __init__(self, values=None):
+        self.values = dict(values or {})
+        self.defaults = {}
+
+    def get(self, name, fallback):
+        if name in self.values:
+            return self.values[name]
+        return self.defaults.get(name, fallback)
+
+
+class _DataArray:
+    def __init__(self, items=None):
+        self.items = list(items or [])
+
+
+def obs_data_create():
+    return _Data()
+
+
+def obs_data_create_from_json(json_string):
+    return _Data(json.loads(json_string))
+
+
+def obs_data_release(data):
+    pass
+
+
+def _to_json(value):
+    if isinstance(value, _Data):
+        return {**{k: _to_json(v) for k, v in value.defaults.items()},
+                **{k: _to_json(v) for k, v in value.values.items()}}
+    if isinstance(value, _DataArray):
+        return [_to_json(i) for i in value.items]
+    return value
+
+
+def obs_data_get_json(data):
+    return json.dumps(_to_json(data))
+
+
+def obs_data_get_last_json(data):
+    return obs_data_get_json(data)
+
+
+def obs_data_get_string(data, name):
+    return data.get(name, "")
+
+
+def obs_data_get_int(data, name):
+    return int(data.get(name, 0))
+
+
+def obs_data_get_bool(data, name):
+    return bool(data.get(name, False))
+
+
+def obs_data_get_double(data, name):
+    return float(data.get(name, 0.0))
+
+
+def obs_data_get_array(data, name):
+    value = data.get(name, None)
+    if isinstance(value, list):
+        value = _DataArray(_Data(i) if isinstance(i, dict) else i for i in value)
+    return value or _DataArray()
+
+
+def _setter(kind):
+    def set_value(data, name, value):
+        getattr(data, kind)[name] = value
+    return set_value
+
+
+obs_data_set_string = obs_data_set_int = obs_data_set_bool = obs_data_set_double = obs_data_set_array = _setter("values")
+obs_data_set_default_string = obs_data_set_default_int = obs_data_set_default_bool = _setter("defaults")
+obs_data_set_default_double = obs_data_set_default_array = _setter("defaults")
+
+
+def obs_data_array_create():
+    return _DataArray()
+
+
+def obs_data_array_insert(array, index, data):
+    array.items.insert(index, data)
+
+
+def obs_data_array_count(array):
+    return len(array.items)
+
+
+def obs_data_array_item(array, index):
+    return array.items[index]
+
+
+def obs_data_array_release(array):
+    pass
+
+
+# -------------------- config --------------------
+PROFILE_CONFIG = {
+    ("Output", "Mode"): "Advanced",
+    ("AdvOut", "RecFilePath"): "/tmp/obs_records",
+    ("AdvOut", "RecRBTime"): 300,
+    ("AdvOut", "RecFormat2"): "mkv",
+    ("SimpleOutput", "FilePath"): "/tmp/obs_records",
+    ("SimpleOutput", "RecRBTime"): 300,
+}
+USER_CONFIG = {
+    ("Python", "Path64bit"): "/usr/bin",
+}
+
+
+class _Config:
+    def __init__(self, values):
+        self.values = values
+
+
+def obs_frontend_get_profile_config():
+    return _Config(PROFILE_CONFIG)
+
+
+def obs_frontend_get_global_config():
+    return _Config(USER_CONFIG)
+
+
+def obs_frontend_get_user_config():
+    return _Config(USER_CONFIG)
+
+
+def config_get_string(cfg, section, name):
+    value = cfg.values.get((section, name))
+    return None if value is None else str(value)
+
+
+def config_get_int(cfg, section, name):
+    return int(cfg.values.get((section, name), 0))
+
+
+def config_get_bool(cfg, section, name):
+    return bool(cfg.values.get((section, name), False))
+
+
+def config_get_double(cfg, section, name):
+    return float(cfg.values.get((section, name), 0.0))
+
+
+# -------------------- frontend --------------------
+class _Source:
+    def __init__(self, name):
+        self.name = name
+
+
+class _Output:
+    def __init__(self):
+        self.last_replay = ""
+        self.active = False
+
+
+CURRENT_SCENE = _Source("Replay")
+REPLAY_BUFFER = _Output()
+EVENT_CALLBACKS = []
+TIMERS = {}  # {callback: interval_ms}
+HOTKEYS = {}  # {hotkey_id: (name, description, callback)}
+
+
+def obs_frontend_add_event_callback(callback):
+    EVENT_CALLBACKS.append(callback)
+
+
+def obs_frontend_remove_event_callback(callback):
+    if callback in EVENT_CALLBACKS:
+        EVENT_CALLBACKS.remove(callback)
+
+
+def emit_event(event):
+    """
+    Not a part of OBS API. Calls all frontend event callbacks (like OBS does).
+    """
+    for callback in list(EVENT_CALLBACKS):
+        callback(event)
+
+
+def obs_frontend_get_current_scene():
+    return CURRENT_SCENE
+
+
+def obs_source_get_name(source):
+    return source.name
+
+
+def obs_source_release(source):
+    pass
+
+
+def obs_frontend_get_replay_buffer_output():
+    return REPLAY_BUFFER
+
+
+def obs_output_release(output):
+    pass
+
+
+def obs_output_get_proc_handler(output):
+    return output
+
+
+def obs_output_can_begin_data_capture(output, flags):
+    return not output.active
+
+
+def calldata_create():
+    return {}
+
+
+def calldata_destroy(cd):
+    pass
+
+
+def proc_handler_call(handler, name, cd):
+    if name == "get_last_replay":
+        cd["path"] = handler.last_replay
+    return True
+
+
+def calldata_string(cd, name):
+    return cd.get(name)
+
+
+def obs_frontend_replay_buffer_active():
+    return REPLAY_BUFFER.active
+
+
+def obs_frontend_replay_buffer_start():
+    REPLAY_BUFFER.active = True
+    emit_event(OBS_FRONTEND_EVENT_REPLAY_BUFFER_STARTED)
+
+
+def obs_frontend_replay_buffer_stop():
+    REPLAY_BUFFER.active = False
+    emit_event(OBS_FRONTEND_EVENT_REPLAY_BUFFER_STOPPED)
+
+
+def obs_frontend_replay_buffer_save():
+    emit_event(OBS_FRONTEND_EVENT_REPLAY_BUFFER_SAVED)
+
+
+# -------------------- timers / hotkeys --------------------
+def timer_add(callback, interval_ms):
+    TIMERS[callback] = interval_ms
+
+
+def timer_remove(callback):
+    TIMERS.pop(callback, None)
+
+
+def obs_hotkey_register_frontend(name, description, callback):
+    hotkey_id = len(HOTKEYS) + 1
+    HOTKEYS[hotkey_id] = (name, description, callback)
+    return hotkey_id
+
+
+def obs_hotkey_load(hotkey_id, data):
+    pass
+
+
+def obs_hotkey_save(hotkey_id):
+    return _DataArray()
@@ -0,0 +1,65 @@
+"""
+Settings access on the save path: OBS data reads (before) vs settings snapshot (after).
+
+"before" repeats the obs_data_get_* calls the save path made for every clip
+(on_buffer_save_callback, move_clip_file, gen_clip_base_name, notify, restart check).
+"after" reads the same values from ScriptSettings snapshot.
+"rebuild" is the cost of ScriptSettings.from_obs_data, paid once per script_update.
+
+The fake obspython only models the Python side of a call, so in OBS (SWIG boundary) the difference is bigger.
+    python benchmarks/save_path_settings.py
+"""
+import json
+
+from bench_utils import obs, sr, create_settings_data, measure
+
+PN = sr.PN
+
+
+def settings_before(data):
+    obs.obs_data_get_int(data, PN.PROP_POPUP_PATH_DISPLAY_MODE)
+    obs.obs_data_get_int(data, PN.PROP_CLIPS_NAMING_MODE)
+    obs.obs_data_get_string(data, PN.PROP_CLIPS_FILENAME_TEMPLATE)
+    obs.obs_data_get_string(data, PN.PROP_CLIPS_BASE_PATH)
+    obs.obs_data_get_bool(data, PN.PROP_CLIPS_SAVE_TO_FOLDER)
+    obs.obs_data_get_bool(data, PN.PROP_CLIPS_CREATE_LINKS)
+    obs.obs_data_get_string(data, PN.PROP_CLIPS_LINKS_FOLDER_PATH)
+    obs.obs_data_get_bool(data, PN.PROP_RESTART_BUFFER)
+    obs.obs_data_get_bool(data, PN.GR_SOUND_NOTIFICATION_SETTINGS)
+    obs.obs_data_get_bool(data, PN.GR_POPUP_NOTIFICATION_SETTINGS)
+    sr.get_obs_config("Python", "Path64bit", str, sr.ConfigTypes.USER)
+    obs.obs_data_get_bool(data, PN.PROP_NOTIFY_CLIPS_ON_SUCCESS)
+    obs.obs_data_get_string(data, PN.PROP_NOTIFY_CLIPS_ON_SUCCESS_PATH)
+    obs.obs_data_get_bool(data, PN.PROP_POPUP_CLIPS_ON_SUCCESS)
+
+
+def settings_after(settings: sr.ScriptSettings):
+    settings.popup_path_display_mode
+    settings.clips_naming_mode
+    settings.clips_filename_template
+    settings.clips_base_path
+    settings.clips_save_to_folder
+    settings.clips_create_links
+    settings.clips_links_folder_path
+    settings.restart_buffer
+    settings.python_exe
+    settings.sound_on_success
+    settings.sound_on_success_path
+    settings.popup_on_success
+
+
+def main():
+    data = create_settings_data(**{PN.GR_SOUND_NOTIFICATION_SETTINGS: True,
+                                   PN.PROP_NOTIFY_CLIPS_ON_SUCCESS: True})
+    settings = sr.ScriptSettings.from_obs_data(data)
+
+    print(json.dumps({
+        "benchmark": "save_path_settings",
+        "before": measure(lambda: settings_before(data), number=20000),
+        "after": measure(lambda: settings_after(settings), number=20000),
+        "rebuild": measure(lambda: sr.ScriptSettings.from_obs_data(data), number=2000),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+"""
+Load simulator: replays a session trace (hotkeys, alt-tabs, scene changes, frontend events) against the script
+at accelerated virtual time. Runs without OBS and Windows (fake obspython and platform hooks).
+
+The script sees virtual time (`time.time`, `time.monotonic`, `datetime.now`), OBS timers are fired
+by the virtual clock and REPLAY_BUFFER_SAVED comes a moment after the save request, with a replay file
+in the records folder. Callback durations, the clips pipeline and memory are measured in real time.
+
+Trace is a JSONL file, one event per line, sorted by "t" (seconds from the start of the session):
+    {"t": 0, "type": "buffer", "active": true}                          start / stop replay buffer
+    {"t": 12.5, "type": "hotkey", "name": "save_buffer_force_mode_1"}   press a script hotkey (PN.HK_*)
+    {"t": 14, "type": "focus", "pid": 1002}                             alt-tab (pids of install_fake_platform)
+    {"t": 20, "type": "scene", "name": "Gameplay"}                      switch scene
+    {"t": 30, "type": "event", "name": "RECORDING_STARTED"}             other event (OBS_FRONTEND_EVENT_<name>)
+Without --trace a synthetic session is generated, --save-trace writes it to a file.
+
+Results are printed (or written with --output) as JSON: sustained saves/sec, callbacks latency
+(percentiles and watchdog histograms), save pipeline stages and memory growth (tracemalloc).
+tracemalloc slows the run down several times, compare throughput with --memory-interval 0.
+    python benchmarks/simulator.py --hours 6 --saves 200 --alt-tab 20
+    python benchmarks/simulator.py --trace session.jsonl --speed 600 --set clips_trim_overlaps=true
+"""
+import argparse
+import heapq
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from datetime import datetime
+from pathlib import Path
+from threading import Lock
+
+# The script keeps its data (clips catalog, journals) in APPDATA, keep it away from the real one.
+SIMULATOR_ROOT = Path(tempfile.mkdtemp(prefix="smart_replays_sim_"))
+os.environ["APPDATA"] = str(SIMULATOR_ROOT / "appdata")
+
+from bench_utils import BENCHMARKS_DIR, obs, sr, create_settings_data, install_fake_platform
+
+SAVE_EVENT_DELAY = 0.5  # virtual seconds between a save request and REPLAY_BUFFER_SAVED (OBS writes the file)
+VIRTUAL_MONOTONIC_START = 100000.0  # the script treats 0 as "not set"
+SAVE_HOTKEYS = {  # hotkey: weight in synthetic traces
+    sr.PN.HK_SAVE_BUFFER_MODE_1: 70,
+    sr.PN.HK_SAVE_BUFFER_MODE_2: 10,
+    sr.PN.HK_SAVE_BUFFER_MODE_3: 5,
+    sr.PN.HK_SAVE_BUFFER_LAST_15: 5,
+    sr.PN.HK_SAVE_BUFFER_LAST_30: 5,
+    sr.PN.HK_SAVE_BUFFER_LAST_60: 5,
+}
+
+
+class VirtualClock:
+    """
+    Session time, moved forward by the simulator.
+    """
+    def __init__(self, start: datetime):
+        self.start = start.timestamp()
+        self.now = 0.0  # seconds from the start of the session
+
+    def time(self) -> float:
+        return self.start + self.now
+
+    def monotonic(self) -> float:
+        return VIRTUAL_MONOTONIC_START + self.now
+
+
+class VirtualTimeModule:
+    """
+    Stand-in for the `time` module of the script: wall clock and monotonic time are virtual,
+    perf counters and sleep are real.
+    """
+    def __init__(self, clock: VirtualClock):
+        self._clock = clock
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+    def time(self) -> float:
+        return self._clock.time()
+
+    def monotonic(self) -> float:
+        return self._clock.monotonic()
+
+
+def make_virtual_datetime(clock: VirtualClock) -> type:
+    class VirtualDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return cls.fromtimestamp(clock.time(), tz)
+
+    return VirtualDatetime
+
+
+def gen_trace(hours: float, saves: int, alt_tab: float, pids: list[int], seed: int) -> list[dict]:
+    """
+    Generates a session: the buffer is on all the time, alt-tabs every `alt_tab` seconds on average,
+    saves are spread randomly (some are double presses and some are preceded by a bookmark),
+    scenes are switched every ~30 minutes.
+    """
+    rnd = random.Random(seed)
+    duration = hours * 3600
+    trace = [{"t": 0, "type": "buffer", "active": True}]
+
+    t = 0
+    while (t := t + rnd.expovariate(1 / alt_tab)) < duration:
+        trace.append({"t": round(t, 3), "type": "focus", "pid": rnd.choice(pids)})
+
+    t = 0
+    while (t := t + rnd.expovariate(1 / 1800)) < duration:
+        trace.append({"t": round(t, 3), "type": "scene", "name": rnd.choice(("Gameplay", "Menu", "Desktop"))})
+
+    hotkeys, weights = list(SAVE_HOTKEYS), list(SAVE_HOTKEYS.values())
+    for t in (rnd.uniform(1, duration) for _ in range(saves)):
+        name = rnd.choices(hotkeys, weights)[0]
+        trace.append({"t": round(t, 3), "type": "hotkey", "name": name})
+        if rnd.random() < 0.05:  # impatient double press
+            trace.append({"t": round(t + 0.1, 3), "type": "hotkey", "name": name})
+        if rnd.random() < 0.2:
+            trace.append({"t": round(max(t - rnd.uniform(5, 60), 0), 3), "type": "hotkey",
+                          "name": sr.PN.HK_ADD_BOOKMARK})
+
+    trace.append({"t": round(duration, 3), "type": "buffer", "active": False})
+    trace.sort(key=lambda i: i["t"])
+    return trace
+
+
+def percentiles(values: list[float]) -> dict:
+    """
+    :return: count, nearest-rank p50 / p95 / p99 and max of `values` (in ms).
+    """
+    values = sorted(values)
+    result = {"count": len(values)}
+    for p in (50, 95, 99):
+        result[f"p{p}"] = round(values[max(-(-len(values) * p // 100) - 1, 0)], 3)
+    result["max"] = round(values[-1], 3)
+    return result
+
+
+class Simulator:
+    """
+    Replays a trace against the loaded script.
+
+    Trace events, OBS timers and delayed REPLAY_BUFFER_SAVED events share one queue ordered by virtual time.
+    OBS timers and the frontend replay buffer save are replaced by the simulator for the run.
+    """
+    def __init__(self, trace: list[dict], root: Path, speed: float, replay_size: int, memory_interval: float | None):
+        """
+        :param speed: virtual seconds per real second (0 - as fast as possible).
+        :param replay_size: size of replay files (in bytes).
+        :param memory_interval: interval of memory samples (in virtual seconds), None - memory is not traced.
+        """
+        self.trace = trace
+        self.speed = speed
+        self.replay_size = replay_size
+        self.memory_interval = memory_interval
+        self.records_path = root / "records"
+        self.clock = VirtualClock(datetime.now())
+        self.window = install_fake_platform()
+
+        self._queue: list[tuple] = []  # (virtual time, seq, kind, payload)
+        self._seq = 0
+        self._lock = Lock()
+        self._timers: dict = {}  # {callback: (interval in seconds, seq of scheduled call)}
+        self._hotkeys: dict = {}
+        self._last_input = 0.0
+        self._callbacks: dict[str, list[float]] = {}
+        self._memory: list[list[float]] = []
+        self._completed = 0
+        self.stats = {"save_requests": 0, "saved_events": 0, "max_backlog": 0}
+
+    def _push(self, at: float, kind: str, payload=None) -> int:
+        with self._lock:
+            self._seq += 1
+            heapq.heappush(self._queue, (at, self._seq, kind, payload))
+            return self._seq
+
+    def _timer_add(self, callback, interval_ms):
+        seq = self._push(self.clock.now + interval_ms / 1000, "timer", callback)
+        self._timers[callback] = (interval_ms / 1000, seq)
+
+    def _timer_remove(self, callback):
+        self._timers.pop(callback, None)
+
+    def _replay_buffer_save(self):
+        self._push(self.clock.now + SAVE_EVENT_DELAY, "saved")
+
+    def _measure(self, name: str, fn, *args):
+        start = time.perf_counter_ns()
+        fn(*args)
+        self._callbacks.setdefault(name, []).append((time.perf_counter_ns() - start) / 1e6)
+
+    def _write_replay(self) -> Path:
+        name = datetime.fromtimestamp(self.clock.time()).strftime("Replay %Y-%m-%d %H-%M-%S")
+        path, i = self.records_path / f"{name}.mkv", 1
+        while path.exists():
+            path, i = self.records_path / f"{name} ({i}).mkv", i + 1
+        path.write_bytes(b"\0" * self.replay_size)
+        return path
+
+    def _dispatch(self, kind: str, payload):
+        if kind == "timer":
+            callback, seq = payload
+            interval, current_seq = self._timers.get(callback, (None, None))
+            if seq != current_seq:  # removed or re-added
+                return
+            self._timers[callback] = (interval, self._push(self.clock.now + interval, "timer", callback))
+            self.window.idle_seconds = int(self.clock.now - self._last_input)
+            self._measure(f"timer:{callback.__name__}", callback)
+        elif kind == "saved":
+            obs.REPLAY_BUFFER.last_replay = str(self._write_replay())
+            self.stats["saved_events"] += 1
+            self._measure("event:REPLAY_BUFFER_SAVED", obs.emit_event, obs.OBS_FRONTEND_EVENT_REPLAY_BUFFER_SAVED)
+        else:
+            self._dispatch_trace_event(payload)
+
+    def _dispatch_trace_event(self, event: dict):
+        kind = event["type"]
+        if kind == "hotkey":
+            self._last_input = self.clock.now
+            if event["name"].startswith("save_buffer"):
+                self.stats["save_requests"] += 1
+            callback = self._hotkeys[event["name"]]
+            self._measure(f"hotkey:{event['name']}", callback, True)
+            callback(False)
+        elif kind == "focus":
+            self._last_input = self.clock.now
+            self.window.activate(event["pid"])
+        elif kind == "scene":
+            obs.CURRENT_SCENE.name = event["name"]
+            self._measure("event:SCENE_CHANGED", obs.emit_event, obs.OBS_FRONTEND_EVENT_SCENE_CHANGED)
+        elif kind == "buffer":
+            if event["active"]:
+                self._measure("event:REPLAY_BUFFER_STARTED", obs.obs_frontend_replay_buffer_start)
+            else:
+                self._measure("event:REPLAY_BUFFER_STOPPED", obs.obs_frontend_replay_buffer_stop)
+        elif kind == "event":
+            self._measure(f"event:{event['name']}", obs.emit_event, getattr(obs, f"OBS_FRONTEND_EVENT_{event['name']}"))
+        else:
+            raise ValueError(f"Unknown trace event type: {kind}")
+
+    def _count_completed(self, fn):
+        def wrapper(*args, **kwargs):
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._completed += 1
+        return wrapper
+
+    def _sample_memory(self):
+        snapshot = tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),
+                                                              tracemalloc.Filter(False, __file__)))
+        self._memory.append([round(self.clock.now), round(sum(i.size for i in snapshot.statistics("filename")) / 1024)])
+        return snapshot
+
+    def run(self, data) -> dict:
+        """
+        Loads the script with `data` settings, replays the trace, waits for the clips worker and unloads the script.
+        """
+        self.records_path.mkdir(parents=True, exist_ok=True)
+        for section in ("AdvOut", "SimpleOutput"):
+            obs.PROFILE_CONFIG[(section, "RecFilePath")] = str(self.records_path)
+        for event in self.trace:
+            self._push(event["t"], "trace", event)
+        end = self.trace[-1]["t"] if self.trace else 0
+
+        patches = ((obs, "timer_add", self._timer_add), (obs, "timer_remove", self._timer_remove),
+                   (obs, "obs_frontend_replay_buffer_save", self._replay_buffer_save),
+                   (sr, "process_clip_save_job", self._count_completed(sr.process_clip_save_job)),
+                   (sr, "time", VirtualTimeModule(self.clock)), (sr, "datetime", make_virtual_datetime(self.clock)))
+        originals = [(module, name, getattr(module, name)) for module, name, _ in patches]
+        for module, name, value in patches:
+            setattr(module, name, value)
+
+        try:
+            if self.memory_interval:
+                tracemalloc.start()
+            sr.script_load(data)
+            self._hotkeys = {name: callback for name, _, callback in obs.HOTKEYS.values()}
+            baseline = self._sample_memory() if self.memory_interval else None
+            next_sample = self.memory_interval
+
+            real_start = time.perf_counter()
+            while self._queue and self._queue[0][0] <= end:
+                with self._lock:
+                    at, seq, kind, payload = heapq.heappop(self._queue)
+                if self.speed and (delay := real_start + at / self.speed - time.perf_counter()) > 0:
+                    time.sleep(delay)
+                self.clock.now = at
+                if next_sample is not None and at >= next_sample:
+                    self._sample_memory()
+                    next_sample += self.memory_interval
+                self._dispatch(kind, (payload, seq) if kind == "timer" else payload)
+                self.stats["max_backlog"] = max(self.stats["max_backlog"], sr.VARIABLES.clips_worker._queue.qsize())
+
+            replayed_at = time.perf_counter()
+            sr.VARIABLES.clips_worker.submit(lambda: None).result()
+            drained_at = time.perf_counter()
+
+            memory = None
+            if baseline is not None:
+                diff = self._sample_memory().compare_to(baseline, "lineno")
+                memory = {"samples_kib": self._memory,
+                          "growth_kib": self._memory[-1][1] - self._memory[0][1],
+                          "peak_kib": max(i[1] for i in self._memory),
+                          "top_growth": {f"{i.traceback[0].filename}:{i.traceback[0].lineno}": round(i.size_diff / 1024)
+                                         for i in diff[:10] if i.size_diff > 0}}
+            pipeline = sr.VARIABLES.latency.summary()
+            watchdog = sr.VARIABLES.watchdog.get_stats()
+        finally:
+            if obs.REPLAY_BUFFER.active:
+                obs.obs_frontend_replay_buffer_stop()
+            sr.script_unload()
+            tracemalloc.stop()
+            for module, name, value in originals:
+                setattr(module, name, value)
+
+        real_seconds = drained_at - real_start
+        return {
+            "trace": {"events": len(self.trace), "virtual_hours": round(end / 3600, 3)},
+            "real_seconds": round(real_seconds, 3),
+            "drain_seconds": round(drained_at - replayed_at, 3),
+            "saves": {
+                "requested": self.stats["save_requests"],
+                "saved_events": self.stats["saved_events"],
+                "completed": self._completed,
+                "per_sec_sustained": round(self._completed / real_seconds, 3) if real_seconds else None,
+                "max_backlog": self.stats["max_backlog"],
+            },
+            "callbacks_ms": {name: percentiles(values) for name, values in sorted(self._callbacks.items())},
+            "watchdog": watchdog,
+            "pipeline_ms": pipeline,
+            "memory": memory,
+        }
+
+
+def parse_setting(value: str) -> tuple[str, object]:
+    name, _, raw = value.partition("=")
+    try:
+        return name, json.loads(raw)
+    except json.JSONDecodeError:
+        return name, raw
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trace", type=Path, help="JSONL trace to replay (synthetic session by default)")
+    parser.add_argument("--save-trace", type=Path, help="write the replayed trace to this file")
+    parser.add_argument("--hours", type=float, default=6, help="synthetic session length")
+    parser.add_argument("--saves", type=int, default=200, help="amount of saves in the synthetic session")
+    parser.add_argument("--alt-tab", type=float, default=30,
+                        help="avg seconds between alt-tabs in the synthetic session")
+    parser.add_argument("--seed", type=int, default=1, help="synthetic session seed")
+    parser.add_argument("--speed", type=float, default=0,
+                        help="virtual seconds per real second (0 - as fast as possible)")
+    parser.add_argument("--replay-size", type=int, default=64 * 1024, help="size of replay files (in bytes)")
+    parser.add_argument("--memory-interval", type=float, default=600,
+                        help="memory sample interval in virtual seconds (0 - don't trace memory)")
+    parser.add_argument("--set", action="append", default=[], type=parse_setting, metavar="PROP=VALUE",
+                        help="script setting (JSON value), e.g. clips_merge_window=30")
+    parser.add_argument("--output", type=Path, help="write results to this file")
+    args = parser.parse_args()
+
+    root = SIMULATOR_ROOT
+    try:
+        with redirect_stdout(sys.stderr):  # script log
+            window_pids = list(install_fake_platform().processes)
+            if args.trace:
+                with open(args.trace, "r", encoding="utf-8") as f:
+                    trace = [json.loads(line) for line in f if line.strip()]
+            else:
+                trace = gen_trace(args.hours, args.saves, args.alt_tab, window_pids, args.seed)
+            if args.save_trace:
+                args.save_trace.write_text("".join(json.dumps(i) + "\n" for i in trace), encoding="utf-8")
+
+            data = create_settings_data(**{sr.PN.PROP_CLIPS_BASE_PATH: str(root / "clips"),
+                                           sr.PN.PROP_FFMPEG_PATH: str(BENCHMARKS_DIR / "fake_ffmpeg.py"),
+                                           **dict(args.set)})
+            simulator = Simulator(trace, root, args.speed, args.replay_size, args.memory_interval or None)
+            results = simulator.run(data)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    results = {
+        "benchmark": "simulator",
+        "script_version": sr.CONSTANTS.VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "settings": dict(args.set),
+        **results,
+    }
+    text = json.dumps(results, indent=2)
+    if args.output:
+        args.output.write_text(text, encoding="utf-8")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
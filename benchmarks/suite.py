@@ -0,0 +1,233 @@
+"""
+Benchmark suite of the clip save path. Runs without OBS and Windows (fake obspython and platform hooks).
+
+Cases:
+    clip_name[<mode>]         capture_clip + gen_clip_base_name for every clip naming mode
+    get_alias[...]            alias lookup with a large alias set (trie walk and memoized)
+    gen_filename              filename template rendering
+    unique_name[crowded]      moving a clip into a crowded folder under a unique name (same name burst)
+    save_callback             save hotkey -> REPLAY_BUFFER_SAVED callback (time spent in OBS thread)
+    save_to_final_path        save hotkey -> clip in its folder (OBS thread + clips worker)
+    exe_history_tick          1 Hz exe history timer callback
+
+Results are printed (or written with --output) as JSON. Each case is checked against the max median
+from benchmarks/thresholds.json and, with --baseline, against the results of a previous run.
+Exit code is 1 if any case regressed.
+    python benchmarks/suite.py --output results.json
+    python benchmarks/suite.py --baseline results.json --tolerance 1.3
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+from pathlib import Path
+
+# The script keeps its data (clips catalog, journals) in APPDATA, keep it away from the real one.
+BENCH_ROOT = Path(tempfile.mkdtemp(prefix="smart_replays_bench_"))
+os.environ["APPDATA"] = str(BENCH_ROOT / "appdata")
+
+from bench_utils import BENCHMARKS_DIR, obs, sr, create_settings_data, install_fake_platform, measure
+
+THRESHOLDS_PATH = BENCHMARKS_DIR / "thresholds.json"
+
+
+def measure_each(fn, args: list, settle=None) -> dict:
+    """
+    Calls `fn` once for every item of `args` (for operations that can't be repeated on the same input).
+
+    :param settle: untimed function called after every call (e.g. waits for background work).
+
+    :return: dict with the best, the median and the max time per call (in microseconds).
+    """
+    timings = []
+    for i in args:
+        start = time.perf_counter()
+        fn(i)
+        timings.append((time.perf_counter() - start) * 1e6)
+        if settle is not None:
+            settle()
+    timings.sort()
+    return {"best_us": round(timings[0], 3), "median_us": round(timings[len(timings) // 2], 3),
+            "max_us": round(timings[-1], 3)}
+
+
+def gen_aliases(amount: int) -> list[dict]:
+    aliases = [{"value": f"D:\\SteamLibrary\\steamapps\\common\\Game {i} > Game {i}"} for i in range(amount - 2)]
+    aliases.append({"value": "E:\\Games\\* > *"})
+    aliases.append({"value": "C:\\Windows\\explorer.exe > Desktop"})
+    return aliases
+
+
+def bench_clip_names(cases: dict, scale: float):
+    data = create_settings_data()
+    sr.VARIABLES.settings = sr.ScriptSettings.from_obs_data(data)
+    sr.load_aliases(json.loads(obs.obs_data_get_json(data)))
+    window = install_fake_platform()
+    window.activate(1001)
+    sr.VARIABLES.clip_exe_history = sr.ExeHistory(max_size=300)
+    for i in range(300):
+        sr.VARIABLES.clip_exe_history.append(Path(window.processes[1001 + i % 3]))
+
+    for mode in sr.ClipNamingModes:
+        cases[f"clip_name[{mode.name}]"] = measure(
+            lambda: sr.gen_clip_base_name(sr.capture_clip(mode)), number=int(2000 * scale))
+
+
+def bench_aliases(cases: dict, scale: float, amount: int):
+    sr.load_aliases({sr.PN.PROP_ALIASES_LIST: gen_aliases(amount)})
+    deep_exe = f"D:\\SteamLibrary\\steamapps\\common\\Game {amount // 2}\\bin\\win64\\shipping\\game.exe"
+    unknown_exe = "F:\\Other\\Folder\\With\\Some\\Depth\\app.exe"
+
+    for name, path in (("deep", deep_exe), ("no_match", unknown_exe)):
+        cases[f"get_alias[{name}]"] = measure(lambda: sr.VARIABLES.aliases._match(path), number=int(5000 * scale))
+    cases["get_alias[memoized]"] = measure(lambda: sr.get_alias(deep_exe, sr.VARIABLES.aliases),
+                                           number=int(50000 * scale))
+
+
+def bench_gen_filename(cases: dict, scale: float):
+    dt = datetime.now()
+    template = obs.obs_data_get_string(create_settings_data(), sr.PN.PROP_CLIPS_FILENAME_TEMPLATE)
+    cases["gen_filename"] = measure(lambda: sr.gen_filename("Game", template, dt), number=int(20000 * scale))
+
+
+def bench_unique_names(cases: dict, scale: float, root: Path, files: int):
+    src_folder, dst_folder = root / "unique_src", root / "unique_dst"
+    src_folder.mkdir()
+    dst_folder.mkdir()
+    for i in range(files):
+        (dst_folder / f"Game_{i:06}.mkv").touch()
+    sources = []
+    for i in range(max(int(50 * scale), 5)):
+        sources.append(src_folder / f"Replay {i}.mkv")
+        sources[-1].touch()
+
+    allocator = sr.UniqueNameAllocator(max_folders=sr.CONSTANTS.KNOWN_FOLDERS_CACHE_SIZE)
+    allocator.prepare(dst_folder)
+    cases["unique_name[crowded]"] = measure_each(lambda src: allocator.move(src, dst_folder, "Game_same.mkv"),
+                                                 sources)
+
+
+def bench_save_path(cases: dict, scale: float, root: Path):
+    install_fake_platform().activate(1001)
+    records, clips = root / "records", root / "clips"
+    records.mkdir()
+    data = create_settings_data(**{sr.PN.PROP_CLIPS_BASE_PATH: str(clips),
+                                   sr.PN.PROP_CLIPS_NAMING_MODE: sr.ClipNamingModes.CURRENT_PROCESS.value,
+                                   sr.PN.PROP_RESTART_BUFFER: False,
+                                   sr.PN.PROP_CLIPS_SAVE_COALESCE_INTERVAL: 0})
+    sr.script_load(data)
+    obs.obs_frontend_replay_buffer_start()
+    try:
+        replays = []
+        for i in range(max(int(100 * scale), 5)):
+            replays.append(records / f"Replay {i}.mkv")
+            replays[-1].write_bytes(b"\0" * 1024)
+
+        def save(path: Path):
+            obs.REPLAY_BUFFER.last_replay = str(path)
+            sr.save_buffer_with_force_mode(sr.ClipNamingModes.CURRENT_PROCESS)
+
+        def wait_clips_worker():
+            sr.VARIABLES.clips_worker.submit(lambda: None).result()
+
+        def save_and_wait(path: Path):
+            save(path)
+            wait_clips_worker()
+
+        half = len(replays) // 2
+        # the clips worker is idle before every save, so it doesn't compete with the OBS thread.
+        cases["save_callback"] = measure_each(save, replays[:half], settle=wait_clips_worker)
+        cases["save_to_final_path"] = measure_each(save_and_wait, replays[half:])
+    finally:
+        obs.obs_frontend_replay_buffer_stop()
+        sr.script_unload()
+
+
+def bench_history_tick(cases: dict, scale: float):
+    window = install_fake_platform()
+    sr.VARIABLES.clip_exe_history = sr.ExeHistory(max_size=300)
+    pids = list(window.processes)
+    ticks = [0]
+
+    def tick():
+        ticks[0] += 1
+        if not ticks[0] % 7:  # alt-tab every 7 seconds
+            window.activate(pids[ticks[0] % len(pids)])
+        sr.append_clip_exe_history()
+
+    cases["exe_history_tick"] = measure(tick, number=int(20000 * scale))
+
+
+def check(cases: dict, thresholds: dict, baseline: dict | None, tolerance: float) -> list[str]:
+    """
+    :return: descriptions of regressed cases.
+    """
+    regressions = []
+    for name, result in cases.items():
+        limit = thresholds.get(name, {}).get("median_us")
+        if limit is not None and result["median_us"] > limit:
+            regressions.append(f"{name}: median {result['median_us']}us > threshold {limit}us")
+
+        previous = (baseline or {}).get("cases", {}).get(name)
+        if previous is not None and result["median_us"] > previous["median_us"] * tolerance:
+            regressions.append(f"{name}: median {result['median_us']}us > baseline "
+                               f"{previous['median_us']}us x {tolerance}")
+    return regressions
+
+
+def run_all(cases: dict, args: argparse.Namespace, root: Path):
+    bench_clip_names(cases, args.scale)
+    bench_aliases(cases, args.scale, args.aliases)
+    bench_gen_filename(cases, args.scale)
+    bench_unique_names(cases, args.scale, root, args.files)
+    bench_save_path(cases, args.scale, root)
+    bench_history_tick(cases, args.scale)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier of iterations amount")
+    parser.add_argument("--aliases", type=int, default=10000, help="amount of aliases")
+    parser.add_argument("--files", type=int, default=5000, help="amount of clips in the crowded folder")
+    parser.add_argument("--output", type=Path, help="write results to this file")
+    parser.add_argument("--baseline", type=Path, help="results of a previous run to compare with")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="allowed slowdown against the baseline")
+    parser.add_argument("--thresholds", type=Path, default=THRESHOLDS_PATH, help="max medians file")
+    args = parser.parse_args()
+
+    root = BENCH_ROOT
+    cases = {}
+    try:
+        with redirect_stdout(sys.stderr):  # script log
+            run_all(cases, args, root)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    thresholds = json.loads(args.thresholds.read_text(encoding="utf-8")) if args.thresholds.exists() else {}
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8")) if args.baseline else None
+    regressions = check(cases, thresholds, baseline, args.tolerance)
+
+    results = {
+        "benchmark": "suite",
+        "script_version": sr.CONSTANTS.VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "cases": cases,
+        "regressions": regressions,
+    }
+    text = json.dumps(results, indent=2)
+    if args.output:
+        args.output.write_text(text, encoding="utf-8")
+    print(text)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
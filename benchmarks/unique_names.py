@@ -0,0 +1,70 @@
+"""
+Unique clip name allocation in a folder with many clips and a burst of saves with the same name.
+
+Compares UniqueNameAllocator with the previous approach (makedirs + `Path.exists()` loop + rename + utime).
+    python benchmarks/unique_names.py --files 5000 --burst 20
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from bench_utils import sr
+
+
+def legacy_move(src: str, folder: Path, filename: str) -> Path:
+    os.makedirs(str(folder), exist_ok=True)
+    file_path = folder / filename
+    stem, suffix = file_path.stem, file_path.suffix
+    counter = 1
+    while file_path.exists():
+        file_path = folder / f"{stem} ({counter}){suffix}"
+        counter += 1
+    os.rename(src, str(file_path))
+    os.utime(folder)
+    return file_path
+
+
+def run(move, root: Path, files: int, burst: int) -> dict:
+    src_folder, dst_folder = root / "src", root / "dst"
+    src_folder.mkdir()
+    dst_folder.mkdir()
+    for i in range(files):
+        (dst_folder / f"Game_{i:06}.mkv").touch()
+    sources = []
+    for i in range(burst):
+        sources.append(src_folder / f"Replay {i}.mkv")
+        sources[-1].touch()
+
+    timings = []
+    for src in sources:
+        start = time.perf_counter()
+        move(str(src), dst_folder, "Game_same_second.mkv")
+        timings.append((time.perf_counter() - start) * 1e6)
+    timings.sort()
+    return {"first_us": round(timings[0], 3), "median_us": round(timings[len(timings) // 2], 3),
+            "max_us": round(timings[-1], 3), "total_us": round(sum(timings), 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=5000, help="amount of clips already in the folder")
+    parser.add_argument("--burst", type=int, default=20, help="amount of clips saved with the same name")
+    args = parser.parse_args()
+
+    results = {"benchmark": "unique_names", "files": args.files, "burst": args.burst}
+    for name, move in (("legacy", legacy_move),
+                       ("allocator", sr.UniqueNameAllocator(max_folders=sr.CONSTANTS.KNOWN_FOLDERS_CACHE_SIZE).move)):
+        root = Path(tempfile.mkdtemp(prefix="smart_replays_bench_"))
+        try:
+            results[name] = run(move, root, args.files, args.burst)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
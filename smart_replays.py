@@ -21,30 +21,67 @@ import json
 import traceback
 import webbrowser
 import os
-import winsound
 import subprocess
+import hashlib
+import sqlite3
+import argparse
 from tkinter import font as f
 from enum import Enum
 from threading import Lock
+from threading import Event
 from threading import Thread
+from threading import get_native_id as threading_get_native_id
+from threading import enumerate as threading_enumerate
+from queue import Queue
+from queue import Full
+from queue import Empty
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait as futures_wait
 from pathlib import Path
 from collections import deque
+from collections import OrderedDict
 from collections import defaultdict
 from urllib.request import urlopen
 from datetime import datetime
 from ctypes import wintypes
 from contextlib import suppress
+from contextlib import contextmanager
+from contextlib import nullcontext
+from functools import lru_cache
+from functools import wraps
+from html import escape as html_escape
+from fnmatch import translate as fnmatch_translate
 from typing import Any
+from typing import Callable
 
-if __name__ != '__main__':
+# The script is also imported without OBS by the processes of the catalog bootstrap pool (as __mp_main__).
+IS_OBS_SCRIPT = __name__ not in ('__main__', '__mp_main__')
+if IS_OBS_SCRIPT:
     import obspython as obs
 
+if sys.platform == "win32":
+    import winsound
+
 
 # -------------------- ui.py --------------------
 # This part of the script uses only when it is run as a main program, not imported by OBS.
 #
 # You can run this script to show notification:
 # python smart_replays.py <Notification Title> <Notification Text> <Notification Color>
+#
+# Or run it as a notification host (OBS does it by itself):
+# python smart_replays.py --notification-host
+# Host reads notifications from stdin (one JSON object per line) and shows them one by one.
+ANIMATION_FPS = 60
+ANIMATION_FRAME_INTERVAL = 1000 // ANIMATION_FPS  # ms
+
+
+def ease_out_cubic(progress: float) -> float:
+    return 1 - (1 - progress) ** 3
+
+
 class ScrollingText:
     def __init__(self,
                  canvas: tk.Canvas,
@@ -52,19 +89,18 @@ class ScrollingText:
                  visible_area_width,
                  start_pos,
                  font,
-                 delay: int = 10,
-                 speed=1,
+                 speed: float = 200,
                  on_finish_callback=None):
         """
         Scrolling text widget.
+        Text position is calculated from elapsed time, so scrolling speed doesn't depend on frame rate.
 
         :param canvas: canvas
         :param text: text
         :param visible_area_width: width of the visible area of the text
         :param start_pos: text's start position (most likely padding from left border)
         :param font: font
-        :param delay: Delay between text moves (in ms)
-        :param speed: scrolling speed
+        :param speed: scrolling speed (in px/s)
         :param on_finish_callback: callback function when text animation is finished
         """
 
@@ -73,7 +109,6 @@ class ScrollingText:
         self.area_width = visible_area_width
         self.start_pos = start_pos
         self.font = font
-        self.delay = delay
         self.speed = speed
         self.on_finish_callback = on_finish_callback
 
@@ -81,34 +116,54 @@ class ScrollingText:
         self.text_height = font.metrics("ascent") + font.metrics("descent")
         self.text_id = self.canvas.create_text(0, round(self.text_height / 2),
                                                anchor=tk.NW, text=self.text, font=self.font, fill="#ffffff")
-        self.text_curr_pos = start_pos
+        self.scroll_distance = max(self.start_pos + self.text_width - self.area_width, 0)
+        self.scrolled = 0
+        self.scroll_start_time: float | None = None
 
     def update_scroll(self):
-        if self.text_curr_pos + self.text_width > self.area_width:
-            self.canvas.move(self.text_id, -self.speed, 0)
-            self.text_curr_pos -= self.speed
+        if self.scroll_start_time is None:
+            self.scroll_start_time = time.perf_counter()
 
-            self.canvas.after(self.delay, self.update_scroll)
-        else:
-            if self.on_finish_callback:
-                self.on_finish_callback()
+        elapsed = time.perf_counter() - self.scroll_start_time
+        target = min(round(elapsed * self.speed), self.scroll_distance)
+        if target != self.scrolled:
+            self.canvas.move(self.text_id, self.scrolled - target, 0)
+            self.scrolled = target
+
+        if self.scrolled < self.scroll_distance:
+            self.canvas.after(ANIMATION_FRAME_INTERVAL, self.update_scroll)
+        elif self.on_finish_callback:
+            self.on_finish_callback()
 
 
 class NotificationWindow:
     def __init__(self,
+                 root: tk.Tk,
                  title: str,
                  message: str,
-                 primary_color: str = "#78B900"):
+                 primary_color: str = "#78B900",
+                 on_close_callback=None):
+        """
+        Notification popup.
+
+        :param root: Tk root. It is not destroyed when the notification is closed, so it can be reused.
+        :param title: title
+        :param message: message
+        :param primary_color: color of the title and the side line
+        :param on_close_callback: callback function when notification is closed
+        """
         self.title = title
         self.message = message
         self.primary_color = primary_color
         self.bg_color = "#000000"
+        self.on_close_callback = on_close_callback
 
-        self.root = tk.Tk()
-        self.root.withdraw()
-        self.window = tk.Toplevel(bg="#000001")
+        self.root = root
+        self.window = tk.Toplevel(self.root, bg="#000001")
         self.window.overrideredirect(True)
-        self.window.attributes("-topmost", True, "-alpha", 0.99, "-transparentcolor", "#000001")
+        self.window.attributes("-topmost", True, "-alpha", 0.99)
+        with suppress(tk.TclError):  # Windows only
+            self.window.attributes("-transparentcolor", "#000001")
 
         self.scr_w, self.scr_h = self.window.winfo_screenwidth(), self.window.winfo_screenheight()
         self.wnd_w, self.wnd_h = round(self.scr_w / 6.4), round(self.scr_h / 12)
@@ -147,73 +202,410 @@ class NotificationWindow:
         self.canvas.pack()
         self.canvas.update()
 
-        font = f.Font(family="Cascadia Mono", size=self.message_font_size)
+        font = f.Font(root=self.root, family="Cascadia Mono", size=self.message_font_size)
         self.message = ScrollingText(canvas=self.canvas,
                                      text=message,
                                      visible_area_width=self.wnd_w - self.second_frame_padding_x,
                                      start_pos=self.second_frame_padding_x + self.message_right_padding,
                                      font=font,
-                                     delay=10,
-                                     speed=2,
+                                     speed=200,
                                      on_finish_callback=self.on_text_anim_finished_callback)
+        self.frame_widths = {self.first_frame: 1, self.second_frame: 1}
+
+
+    def animate_frame(self, frame: tk.Frame, target_w, duration: float = 0.25, on_finish_callback=None):
+        """
+        Animates frame width using Tk event loop (doesn't block it).
 
+        :param frame: frame
+        :param target_w: target width
+        :param duration: animation duration (in seconds)
+        :param on_finish_callback: callback function when animation is finished
+        """
+        init_w = self.frame_widths[frame]
+        start_time = time.perf_counter()
 
-    def animate_frame(self, frame: tk.Frame, target_w, delay: float = 0.00001, speed: int = 3):
-        init_w, init_h = frame.winfo_width(), self.wnd_h
-        speed = speed if init_w < target_w else -speed
+        def step():
+            progress = min((time.perf_counter() - start_time) / duration, 1)
+            curr_w = round(init_w + (target_w - init_w) * ease_out_cubic(progress))
+            if curr_w != self.frame_widths[frame]:
+                frame.config(width=curr_w)
+                frame.place(x=self.wnd_w - curr_w, y=0)
+                self.frame_widths[frame] = curr_w
 
-        for curr_w in range(init_w, target_w, speed):
-            frame.config(width=curr_w)
-            frame.place(x=self.wnd_w-curr_w, y=0)
-            frame.update()
-            time.sleep(delay)
+            if progress < 1:
+                self.root.after(ANIMATION_FRAME_INTERVAL, step)
+            elif on_finish_callback:
+                on_finish_callback()
 
-        if frame.winfo_width() != target_w:
-            frame.config(width=target_w)
-            frame.place(x=self.wnd_w - target_w, y=0)
-            frame.update()
+        step()
 
     def show(self):
-        self.animate_frame(self.first_frame, self.wnd_w)
-        time.sleep(0.1)
-        self.second_frame.lift()
-        self.animate_frame(self.second_frame, self.wnd_w - self.second_frame_padding_x)
-        self.root.after(1000, self.message.update_scroll)
-        self.root.mainloop()
+        def show_second_frame():
+            self.second_frame.lift()
+            self.animate_frame(self.second_frame, self.wnd_w - self.second_frame_padding_x,
+                               on_finish_callback=lambda: self.root.after(1000, self.message.update_scroll))
+
+        self.animate_frame(self.first_frame, self.wnd_w,
+                           on_finish_callback=lambda: self.root.after(100, show_second_frame))
 
     def close(self):
-        self.animate_frame(self.second_frame, 0)
-        time.sleep(0.1)
-        self.animate_frame(self.first_frame, 0)
-        self.window.destroy()
-        self.root.destroy()
+        def destroy():
+            self.window.destroy()
+            if self.on_close_callback:
+                self.on_close_callback()
+
+        self.animate_frame(self.second_frame, 0,
+                           on_finish_callback=lambda: self.root.after(
+                               100, lambda: self.animate_frame(self.first_frame, 0, on_finish_callback=destroy)))
 
     def on_text_anim_finished_callback(self):
-        time.sleep(2.5)
-        self.close()
+        self.root.after(2500, self.close)
+
+
+class NotificationHost:
+    """
+    Long-lived notification process.
+    Reads notifications from stdin (one JSON object per line) and shows them one by one using a single Tk root.
+    For each shown notification writes a report (JSON object with latency) to stdout.
+    """
+    POLL_INTERVAL = 50  # ms
+
+    def __init__(self):
+        self.root = tk.Tk()
+        self.root.withdraw()
+        self.queue = Queue()
+        self.current: NotificationWindow | None = None
+
+    def run(self):
+        Thread(target=self.read_stdin, daemon=True).start()
+        self.root.after(0, self.poll)
+        self.root.mainloop()
+
+    def read_stdin(self):
+        for line in sys.stdin:
+            with suppress(ValueError):
+                self.queue.put(json.loads(line))
+        # stdin is closed (OBS is closed or the script is unloaded).
+        self.queue.put(None)
+
+    def poll(self):
+        if self.current is None:
+            with suppress(Empty):
+                item = self.queue.get_nowait()
+                if item is None:
+                    self.root.destroy()
+                    return
+                self.show(item)
+        self.root.after(self.POLL_INTERVAL, self.poll)
+
+    def show(self, item: dict):
+        self.current = NotificationWindow(self.root,
+                                          item.get("title", ""),
+                                          item.get("message", ""),
+                                          item.get("color", "#76B900"),
+                                          on_close_callback=self.on_notification_closed)
+        self.report(item)
+        self.current.show()
+
+    def on_notification_closed(self):
+        self.current = None
+
+    @staticmethod
+    def report(item: dict):
+        if sys.stdout is None:  # pythonw without redirected stdout
+            return
+
+        with suppress(Exception):
+            created_at = item.get("created_at")
+            latency = time.time() - created_at if created_at else None
+            sys.stdout.write(json.dumps({"title": item.get("title"), "latency": latency}) + "\n")
+            sys.stdout.flush()
+
+
+# -------------------- catalog.py --------------------
+# Clips catalog is an SQLite database with a row for every clip.
+# The script adds clips to it when they are saved, the existing library can be imported with:
+# python smart_replays.py --catalog-bootstrap <Clips Base Path> [--catalog <Catalog Path>] [--workers <N>]
+class ClipCatalog:
+    """
+    SQLite catalog of clips.
+    Connection is bound to the thread that created the object.
+    """
+    VIDEO_EXTENSIONS = frozenset((".mkv", ".mp4", ".mov", ".flv", ".ts", ".m3u8"))
+    DEFAULT_FILENAME = "clips_catalog.sqlite3"
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS clips (
+            id INTEGER PRIMARY KEY,
+            path TEXT NOT NULL UNIQUE,
+            name TEXT,
+            executable TEXT,
+            scene TEXT,
+            naming_mode INTEGER,
+            size INTEGER,
+            duration INTEGER,
+            saved_at REAL NOT NULL,
+            protected INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS clips_name_saved_at ON clips (name, saved_at);
+        CREATE INDEX IF NOT EXISTS clips_saved_at ON clips (saved_at);
+    """
+    # Partial indexes for retention (oldest not protected clips), created after `protected` column migration.
+    INDEXES = """
+        CREATE INDEX IF NOT EXISTS clips_unprotected_name_saved_at ON clips (name, saved_at) WHERE protected = 0;
+        CREATE INDEX IF NOT EXISTS clips_unprotected_saved_at ON clips (saved_at) WHERE protected = 0;
+    """
+    COLUMNS = ("path", "name", "executable", "scene", "naming_mode", "size", "duration", "saved_at")
+
+    def __init__(self, path: Path | str):
+        """
+        :param path: database file path. Created if it doesn't exist.
+        """
+        self.path = Path(path)
+        os.makedirs(self.path.parent, exist_ok=True)
+        self._connection = sqlite3.connect(str(self.path))
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(self.SCHEMA)
+        if "protected" not in {i["name"] for i in self._connection.execute("PRAGMA table_info(clips)")}:
+            with self._connection:
+                self._connection.execute("ALTER TABLE clips ADD COLUMN protected INTEGER NOT NULL DEFAULT 0")
+        self._connection.executescript(self.INDEXES)
+
+    def add_many(self, rows: list[dict]):
+        """
+        Adds clips in one transaction. Rows with already existing paths are replaced.
+
+        :param rows: [{column: value}, ...], see `COLUMNS`.
+        """
+        query = (f"INSERT OR REPLACE INTO clips ({', '.join(self.COLUMNS)}) "
+                 f"VALUES ({', '.join('?' * len(self.COLUMNS))})")
+        with self._connection:
+            self._connection.executemany(query, ([row.get(i) for i in self.COLUMNS] for row in rows))
+
+    def import_many(self, rows: list[dict]) -> int:
+        """
+        Adds clips in one transaction. Rows with already existing paths are skipped.
+
+        :return: amount of added clips.
+        """
+        query = (f"INSERT OR IGNORE INTO clips ({', '.join(self.COLUMNS)}) "
+                 f"VALUES ({', '.join('?' * len(self.COLUMNS))})")
+        with self._connection:
+            return self._connection.executemany(query, ([row.get(i) for i in self.COLUMNS] for row in rows)).rowcount
+
+    def find(self, name: str | None = None, since: datetime | float | None = None,
+             until: datetime | float | None = None, limit: int | None = None,
+             oldest_first: bool = False, protected: bool | None = None) -> list[dict]:
+        """
+        Returns clips (newest first).
+
+        :param name: clip name (alias / executable / scene).
+        :param since: clips saved at or after this moment.
+        :param until: clips saved before this moment.
+        :param limit: max amount of clips.
+        :param oldest_first: return oldest clips first.
+        :param protected: only protected (True) or only not protected (False) clips.
+        """
+        conditions, params = [], []
+        if protected is not None:
+            conditions.append("protected = 1" if protected else "protected = 0")
+        if name is not None:
+            conditions.append("name = ?")
+            params.append(name)
+        if since is not None:
+            conditions.append("saved_at >= ?")
+            params.append(since.timestamp() if isinstance(since, datetime) else since)
+        if until is not None:
+            conditions.append("saved_at < ?")
+            params.append(until.timestamp() if isinstance(until, datetime) else until)
+
+        query = "SELECT * FROM clips"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY saved_at " + ("ASC" if oldest_first else "DESC")
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        return [dict(i) for i in self._connection.execute(query, params)]
+
+    def get_totals(self) -> dict[str, tuple[int, int]]:
+        """
+        Returns {clip name: (amount of clips, total size)}.
+        """
+        query = "SELECT name, COUNT(*), COALESCE(SUM(size), 0) FROM clips GROUP BY name"
+        return {name: (count, size) for name, count, size in self._connection.execute(query)}
+
+    def set_protected(self, paths: list[str], protected: bool = True):
+        """
+        Marks clips as protected from retention (or removes the mark).
+        """
+        with self._connection:
+            self._connection.executemany("UPDATE clips SET protected = ? WHERE path = ?",
+                                         ((int(protected), i) for i in paths))
+
+    def remove_many(self, paths: list[str]):
+        with self._connection:
+            self._connection.executemany("DELETE FROM clips WHERE path = ?", ((i,) for i in paths))
+
+    def close(self):
+        self._connection.close()
+
+
+def scan_catalog_folder(folder: str, name: str | None, recursive: bool) -> list[dict]:
+    """
+    Collects catalog rows of clips in the folder. Runs in the bootstrap pool processes.
+
+    :param folder: folder path.
+    :param name: clip name for all clips in the folder (folder name if clips are sorted into folders).
+                 If None, file name is used.
+    :param recursive: whether to scan sub-folders.
+    """
+    rows = []
+    folders = [folder]
+    while folders:
+        with os.scandir(folders.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive:
+                        folders.append(entry.path)
+                    continue
+
+                if os.path.splitext(entry.name)[1].lower() not in ClipCatalog.VIDEO_EXTENSIONS:
+                    continue
+                stat = entry.stat(follow_symlinks=False)
+                rows.append({
+                    "path": entry.path,
+                    "name": name if name is not None else os.path.splitext(entry.name)[0],
+                    "size": stat.st_size,
+                    "saved_at": stat.st_mtime,
+                })
+    return rows
+
+
+def bootstrap_catalog(base_path: Path | str, catalog_path: Path | str, workers: int | None = None,
+                      skip_folders: tuple[str, ...] = ("_links",)) -> int:
+    """
+    Imports an existing clips library into the catalog.
+    Each folder in `base_path` is scanned in a separate pool process, rows are written by this process.
+
+    :param base_path: clips base path.
+    :param catalog_path: catalog database path.
+    :param workers: amount of pool processes (CPU count if None).
+    :param skip_folders: names of folders in `base_path` to skip (hard links are not separate clips).
+    :return: amount of added clips.
+    """
+    base_path = Path(base_path)
+    tasks = [(str(base_path), None, False)]
+    with os.scandir(base_path) as entries:
+        tasks += [(i.path, i.name, True) for i in entries
+                  if i.is_dir(follow_symlinks=False) and i.name not in skip_folders]
+
+    catalog = ClipCatalog(catalog_path)
+    added = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for rows in pool.map(scan_catalog_folder, *zip(*tasks)):
+                added += catalog.import_many(rows)
+    finally:
+        catalog.close()
+    return added
+
+
+def catalog_bootstrap_cli(args: list[str]) -> int:
+    parser = argparse.ArgumentParser(prog="smart_replays.py --catalog-bootstrap",
+                                     description="Imports an existing clips library into the clips catalog.")
+    parser.add_argument("base_path", help="clips base path")
+    parser.add_argument("--catalog", default=None, help="catalog path (the one the script uses by default)")
+    parser.add_argument("--workers", type=int, default=None, help="amount of processes (CPU count by default)")
+    parsed = parser.parse_args(args)
+
+    catalog_path = parsed.catalog or get_data_dir() / ClipCatalog.DEFAULT_FILENAME
+    start = time.perf_counter()
+    added = bootstrap_catalog(parsed.base_path, catalog_path, parsed.workers)
+    print(f"{added} clips are added to {catalog_path} in {time.perf_counter() - start:.1f}s.")
+    return 0
+
+
+def get_data_dir() -> Path:
+    """
+    Returns the folder for script data (catalog, journals).
+    """
+    return Path(os.getenv("APPDATA") or Path.home() / ".config") / "smart_replays"
 
 
 if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == "--catalog-bootstrap":
+        sys.exit(catalog_bootstrap_cli(sys.argv[2:]))
+
+    if len(sys.argv) > 1 and sys.argv[1] == "--notification-host":
+        NotificationHost().run()
+        sys.exit(0)
+
     t = sys.argv[1] if len(sys.argv) > 1 else "Test Title"
     m = sys.argv[2] if len(sys.argv) > 2 else "Test Message"
     color = sys.argv[3] if len(sys.argv) > 3 else "#76B900"
-    NotificationWindow(t, m, color).show()
+    tk_root = tk.Tk()
+    tk_root.withdraw()
+    NotificationWindow(tk_root, t, m, color, on_close_callback=tk_root.destroy).show()
+    tk_root.mainloop()
     sys.exit(0)
 
 
 # -------------------- globals.py --------------------
-user32 = ctypes.windll.user32
+user32 = ctypes.windll.user32 if sys.platform == "win32" else None
 
 
 class CONSTANTS:
     VERSION = "1.0.8.2"
-    OBS_VERSION_STRING = obs.obs_get_version_string()
+    OBS_VERSION_STRING = obs.obs_get_version_string() if IS_OBS_SCRIPT else "0.0.0"
     OBS_VERSION_RE = re.compile(r'(\d+)\.(\d+)\.(\d+)')
     OBS_VERSION = [int(i) for i in OBS_VERSION_RE.match(OBS_VERSION_STRING).groups()]
-    CLIPS_FORCE_MODE_LOCK = Lock()
     VIDEOS_FORCE_MODE_LOCK = Lock()
+    RESTART_BUFFER_LOCK = Lock()
+    RESTART_GAPS_HISTORY_SIZE = 100
+    EXE_RESOLVER_CACHE_SIZE = 64
+    KNOWN_FOLDERS_CACHE_SIZE = 256
+    DATA_DIR = get_data_dir()
+    CLIPS_CATALOG_PATH = DATA_DIR / ClipCatalog.DEFAULT_FILENAME
+    CATALOG_BATCH_SIZE = 64
+    CATALOG_FLUSH_INTERVAL = 2  # seconds
+    RETENTION_QUEUE_SIZE = 256
+    REMUX_QUEUE_PATH = DATA_DIR / "remux_queue.json"
+    REMUX_STOP_TIMEOUT = 5  # seconds
+    BELOW_NORMAL_PRIORITY_CLASS = 0x00004000
+    CREATE_NO_WINDOW = 0x08000000
+    RETENTION_DELETE_BATCH = 32
+    BOOKMARKS_MAX_AMOUNT = 256
+    BOOKMARKS_FILE_SUFFIX = ".bookmarks.json"
+    LATENCY_LOG_PATH = DATA_DIR / "save_latency.jsonl"
+    LOG_FILE_PATH = DATA_DIR / "smart_replays.log"
+    LOG_MAX_FILE_SIZE = 4 * 1024 ** 2  # bytes
+    LOG_BUFFER_SIZE = 4096
+    LOG_DRAIN_INTERVAL = 0.25  # seconds
+    LATENCY_LOG_MAX_SIZE = 16 * 1024 ** 2  # bytes
+    LATENCY_SPANS_SIZE = 4096
+    LATENCY_FLUSH_INTERVAL = 30  # seconds
+    WATCHDOG_MAX_OVERRUNS = 3
+    WATCHDOG_STACK_DEPTH = 12
+    LATENCY_STAGES = ("get_last_replay", "name_generation", "alias_lookup", "makedirs", "rename",
+                      "hard_link", "notify", "total")
+    CLIPS_MOVE_JOURNAL_PATH = DATA_DIR / "moves_journal.json"
+    CLIPS_MOVER_QUEUE_SIZE = 64
+    CLIPS_COPY_CHUNK_SIZE = 8 * 1024 * 1024  # multiple of disk sector / page size
+    CLIPS_COPY_TEMP_SUFFIX = ".part"
+    THREAD_MODE_BACKGROUND_BEGIN = 0x00010000
+    CLIPS_QUEUE_SIZE = 8
+    SAVE_REQUEST_TIMEOUT = 30  # seconds
+    CLIPS_QUEUE_PUT_TIMEOUT = 0.5  # seconds
+    WORKERS_DRAIN_TIMEOUT = 10  # seconds
+    NOTIFICATION_HOST_STOP_TIMEOUT = 3  # seconds
     FILENAME_PROHIBITED_CHARS = r'/\:"<>*?|%'
-    PATH_PROHIBITED_CHARS = r'"<>*?|%'
+    FILENAME_PROHIBITED_CHARS_RE = re.compile(f"[{re.escape(FILENAME_PROHIBITED_CHARS)}]")
+    PATH_PROHIBITED_CHARS = r'"<>|%'  # * and ? are allowed in alias paths as wildcards
+    ALIASES_MEMO_SIZE = 4096
+    ALIASES_PARSE_CACHE_SIZE = 65536
     DEFAULT_FILENAME_FORMAT = "%NAME_%d.%m.%Y_%H-%M-%S"
     DEFAULT_ALIASES = (
         {"value": "C:\\Windows\\explorer.exe > Desktop", "selected": False, "hidden": False},
@@ -223,13 +615,31 @@ class CONSTANTS:
 
 class VARIABLES:
     update_available: bool = False
-    clip_exe_history: deque[Path, ...] | None = None
+    clip_exe_history: "ExeHistory | None" = None
     video_exe_history: defaultdict[Path, int] | None = None  # {Path(path/to/executable): active_seconds_amount
     exe_path_on_video_stopping_event: Path | None = None
-    aliases: dict[Path, str] = {}
+    aliases: "AliasMatcher | None" = None
     script_settings = None
+    settings: "ScriptSettings | None" = None
     hotkey_ids: dict = {}
-    force_mode = None
+    save_requests: "SaveRequestQueue | None" = None
+    exe_resolver: "ExecutableResolver | None" = None
+    name_allocator: "UniqueNameAllocator | None" = None
+    clips_mover: "ClipMover | None" = None
+    catalog_writer: "CatalogWriter | None" = None
+    retention: "RetentionManager | None" = None
+    remux_pool: "RemuxPool | None" = None
+    last_clip_job: "ClipSaveJob | None" = None  # used only in the clips worker thread
+    bookmarks: deque[float] = deque(maxlen=CONSTANTS.BOOKMARKS_MAX_AMOUNT)  # time.monotonic() values
+    latency: "LatencyRecorder | None" = None
+    watchdog: "CallbackWatchdog | None" = None
+    profile_config: "ProfileConfigCache | None" = None
+    replay_buffer_stopped_event = Event()
+    replay_buffer_started_at: float | None = None  # time.monotonic() value
+    restart_requested_at: float | None = None  # time.perf_counter() value
+    restart_gaps: deque[float] = deque(maxlen=CONSTANTS.RESTART_GAPS_HISTORY_SIZE)  # seconds
+    clips_worker: "BackgroundWorker | None" = None
+    notification_host: "NotificationHostClient | None" = None
 
 
 class ConfigTypes(Enum):
@@ -264,6 +674,7 @@ class PropertiesNames:
     GR_SOUND_NOTIFICATION_SETTINGS = "sound_notification_settings"
     GR_POPUP_NOTIFICATION_SETTINGS = "popup_notification_settings"
     GR_ALIASES_SETTINGS = "aliases_settings"
+    GR_RETENTION_SETTINGS = "retention_settings"
     GR_OTHER_SETTINGS = "other_settings"
 
     # Clips path settings
@@ -271,13 +682,20 @@ class PropertiesNames:
     TXT_CLIPS_BASE_PATH_WARNING = "clips_base_path_warning"
     PROP_CLIPS_NAMING_MODE = "clips_naming_mode"
     TXT_CLIPS_HOTKEY_TIP = "clips_hotkey_tip"
+    PROP_CLIPS_SAVE_COALESCE_INTERVAL = "clips_save_coalesce_interval"
+    PROP_CLIPS_MERGE_WINDOW = "clips_merge_window"
+    PROP_CLIPS_TRIM_OVERLAPS = "clips_trim_overlaps"
     PROP_CLIPS_FILENAME_TEMPLATE = "clips_filename_template"
+    PROP_CLIPS_COPY_SPEED_LIMIT = "clips_copy_speed_limit"
     TXT_CLIPS_FILENAME_TEMPLATE_ERR = "clips_filename_template_err"
     PROP_CLIPS_SAVE_TO_FOLDER = "clips_save_to_folder"
     PROP_CLIPS_ONLY_FORCE_MODE = "clips_only_force_mode" # todo
     PROP_CLIPS_CREATE_LINKS = "clips_create_links"
     PROP_CLIPS_LINKS_FOLDER_PATH = "clips_links_folder_path"
     TXT_CLIPS_LINKS_FOLDER_PATH_WARNING = "clips_links_folder_path_warning"
+    PROP_CLIPS_REMUX_TO_MP4 = "clips_remux_to_mp4"
+    PROP_FFMPEG_PATH = "ffmpeg_path"
+    PROP_CLIPS_REMUX_CONCURRENCY = "clips_remux_concurrency"
 
     # Videos path settings
     PROP_VIDEOS_NAMING_MODE = "videos_naming_mode"
@@ -319,15 +737,35 @@ class PropertiesNames:
     PROP_ALIASES_IMPORT_PATH = "aliases_import_path"
     BTN_ALIASES_IMPORT = "aliases_import_btn"
 
+    # Retention settings
+    TXT_RETENTION_DESC = "retention_desc"
+    PROP_RETENTION_MAX_TOTAL_SIZE = "retention_max_total_size"
+    PROP_RETENTION_MAX_AGE = "retention_max_age"
+    PROP_RETENTION_RULES = "retention_rules"
+    PROP_RETENTION_FAVORITES_PATH = "retention_favorites_path"
+    TXT_RETENTION_RULES_INVALID_FORMAT = "retention_rules_invalid_format_err"
+
     # Other section
     PROP_RESTART_BUFFER = "restart_buffer"
     PROP_RESTART_BUFFER_LOOP = "restart_buffer_loop"
+    PROP_RESTART_BUFFER_STOP_TIMEOUT = "restart_buffer_stop_timeout"
+    PROP_RESTART_BUFFER_STOP_RETRIES = "restart_buffer_stop_retries"
     TXT_RESTART_BUFFER_LOOP = "restart_buffer_loop_desc"
+    PROP_DEBUG_LOGGING = "debug_logging"
+    PROP_LOG_TO_FILE = "log_to_file"
+    PROP_CALLBACK_BUDGET = "callback_budget"
+    PROP_CALLBACK_AUTO_DISABLE = "callback_auto_disable"
+    TXT_SAVE_LATENCY = "save_latency_stats"
+    BTN_SAVE_LATENCY_REFRESH = "save_latency_refresh_btn"
 
     # Hotkeys
     HK_SAVE_BUFFER_MODE_1 = "save_buffer_force_mode_1"
     HK_SAVE_BUFFER_MODE_2 = "save_buffer_force_mode_2"
     HK_SAVE_BUFFER_MODE_3 = "save_buffer_force_mode_3"
+    HK_SAVE_BUFFER_LAST_15 = "save_buffer_last_15"
+    HK_SAVE_BUFFER_LAST_30 = "save_buffer_last_30"
+    HK_SAVE_BUFFER_LAST_60 = "save_buffer_last_60"
+    HK_ADD_BOOKMARK = "add_bookmark"
     HK_SAVE_VIDEO_MODE_1 = "save_video_force_mode_1"
     HK_SAVE_VIDEO_MODE_2 = "save_video_force_mode_2"
     HK_SAVE_VIDEO_MODE_3 = "save_video_force_mode_3"
@@ -366,6 +804,192 @@ class AliasInvalidFormat(AliasParsingError):
     """
 
 
+class RetentionRuleInvalidFormat(ValueError):
+    """
+    Exception raised when a retention rule is invalid format.
+    """
+    def __init__(self, index: int | None):
+        """
+        :param index: rule index.
+        """
+        super().__init__(f"Invalid retention rule format (rule {index}).")
+        self.index = index
+
+
+class ClipMoveInterrupted(Exception):
+    """
+    Exception raised when clip copying is interrupted (script is unloading).
+    The move stays in the journal and is resumed on the next script load.
+    """
+
+
+class FilenameTemplateError(ValueError):
+    """
+    Exception raised when a filename template is invalid.
+    """
+    def __init__(self, message: str, position: int):
+        """
+        :param message: error description.
+        :param position: index of the character in the template where the error is.
+        """
+        super().__init__(f"{message} (position {position + 1})")
+        self.message = message
+        self.position = position
+
+
+# -------------------- settings.py --------------------
+class ScriptSettings:
+    """
+    Immutable snapshot of the script settings.
+
+    Built once in `script_load` / `script_update` and swapped in `VARIABLES.settings` as a whole,
+    so hot paths read plain attributes instead of calling `obs_data_get_*`,
+    and worker threads never touch OBS data object.
+    """
+    __slots__ = (
+        "clips_base_path",
+        "clips_naming_mode",
+        "clips_filename_template",
+        "clips_filename_template_plan",
+        "clips_save_to_folder",
+        "clips_create_links",
+        "clips_links_folder_path",
+        "clips_copy_speed_limit",
+        "clips_remux_to_mp4",
+        "clips_remux_concurrency",
+        "ffmpeg_path",
+        "clips_save_coalesce_interval",
+        "clips_merge_window",
+        "clips_trim_overlaps",
+        "sound_on_success",
+        "sound_on_success_path",
+        "sound_on_failure",
+        "sound_on_failure_path",
+        "popup_on_success",
+        "popup_on_failure",
+        "popup_path_display_mode",
+        "restart_buffer",
+        "restart_buffer_loop",
+        "restart_buffer_stop_timeout",
+        "restart_buffer_stop_retries",
+        "debug_logging",
+        "log_to_file",
+        "callback_budget",
+        "callback_auto_disable",
+        "retention_enabled",
+        "retention_global_rule",
+        "retention_rules",
+        "retention_favorites_path",
+        "python_exe",
+    )
+
+    clips_base_path: str
+    clips_naming_mode: ClipNamingModes
+    clips_filename_template: str
+    clips_filename_template_plan: "FilenameTemplate | None"  # None if template is invalid
+    clips_save_to_folder: bool
+    clips_create_links: bool
+    clips_links_folder_path: str
+    clips_copy_speed_limit: int  # MB/s, 0 - no limit
+    clips_remux_to_mp4: bool
+    clips_remux_concurrency: int
+    ffmpeg_path: str
+    clips_save_coalesce_interval: int  # ms, 0 - don't coalesce
+    clips_merge_window: int  # seconds, 0 - don't merge
+    clips_trim_overlaps: bool
+    sound_on_success: bool
+    sound_on_success_path: str
+    sound_on_failure: bool
+    sound_on_failure_path: str
+    popup_on_success: bool
+    popup_on_failure: bool
+    popup_path_display_mode: PopupPathDisplayModes
+    restart_buffer: bool
+    restart_buffer_loop: int
+    restart_buffer_stop_timeout: int
+    restart_buffer_stop_retries: int
+    debug_logging: bool
+    log_to_file: bool
+    callback_budget: int  # ms, 0 - don't check
+    callback_auto_disable: bool
+    retention_enabled: bool
+    retention_global_rule: "RetentionRule"
+    retention_rules: "dict[str, RetentionRule]"  # {casefolded clip name or *: rule}
+    retention_favorites_path: str
+    python_exe: str
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            object.__setattr__(self, name, values[name])
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f"{type(self).__name__} is immutable.")
+
+    def __delattr__(self, item):
+        raise AttributeError(f"{type(self).__name__} is immutable.")
+
+    @classmethod
+    def from_obs_data(cls, data) -> "ScriptSettings":
+        """
+        Builds settings snapshot from OBS data object.
+        Must be called in OBS frontend thread.
+        """
+        sound = obs.obs_data_get_bool(data, PN.GR_SOUND_NOTIFICATION_SETTINGS)
+        popup = obs.obs_data_get_bool(data, PN.GR_POPUP_NOTIFICATION_SETTINGS)
+        template = obs.obs_data_get_string(data, PN.PROP_CLIPS_FILENAME_TEMPLATE)
+        try:
+            template_plan = FilenameTemplate.compile(template)
+        except FilenameTemplateError:
+            template_plan = None
+
+        retention_rules = {}
+        for i in json.loads(obs.obs_data_get_json(data)).get(PN.PROP_RETENTION_RULES) or []:
+            with suppress(RetentionRuleInvalidFormat):  # invalid rules are removed by properties callback
+                name, rule = RetentionRule.parse(i.get("value"))
+                retention_rules[name.casefold()] = rule
+
+        return cls(
+            clips_base_path=obs.obs_data_get_string(data, PN.PROP_CLIPS_BASE_PATH),
+            clips_naming_mode=ClipNamingModes(obs.obs_data_get_int(data, PN.PROP_CLIPS_NAMING_MODE)),
+            clips_filename_template=template,
+            clips_filename_template_plan=template_plan,
+            clips_save_to_folder=obs.obs_data_get_bool(data, PN.PROP_CLIPS_SAVE_TO_FOLDER),
+            clips_create_links=obs.obs_data_get_bool(data, PN.PROP_CLIPS_CREATE_LINKS),
+            clips_links_folder_path=obs.obs_data_get_string(data, PN.PROP_CLIPS_LINKS_FOLDER_PATH),
+            clips_copy_speed_limit=obs.obs_data_get_int(data, PN.PROP_CLIPS_COPY_SPEED_LIMIT),
+            clips_remux_to_mp4=obs.obs_data_get_bool(data, PN.PROP_CLIPS_REMUX_TO_MP4),
+            clips_remux_concurrency=obs.obs_data_get_int(data, PN.PROP_CLIPS_REMUX_CONCURRENCY),
+            ffmpeg_path=obs.obs_data_get_string(data, PN.PROP_FFMPEG_PATH),
+            clips_save_coalesce_interval=obs.obs_data_get_int(data, PN.PROP_CLIPS_SAVE_COALESCE_INTERVAL),
+            clips_merge_window=obs.obs_data_get_int(data, PN.PROP_CLIPS_MERGE_WINDOW),
+            clips_trim_overlaps=obs.obs_data_get_bool(data, PN.PROP_CLIPS_TRIM_OVERLAPS),
+            sound_on_success=sound and obs.obs_data_get_bool(data, PN.PROP_NOTIFY_CLIPS_ON_SUCCESS),
+            sound_on_success_path=obs.obs_data_get_string(data, PN.PROP_NOTIFY_CLIPS_ON_SUCCESS_PATH),
+            sound_on_failure=sound and obs.obs_data_get_bool(data, PN.PROP_NOTIFY_CLIPS_ON_FAILURE),
+            sound_on_failure_path=obs.obs_data_get_string(data, PN.PROP_NOTIFY_CLIPS_ON_FAILURE_PATH),
+            popup_on_success=popup and obs.obs_data_get_bool(data, PN.PROP_POPUP_CLIPS_ON_SUCCESS),
+            popup_on_failure=popup and obs.obs_data_get_bool(data, PN.PROP_POPUP_CLIPS_ON_FAILURE),
+            popup_path_display_mode=PopupPathDisplayModes(obs.obs_data_get_int(data, PN.PROP_POPUP_PATH_DISPLAY_MODE)),
+            restart_buffer=obs.obs_data_get_bool(data, PN.PROP_RESTART_BUFFER),
+            restart_buffer_loop=obs.obs_data_get_int(data, PN.PROP_RESTART_BUFFER_LOOP),
+            restart_buffer_stop_timeout=obs.obs_data_get_int(data, PN.PROP_RESTART_BUFFER_STOP_TIMEOUT),
+            restart_buffer_stop_retries=obs.obs_data_get_int(data, PN.PROP_RESTART_BUFFER_STOP_RETRIES),
+            debug_logging=obs.obs_data_get_bool(data, PN.PROP_DEBUG_LOGGING),
+            log_to_file=obs.obs_data_get_bool(data, PN.PROP_LOG_TO_FILE),
+            callback_budget=obs.obs_data_get_int(data, PN.PROP_CALLBACK_BUDGET),
+            callback_auto_disable=obs.obs_data_get_bool(data, PN.PROP_CALLBACK_AUTO_DISABLE),
+            retention_enabled=obs.obs_data_get_bool(data, PN.GR_RETENTION_SETTINGS),
+            retention_global_rule=RetentionRule(
+                max_size=obs.obs_data_get_int(data, PN.PROP_RETENTION_MAX_TOTAL_SIZE) * 1024 ** 3,
+                max_age=obs.obs_data_get_int(data, PN.PROP_RETENTION_MAX_AGE) * 86400,
+            ),
+            retention_rules=retention_rules,
+            retention_favorites_path=obs.obs_data_get_string(data, PN.PROP_RETENTION_FAVORITES_PATH),
+            python_exe=os.path.join(get_obs_config("Python", "Path64bit", str, ConfigTypes.USER) or "",
+                                    "pythonw.exe"),
+        )
+
+
 # -------------------- updates_check.py --------------------
 def get_latest_release_tag() -> dict | None:  # todo: for future updates
     url = "https://api.github.com/repos/qvvonk/smart_replays/releases/latest"
@@ -376,14 +1000,13 @@ def get_latest_release_tag() -> dict | None:  # todo: for future updates
                 data = json.load(response)
                 return data.get('tag_name')
     except:
-        _print(f"Failed to check updates.")
-        _print(traceback.format_exc())
+        log.warning("Failed to check updates.", exc_info=True)
     return None
 
 
 def check_updates(current_version: str):  # todo: for future updates
     latest_version = get_latest_release_tag()
-    _print(latest_version)
+    log.debug("Latest release: %s", latest_version)
     if latest_version and f'v{current_version}' != latest_version:
         return True
     return False
@@ -393,6 +1016,15 @@ def check_updates(current_version: str):  # todo: for future updates
 variables_tip = """<table>
 <tr><th align='left'>%NAME</th><td> - name of the clip.</td></tr>
 
+<tr><th align='left'>%SCENE</th><td> - name of the current scene.</td></tr>
+
+<tr><th align='left'>%EXE</th><td> - name of the app (.exe file name) the clip is named after
+(the active app in scene mode).</td></tr>
+
+<tr><th align='left'>%DURATION</th><td> - clip length in seconds.</td></tr>
+
+<tr><th align='left'>%SIZE</th><td> - clip file size in MB.</td></tr>
+
 <tr><th align='left'>%a</th><td> - Weekday as locale’s abbreviated name.<br/>
 Example: Sun, Mon, …, Sat (en_US); So, Mo, …, Sa (de_DE)</td></tr>
 
@@ -453,7 +1085,6 @@ Example: 00, 01, …, 53</td></tr>
 <tr><th align='left'>%W</th><td> - Week number of the year (Monday as the first day of the week) as a zero-padded decimal number. All days in a new year preceding the first Monday are considered to be in week 0.<br/>
 Example: 00, 01, …, 53</td></tr>
 
-<tr><th align='left'>%%</th><td> - A literal '%' character.</td></tr>
 </table>"""
 
 
@@ -471,13 +1102,21 @@ def setup_clip_paths_settings(group_obj):
     t = obs.obs_properties_add_text(
         props=group_obj,
         name=PN.TXT_CLIPS_BASE_PATH_WARNING,
-        description="The path must be on the same disk as the path for OBS records "
-                    "(File -> Settings -> Output -> Recording -> Recording Path).\n"
-                    "Otherwise, the script will not be able to move the clip to the correct folder.",
+        description="If the path is on another disk than the path for OBS records "
+                    "(File -> Settings -> Output -> Recording -> Recording Path),\n"
+                    "clips are copied to it in the background, which takes more time than moving.",
         type=obs.OBS_TEXT_INFO
     )
 
-    obs.obs_property_text_set_info_type(t, obs.OBS_TEXT_INFO_WARNING)
+    obs.obs_property_text_set_info_type(t, obs.OBS_TEXT_INFO_NORMAL)
+
+    obs.obs_properties_add_int(
+        props=group_obj,
+        name=PN.PROP_CLIPS_COPY_SPEED_LIMIT,
+        description="Copy speed limit for another disk (MB/s, 0 - no limit)",
+        min=0, max=10000,
+        step=10
+    )
 
     # ----- Clip naming mode -----
     clip_naming_mode_prop = obs.obs_properties_add_list(
@@ -511,6 +1150,28 @@ def setup_clip_paths_settings(group_obj):
     )
     obs.obs_property_text_set_info_type(t, obs.OBS_TEXT_INFO_WARNING)
 
+    obs.obs_properties_add_int(
+        props=group_obj,
+        name=PN.PROP_CLIPS_SAVE_COALESCE_INTERVAL,
+        description="Ignore repeated save hotkey presses within (ms)",
+        min=0, max=10000,
+        step=50
+    )
+
+    obs.obs_properties_add_int(
+        props=group_obj,
+        name=PN.PROP_CLIPS_MERGE_WINDOW,
+        description="Append clips saved within (s) after the previous one to it (0 - off, requires ffmpeg)",
+        min=0, max=3600,
+        step=5
+    )
+
+    obs.obs_properties_add_bool(
+        props=group_obj,
+        name=PN.PROP_CLIPS_TRIM_OVERLAPS,
+        description="Cut footage already saved in the previous clip (requires ffmpeg)",
+    )
+
     # ----- Clip file name format -----
     filename_format_prop = obs.obs_properties_add_text(
         props=group_obj,
@@ -555,13 +1216,36 @@ def setup_clip_paths_settings(group_obj):
     links_path_warn = obs.obs_properties_add_text(
         props=group_obj,
         name=PN.TXT_CLIPS_LINKS_FOLDER_PATH_WARNING,
-        description="The path must be on the same disk as the path for OBS records "
-                    "(File -> Settings -> Output -> Recording -> Recording Path).\n"
+        description="The path must be on the same disk as the base path for clips.\n"
                     "Otherwise, the script will not be able to create link to the file.",
         type=obs.OBS_TEXT_INFO
     )
     obs.obs_property_text_set_info_type(links_path_warn, obs.OBS_TEXT_INFO_WARNING)
 
+    # ----- Remux -----
+    obs.obs_properties_add_bool(
+        props=group_obj,
+        name=PN.PROP_CLIPS_REMUX_TO_MP4,
+        description="Remux MKV clips to MP4 in the background (requires ffmpeg)",
+    )
+
+    obs.obs_properties_add_path(
+        props=group_obj,
+        name=PN.PROP_FFMPEG_PATH,
+        description="ffmpeg executable (remux, partial length saves)",
+        type=obs.OBS_PATH_FILE,
+        filter=None,
+        default_path=None
+    )
+
+    obs.obs_properties_add_int(
+        props=group_obj,
+        name=PN.PROP_CLIPS_REMUX_CONCURRENCY,
+        description="Max simultaneous remuxes",
+        min=1, max=8,
+        step=1
+    )
+
     obs.obs_property_set_visible(links_path_prop,
                                  obs.obs_data_get_bool(VARIABLES.script_settings,
                                                        PN.PROP_CLIPS_CREATE_LINKS))
@@ -732,7 +1416,10 @@ def setup_aliases_settings(group_obj):
         description="Executable (.exe) files often have names that don't match the actual game title "
                     "(e.g., the game is called Deadlock, but the .exe file is named project8.exe)."
                     "You can create an alias for the executable file or folder. "
-                    "Smart Replays will use this alias for renaming, rather than the .exe file name.",
+                    "Smart Replays will use this alias for renaming, rather than the .exe file name.\n"
+                    "Paths are case-insensitive and can contain wildcards (* and ?). "
+                    "If the clip name is *, the clip is named after the folder matched by the wildcard "
+                    "(e.g., D:\\SteamLibrary\\steamapps\\common\\* > *).",
         type=obs.OBS_TEXT_INFO
     )
 
@@ -743,7 +1430,7 @@ def setup_aliases_settings(group_obj):
     <div style="font-size: 14px">
     <span style="color: red">Invalid path or clip name value.<br></span>
     <span style="color: orange">Clip name cannot contain <code style="color: cyan">&lt; &gt; / \\ | * ? : " %</code> characters.<br>
-    Path cannot contain <code style="color: cyan">&lt; &gt; | * ? " %</code> characters.</span>
+    Path cannot contain <code style="color: cyan">&lt; &gt; | " %</code> characters.</span>
     </div>
     """,
         type=obs.OBS_TEXT_INFO
@@ -826,6 +1513,69 @@ def setup_aliases_settings(group_obj):
     obs.obs_property_set_modified_callback(aliases_list, update_aliases_callback)
 
 
+def setup_retention_settings(group_obj):
+    obs.obs_properties_add_text(
+        props=group_obj,
+        name=PN.TXT_RETENTION_DESC,
+        description="When limits are exceeded, the oldest clips are deleted in the background.\n"
+                    "Favorite clips are never deleted. To mark a clip as favorite, put its hard link "
+                    "(with the same file name) into the favorites folder.\n"
+                    "Rules for separate clip names (apps / aliases / scenes) have format: ClipName > limits, "
+                    "where limits are any of: 20GB - max size, 14d - max age, 50clips - max amount.\n"
+                    "Use * as a clip name to set limits for every clip name that has no own rule.\n"
+                    "Example: Minecraft > 20GB 50clips. Set 0 to disable a global limit.",
+        type=obs.OBS_TEXT_INFO
+    )
+
+    obs.obs_properties_add_int(
+        props=group_obj,
+        name=PN.PROP_RETENTION_MAX_TOTAL_SIZE,
+        description="Max size of all clips (GB)",
+        min=0, max=100000,
+        step=10
+    )
+
+    obs.obs_properties_add_int(
+        props=group_obj,
+        name=PN.PROP_RETENTION_MAX_AGE,
+        description="Max age of clips (days)",
+        min=0, max=36500,
+        step=1
+    )
+
+    obs.obs_properties_add_path(
+        props=group_obj,
+        name=PN.PROP_RETENTION_FAVORITES_PATH,
+        description="Favorites folder",
+        type=obs.OBS_PATH_DIRECTORY,
+        filter=None,
+        default_path=str(get_base_path())
+    )
+
+    err_text = obs.obs_properties_add_text(
+        props=group_obj,
+        name=PN.TXT_RETENTION_RULES_INVALID_FORMAT,
+        description="""
+    <div style="font-size: 14px">
+    <span style="color: red">Invalid format.<br></span>
+    <span style="color: orange">Required format: ClipName > 20GB 14d 50clips (any of limits)<br></span>
+    </div>""",
+        type=obs.OBS_TEXT_INFO
+    )
+    obs.obs_property_set_visible(err_text, False)
+
+    rules_list = obs.obs_properties_add_editable_list(
+        props=group_obj,
+        name=PN.PROP_RETENTION_RULES,
+        description="",
+        type=obs.OBS_EDITABLE_LIST_TYPE_STRINGS,
+        filter=None,
+        default_path=None
+    )
+
+    obs.obs_property_set_modified_callback(rules_list, update_retention_rules_callback)
+
+
 def setup_other_settings(group_obj):
     obs.obs_properties_add_text(
         props=group_obj,
@@ -850,6 +1600,62 @@ To disable scheduled restarts, set the value to 0.""",
         description="Restart replay buffer after clip saving"
     )
 
+    obs.obs_properties_add_int(
+        props=group_obj,
+        name=PN.PROP_RESTART_BUFFER_STOP_TIMEOUT,
+        description="Max time to wait for replay buffer to stop on restart (s)",
+        min=1, max=120,
+        step=1
+    )
+
+    obs.obs_properties_add_int(
+        props=group_obj,
+        name=PN.PROP_RESTART_BUFFER_STOP_RETRIES,
+        description="Stop retries on restart",
+        min=0, max=10,
+        step=1
+    )
+
+    obs.obs_properties_add_bool(
+        props=group_obj,
+        name=PN.PROP_DEBUG_LOGGING,
+        description="Debug logging"
+    )
+
+    obs.obs_properties_add_bool(
+        props=group_obj,
+        name=PN.PROP_LOG_TO_FILE,
+        description=f"Also write log to {CONSTANTS.LOG_FILE_PATH}"
+    )
+
+    obs.obs_properties_add_int(
+        props=group_obj,
+        name=PN.PROP_CALLBACK_BUDGET,
+        description="Warn about script callbacks slower than (ms, 0 - off)",
+        min=0, max=1000,
+        step=1
+    )
+
+    obs.obs_properties_add_bool(
+        props=group_obj,
+        name=PN.PROP_CALLBACK_AUTO_DISABLE,
+        description="Disable optional features (exe history, restart loop) which callbacks are too slow"
+    )
+
+    obs.obs_properties_add_text(
+        props=group_obj,
+        name=PN.TXT_SAVE_LATENCY,
+        description=format_latency_summary(),
+        type=obs.OBS_TEXT_INFO
+    )
+
+    obs.obs_properties_add_button(
+        group_obj,
+        PN.BTN_SAVE_LATENCY_REFRESH,
+        "Refresh save latency",
+        refresh_save_latency_callback
+    )
+
 
 def script_properties():
     p = obs.obs_properties_create()  # main properties object
@@ -873,6 +1679,7 @@ def script_properties():
     notification_gr = obs.obs_properties_create()
     popup_gr = obs.obs_properties_create()
     aliases_gr = obs.obs_properties_create()
+    retention_gr = obs.obs_properties_create()
     other_gr = obs.obs_properties_create()
 
     obs.obs_properties_add_group(p, PN.GR_CLIPS_PATH_SETTINGS, "Clip path settings", obs.OBS_GROUP_NORMAL, clip_path_gr)
@@ -880,6 +1687,7 @@ def script_properties():
     obs.obs_properties_add_group(p, PN.GR_SOUND_NOTIFICATION_SETTINGS, "Sound notifications", obs.OBS_GROUP_CHECKABLE, notification_gr)
     obs.obs_properties_add_group(p, PN.GR_POPUP_NOTIFICATION_SETTINGS, "Popup notifications", obs.OBS_GROUP_CHECKABLE, popup_gr)
     obs.obs_properties_add_group(p, PN.GR_ALIASES_SETTINGS, "Aliases", obs.OBS_GROUP_NORMAL, aliases_gr)
+    obs.obs_properties_add_group(p, PN.GR_RETENTION_SETTINGS, "Storage limits", obs.OBS_GROUP_CHECKABLE, retention_gr)
     obs.obs_properties_add_group(p, PN.GR_OTHER_SETTINGS, "Other", obs.OBS_GROUP_NORMAL, other_gr)
 
     # ------ Setup properties ------
@@ -888,21 +1696,172 @@ def script_properties():
     setup_notifications_settings(notification_gr)
     setup_popup_notification_settings(popup_gr)
     setup_aliases_settings(aliases_gr)
+    setup_retention_settings(retention_gr)
     setup_other_settings(other_gr)
 
     return p
 
 
+# -------------------- watchdog.py --------------------
+class CallbackWatchdog:
+    """
+    Measures OBS callbacks (frontend events, timers, hotkeys, properties) that run on OBS threads.
+
+    Keeps a duration histogram per callback. If a callback runs longer than the budget,
+    the monitor thread takes a sample of its stack, and a warning with the sample is logged when it returns.
+    Optional features (see `watched_callback`) are disabled after `max_overruns` overruns in a row
+    if auto-disable is on.
+    """
+    BUCKETS_MS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+    def __init__(self, budget_ms: int, auto_disable: bool, max_overruns: int):
+        """
+        :param budget_ms: max callback duration (in milliseconds), 0 - don't check.
+        :param auto_disable: disable optional features which callbacks exceed the budget.
+        :param max_overruns: amount of overruns in a row after which a feature is disabled.
+        """
+        self.budget_ms = budget_ms
+        self.auto_disable = auto_disable
+        self.max_overruns = max_overruns
+        self.disabled_features: set[str] = set()
+        self._histograms: dict[str, list[int]] = {}  # {callback name: [count per bucket, ..., count over the last]}
+        self._max_ms: dict[str, float] = {}
+        self._overruns: dict[str, int] = {}  # {feature: overruns in a row}
+        self._running: dict[int, list] = {}  # {thread id: [callback name, start time ns, stack sample or None]}
+        self._wake = Event()
+        self._stop = Event()
+        self._thread: Thread | None = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = Thread(target=self._run, name="smart_replays_watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float | None = None):
+        thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        thread.join(timeout)
+
+    def configure(self, budget_ms: int, auto_disable: bool):
+        self.budget_ms = budget_ms
+        self.auto_disable = auto_disable
+
+    def call(self, name: str, feature: str | None, fn: Callable, *args, **kwargs):
+        """
+        Calls `fn` and measures it. Calls can be nested (a watched callback calls another one),
+        the monitor thread watches the innermost one.
+        """
+        thread_id = threading_get_native_id()
+        run = [name, time.perf_counter_ns(), None]
+        outer_run = self._running.get(thread_id)
+        self._running[thread_id] = run
+        self._wake.set()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            if outer_run is not None:
+                self._running[thread_id] = outer_run
+            else:
+                self._running.pop(thread_id, None)
+            self._account(run, feature, (time.perf_counter_ns() - run[1]) / 1e6)
+
+    def get_stats(self) -> dict[str, dict]:
+        """
+        :return: {callback name: {"max_ms": ..., "histogram": {"<1ms": count, ..., ">=1024ms": count}}}
+        """
+        labels = [f"<{i}ms" for i in self.BUCKETS_MS] + [f">={self.BUCKETS_MS[-1]}ms"]
+        return {name: {"max_ms": round(self._max_ms[name], 3),
+                       "histogram": {label: count for label, count in zip(labels, histogram) if count}}
+                for name, histogram in self._histograms.items()}
+
+    def _account(self, run: list, feature: str | None, duration_ms: float):
+        name = run[0]
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            histogram = self._histograms[name] = [0] * (len(self.BUCKETS_MS) + 1)
+        bucket = 0
+        while bucket < len(self.BUCKETS_MS) and duration_ms >= self.BUCKETS_MS[bucket]:
+            bucket += 1
+        histogram[bucket] += 1
+        self._max_ms[name] = max(self._max_ms.get(name, 0), duration_ms)
+
+        if not self.budget_ms or duration_ms <= self.budget_ms:
+            if feature is not None:
+                self._overruns[feature] = 0
+            return
+
+        log.warning("[watchdog] %s took %.1fms (budget %sms).", name, duration_ms, self.budget_ms)
+        if run[2]:
+            log.warning("[watchdog] Stack sample of %s:\n%s", name, run[2])
+
+        if feature is None:
+            return
+        self._overruns[feature] = self._overruns.get(feature, 0) + 1
+        if self.auto_disable and self._overruns[feature] >= self.max_overruns:
+            self.disabled_features.add(feature)
+            log.warning("[watchdog] %s is disabled until the script is reloaded (%s overruns in a row).",
+                        feature, self._overruns[feature])
+
+    def _run(self):
+        while not self._stop.is_set():
+            if not self._running or not self.budget_ms:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+
+            now = time.perf_counter_ns()
+            frames = None
+            for thread_id, run in list(self._running.items()):
+                if run[2] is None and (now - run[1]) / 1e6 > self.budget_ms:
+                    if frames is None:
+                        frames = sys._current_frames()
+                    frame = next((f for t in threading_enumerate() if t.native_id == thread_id
+                                  for f in (frames.get(t.ident),) if f is not None), None)
+                    run[2] = "".join(traceback.format_stack(frame, limit=CONSTANTS.WATCHDOG_STACK_DEPTH)) \
+                        if frame is not None else None
+            self._stop.wait(self.budget_ms / 2000)
+
+
+def watched_callback(feature: str | None = None, name: str | None = None):
+    """
+    Decorator for OBS callbacks: calls are measured by the callback watchdog (if it's started).
+
+    :param feature: name of the optional feature the callback belongs to. The callback does nothing
+        if the watchdog disabled the feature.
+    :param name: callback name in logs and stats (function name by default).
+    """
+    def decorator(fn: Callable) -> Callable:
+        callback_name = name or fn.__name__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            watchdog = VARIABLES.watchdog
+            if watchdog is None:
+                return fn(*args, **kwargs)
+            if feature is not None and feature in watchdog.disabled_features:
+                return None
+            return watchdog.call(callback_name, feature, fn, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
 # -------------------- properties_callbacks.py --------------------
 # All UI callbacks have the same parameters:
 # p: properties object (controls the properties UI)
 # prop: property that changed
 # data: script settings
 # Usually I don't use `data`, cuz we have script_settings global variable.
+@watched_callback()
 def open_github_callback(*args):
     webbrowser.open("https://github.com/qvvonk/smart_replays", 1)
 
 
+@watched_callback()
 def update_aliases_callback(p, prop, data):
     """
     Checks the list of aliases and updates aliases menu (shows / hides error texts).
@@ -956,6 +1915,37 @@ def update_aliases_callback(p, prop, data):
     return True
 
 
+@watched_callback()
+def update_retention_rules_callback(p, prop, data):
+    """
+    Checks the list of retention rules, removes the first invalid rule and shows error text.
+    """
+    err_text = obs.obs_properties_get(p, PN.TXT_RETENTION_RULES_INVALID_FORMAT)
+    settings_json: dict = json.loads(obs.obs_data_get_json(data))
+    rules = settings_json.get(PN.PROP_RETENTION_RULES) or []
+
+    for index, rule in enumerate(rules):
+        try:
+            RetentionRule.parse(rule.get("value"))
+        except RetentionRuleInvalidFormat:
+            break
+    else:
+        obs.obs_property_set_visible(err_text, False)
+        return True
+
+    obs.obs_property_set_visible(err_text, True)
+    rules.pop(index)
+    new_rules_array = obs.obs_data_array_create()
+    for index, rule in enumerate(rules):
+        rule_data = obs.obs_data_create_from_json(json.dumps(rule))
+        obs.obs_data_array_insert(new_rules_array, index, rule_data)
+
+    obs.obs_data_set_array(data, PN.PROP_RETENTION_RULES, new_rules_array)
+    obs.obs_data_array_release(new_rules_array)
+    return True
+
+
+@watched_callback()
 def check_filename_template_callback(p, prop, data):
     """
     Checks filename template.
@@ -964,13 +1954,16 @@ def check_filename_template_callback(p, prop, data):
     error_text = obs.obs_properties_get(p, PN.TXT_CLIPS_FILENAME_TEMPLATE_ERR)
 
     try:
-        gen_filename("clipname", obs.obs_data_get_string(data, PN.PROP_CLIPS_FILENAME_TEMPLATE))
+        FilenameTemplate.compile(obs.obs_data_get_string(data, PN.PROP_CLIPS_FILENAME_TEMPLATE))
         obs.obs_property_set_visible(error_text, False)
-    except:
+    except FilenameTemplateError as e:
+        obs.obs_property_set_description(error_text,
+                                         f"<font color=\"red\"><pre> Invalid format: {html_escape(str(e))}</pre></font>")
         obs.obs_property_set_visible(error_text, True)
     return True
 
 
+@watched_callback()
 def update_links_path_prop_visibility(p, prop, data):
     path_prop = obs.obs_properties_get(p, PN.PROP_CLIPS_LINKS_FOLDER_PATH)
     path_warn_prop = obs.obs_properties_get(p, PN.TXT_CLIPS_LINKS_FOLDER_PATH_WARNING)
@@ -981,26 +1974,28 @@ def update_links_path_prop_visibility(p, prop, data):
     return True
 
 
+@watched_callback()
 def check_clips_links_folder_path_callback(p, prop, data):
     """
-    Checks clips links folder path is in the same disk as OBS recordings path.
-    If it's not - sets OBS records path as base path for clips + '_links' and shows warning.
+    Checks clips links folder path is in the same disk as clips base path (hard links can't cross disks).
+    If it's not - sets clips base path + '_links' as links folder path and shows warning.
     """
     warn_text = obs.obs_properties_get(p, PN.TXT_CLIPS_LINKS_FOLDER_PATH_WARNING)
 
-    obs_records_path = Path(get_base_path())
+    clips_path = Path(obs.obs_data_get_string(data, PN.PROP_CLIPS_BASE_PATH) or get_base_path())
     curr_path = Path(obs.obs_data_get_string(data, PN.PROP_CLIPS_LINKS_FOLDER_PATH))
 
-    if not len(curr_path.parts) or obs_records_path.parts[0] == curr_path.parts[0]:
+    if not len(curr_path.parts) or clips_path.parts[0] == curr_path.parts[0]:
         obs.obs_property_text_set_info_type(warn_text, obs.OBS_TEXT_INFO_WARNING)
     else:
         obs.obs_property_text_set_info_type(warn_text, obs.OBS_TEXT_INFO_ERROR)
         obs.obs_data_set_string(data,
                                 PN.PROP_CLIPS_LINKS_FOLDER_PATH,
-                                str(obs_records_path / '_links'))
+                                str(clips_path / '_links'))
     return True
 
 
+@watched_callback()
 def update_notifications_menu_callback(p, prop, data):
     """
     Updates notifications settings menu.
@@ -1017,10 +2012,12 @@ def update_notifications_menu_callback(p, prop, data):
     return True
 
 
+@watched_callback()
 def check_base_path_callback(p, prop, data):
     """
     Checks base path is in the same disk as OBS recordings path.
-    If it's not - sets OBS records path as base path for clips and shows warning.
+    If it's not - shows warning that clips will be copied in the background.
+    Re-checks links folder path, since it must be on the same disk as base path.
     """
     warn_text = obs.obs_properties_get(p, PN.TXT_CLIPS_BASE_PATH_WARNING)
 
@@ -1028,14 +2025,24 @@ def check_base_path_callback(p, prop, data):
     curr_path = Path(obs.obs_data_get_string(data, PN.PROP_CLIPS_BASE_PATH))
 
     if not len(curr_path.parts) or obs_records_path.parts[0] == curr_path.parts[0]:
-        obs.obs_property_text_set_info_type(warn_text, obs.OBS_TEXT_INFO_WARNING)
+        obs.obs_property_text_set_info_type(warn_text, obs.OBS_TEXT_INFO_NORMAL)
     else:
-        obs.obs_property_text_set_info_type(warn_text, obs.OBS_TEXT_INFO_ERROR)
-        obs.obs_data_set_string(data, PN.PROP_CLIPS_BASE_PATH, str(obs_records_path))
-        print("WARN")
+        obs.obs_property_text_set_info_type(warn_text, obs.OBS_TEXT_INFO_WARNING)
+
+    check_clips_links_folder_path_callback(p, prop, data)
+    return True
+
+
+@watched_callback()
+def refresh_save_latency_callback(p, prop):
+    """
+    Updates save latency percentiles text.
+    """
+    obs.obs_property_set_description(obs.obs_properties_get(p, PN.TXT_SAVE_LATENCY), format_latency_summary())
     return True
 
 
+@watched_callback()
 def import_aliases_from_json_callback(*args):
     """
     Imports aliases from JSON file.
@@ -1061,6 +2068,7 @@ def import_aliases_from_json_callback(*args):
     return True
 
 
+@watched_callback()
 def export_aliases_to_json_callback(*args):
     """
     Exports aliases to JSON file.
@@ -1076,15 +2084,145 @@ def export_aliases_to_json_callback(*args):
         f.write(json.dumps(aliases_dict, ensure_ascii=False))
 
 
-# -------------------- tech.py --------------------
-class LASTINPUTINFO(ctypes.Structure):
-    _fields_ = [("cbSize", wintypes.UINT),
-                ("dwTime", wintypes.DWORD)]
-
+# -------------------- log.py --------------------
+class Logger:
+    """
+    Leveled logger with lazy formatting.
 
-def _print(*values, sep: str | None = None, end: str | None = None, file=None, flush: bool = False):
-    str_time = datetime.now().strftime(f"%d.%m.%Y %H:%M:%S")
-    print(f"[{str_time}]", *values, sep=sep, end=end, file=file, flush=flush)
+    Logging call only checks the level and appends the record to a ring buffer (deque appends are atomic,
+    no locks are taken). Records are formatted and written to the script log (and optionally to a file)
+    by the logger thread. Disabled levels are replaced with a no-op, so their calls cost a function call only.
+    If the ring buffer overflows (the logger thread is not started or can't keep up), the oldest records are lost.
+    """
+    DEBUG = 10
+    INFO = 20
+    WARNING = 30
+    ERROR = 40
+    LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
+    def __init__(self, size: int, drain_interval: float, max_file_size: int):
+        """
+        :param size: max amount of records in the ring buffer.
+        :param drain_interval: interval of writing records (in seconds).
+        :param max_file_size: when the log file exceeds this size (in bytes), it's renamed to *.1
+            and a new one is started.
+        """
+        self.drain_interval = drain_interval
+        self.max_file_size = max_file_size
+        self.level = self.INFO
+        self.file_path: Path | None = None
+        self._records: deque[tuple] = deque(maxlen=size)  # (timestamp, level, message, args, exception text)
+        self._stop = Event()
+        self._thread: Thread | None = None
+        self.configure(self.INFO)
+
+    @property
+    def debug_enabled(self) -> bool:
+        return self.level <= self.DEBUG
+
+    def configure(self, level: int, file_path: Path | None = None):
+        """
+        :param level: min level of logged records.
+        :param file_path: if set, records are also written to this file.
+        """
+        self.level = level
+        self.file_path = file_path
+        for method_level, name in ((self.DEBUG, "debug"), (self.INFO, "info"),
+                                   (self.WARNING, "warning"), (self.ERROR, "error")):
+            if method_level < level:
+                setattr(self, name, self._discard)
+            else:
+                # Binds the level now, so the call doesn't look it up.
+                setattr(self, name, lambda msg, *args, exc_info=False, _level=method_level:
+                        self._log(_level, msg, args, exc_info))
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = Thread(target=self._run, name="smart_replays_log", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float | None = None):
+        """
+        Writes the remaining records and stops the logger thread.
+        """
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join(timeout)
+        self.drain()
+
+    def drain(self):
+        """
+        Formats and writes records from the ring buffer.
+        """
+        lines = []
+        while True:
+            try:
+                created_at, level, msg, args, exc_text = self._records.popleft()
+            except IndexError:
+                break
+            if args:
+                try:
+                    msg = msg % args
+                except (TypeError, ValueError):
+                    msg = f"{msg} {args}"
+            str_time = datetime.fromtimestamp(created_at).strftime("%d.%m.%Y %H:%M:%S")
+            level_name = "" if level == self.INFO else f" [{self.LEVEL_NAMES[level]}]"
+            lines.append(f"[{str_time}]{level_name} {msg}")
+            if exc_text:
+                lines.append(exc_text.rstrip())
+        if not lines:
+            return
+
+        text = "\n".join(lines)
+        print(text, flush=True)
+        if self.file_path is not None:
+            self._write_file(text)
+
+    def _log(self, level: int, msg: str, args: tuple, exc_info: bool):
+        self._records.append((time.time(), level, msg, args, traceback.format_exc() if exc_info else None))
+
+    @staticmethod
+    def _discard(*args, **kwargs):
+        pass
+
+    def _write_file(self, text: str):
+        try:
+            os.makedirs(self.file_path.parent, exist_ok=True)
+            with suppress(FileNotFoundError):
+                if os.path.getsize(self.file_path) > self.max_file_size:
+                    os.replace(self.file_path, self.file_path.with_name(self.file_path.name + ".1"))
+            with open(self.file_path, "a", encoding="utf-8") as f:
+                f.write(text + "\n")
+        except OSError as e:
+            print(f"Failed to write log file {self.file_path}: {e}")
+            self.file_path = None
+
+    def _run(self):
+        while not self._stop.wait(self.drain_interval):
+            self.drain()
+
+
+log = Logger(size=CONSTANTS.LOG_BUFFER_SIZE,
+             drain_interval=CONSTANTS.LOG_DRAIN_INTERVAL,
+             max_file_size=CONSTANTS.LOG_MAX_FILE_SIZE)
+
+
+def update_logging():
+    """
+    Applies log level and log file settings.
+    """
+    settings = VARIABLES.settings
+    log.configure(level=Logger.DEBUG if settings.debug_logging else Logger.INFO,
+                  file_path=CONSTANTS.LOG_FILE_PATH if settings.log_to_file else None)
+
+
+# -------------------- tech.py --------------------
+class LASTINPUTINFO(ctypes.Structure):
+    _fields_ = [("cbSize", wintypes.UINT),
+                ("dwTime", wintypes.DWORD)]
 
 
 def get_active_window_pid() -> int | None:
@@ -1104,398 +2242,2957 @@ def get_executable_path(pid: int) -> Path:
     :param pid: process ID.
     :return: Executable path.
     """
-    process_handle = ctypes.windll.kernel32.OpenProcess(0x0400 | 0x0010, False, pid)
-    # PROCESS_QUERY_INFORMATION | PROCESS_VM_READ
+    if VARIABLES.exe_resolver is None:
+        VARIABLES.exe_resolver = ExecutableResolver(create_process_info_backend(),
+                                                    max_size=CONSTANTS.EXE_RESOLVER_CACHE_SIZE)
+    return VARIABLES.exe_resolver.resolve(pid)
+
+
+def play_sound(path: str | Path):
+    """
+    Plays sound using windows engine.
+
+    :param path: path to sound (.wav)
+    """
+    with suppress(Exception):
+        winsound.PlaySound(str(path), winsound.SND_ASYNC)
+
+
+def get_time_since_last_input() -> int:
+    """
+    Gets the time (in seconds) since the last mouse or keyboard input.
+    """
+    last_input_info = LASTINPUTINFO()
+    last_input_info.cbSize = ctypes.sizeof(LASTINPUTINFO)
+
+    if ctypes.windll.user32.GetLastInputInfo(ctypes.byref(last_input_info)):
+        current_time = ctypes.windll.kernel32.GetTickCount()
+        idle_time_ms = current_time - last_input_info.dwTime
+        return idle_time_ms // 1000
+    return 0
+
+
+def create_hard_link(file_path: Path | str, links_folder: Path | str) -> Path:
+    """
+    Creates a hard link for `file_path`.
+    If the name is already taken in `links_folder`, a numerical suffix is added.
+
+    :param file_path: Original file path.
+    :param links_folder: Folder where the link will be created.
+    :return: Link path.
+    """
+    return get_name_allocator().link(file_path, links_folder, Path(file_path).name)
+
+
+def find_hard_link(file_path: Path | str, links_folder: Path | str) -> Path | None:
+    """
+    Finds the hard link created by `create_hard_link` for `file_path`.
+    Names are probed in the order they are allocated ("name.ext", "name (1).ext", ...) up to the first free one.
+
+    :return: Link path or None if there is no link.
+    """
+    file_path = Path(file_path)
+    counter = 0
+    while True:
+        name = file_path.name if not counter else f"{file_path.stem} ({counter}){file_path.suffix}"
+        link = Path(links_folder) / name
+        counter += 1
+        try:
+            if os.path.samefile(link, file_path):
+                return link
+        except OSError:
+            return None
+
+
+def is_same_volume(path: Path | str, folder: Path | str) -> bool:
+    """
+    Checks whether `path` and `folder` are on the same volume (file can be renamed / hard linked between them).
+    `folder` may not exist yet, in this case its closest existing parent is checked.
+    """
+    folder = Path(folder).absolute()
+    while not folder.exists() and folder.parent != folder:
+        folder = folder.parent
+    return os.stat(path).st_dev == os.stat(folder).st_dev
+
+
+def set_current_thread_background_priority():
+    """
+    Lowers CPU and I/O priority of the current thread, so it doesn't interfere with the game and OBS.
+    """
+    with suppress(Exception):
+        if sys.platform == "win32":
+            kernel32 = ctypes.windll.kernel32
+            kernel32.SetThreadPriority(kernel32.GetCurrentThread(), CONSTANTS.THREAD_MODE_BACKGROUND_BEGIN)
+        else:
+            os.setpriority(os.PRIO_PROCESS, threading_get_native_id(), 19)
+
+
+def get_name_allocator() -> "UniqueNameAllocator":
+    """
+    Returns the unique file names allocator (creates it on first use).
+    """
+    if VARIABLES.name_allocator is None:
+        VARIABLES.name_allocator = UniqueNameAllocator(max_folders=CONSTANTS.KNOWN_FOLDERS_CACHE_SIZE)
+    return VARIABLES.name_allocator
+
+
+# -------------------- process_info.py --------------------
+class ProcessInfoBackend:
+    """
+    Platform interface for getting information about processes.
+    `handle` is whatever `open_process` returns for the platform.
+    """
+    pins_pid: bool = False
+    """If True, the PID cannot be reused by another process while its handle is open."""
+
+    def open_process(self, pid: int) -> Any:
+        raise NotImplementedError
+
+    def close_process(self, handle: Any):
+        raise NotImplementedError
+
+    def get_creation_time(self, handle: Any) -> int:
+        raise NotImplementedError
+
+    def get_image_path(self, handle: Any) -> Path:
+        raise NotImplementedError
+
+
+class WindowsProcessInfoBackend(ProcessInfoBackend):
+    """
+    Uses PROCESS_QUERY_LIMITED_INFORMATION access, so it works with elevated and protected processes,
+    and QueryFullProcessImageNameW, so paths are not truncated at 260 characters.
+    """
+    PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+    MAX_PATH_LENGTH = 32767
+    pins_pid = True
+
+    def __init__(self):
+        self._kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+
+        self._kernel32.OpenProcess.argtypes = [wintypes.DWORD, wintypes.BOOL, wintypes.DWORD]
+        self._kernel32.OpenProcess.restype = wintypes.HANDLE
+        self._kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+        self._kernel32.CloseHandle.restype = wintypes.BOOL
+        self._kernel32.GetProcessTimes.argtypes = [wintypes.HANDLE] + [ctypes.POINTER(wintypes.FILETIME)] * 4
+        self._kernel32.GetProcessTimes.restype = wintypes.BOOL
+        self._kernel32.QueryFullProcessImageNameW.argtypes = [wintypes.HANDLE, wintypes.DWORD,
+                                                              wintypes.LPWSTR, ctypes.POINTER(wintypes.DWORD)]
+        self._kernel32.QueryFullProcessImageNameW.restype = wintypes.BOOL
+
+        self._buffer = ctypes.create_unicode_buffer(self.MAX_PATH_LENGTH)
+
+    def open_process(self, pid: int) -> int:
+        handle = self._kernel32.OpenProcess(self.PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            raise OSError(f"Process {pid} does not exist.")
+        return handle
+
+    def close_process(self, handle: int):
+        self._kernel32.CloseHandle(handle)
+
+    def get_creation_time(self, handle: int) -> int:
+        creation_time, exit_time, kernel_time, user_time = (wintypes.FILETIME() for _ in range(4))
+        if not self._kernel32.GetProcessTimes(handle,
+                                              ctypes.byref(creation_time),
+                                              ctypes.byref(exit_time),
+                                              ctypes.byref(kernel_time),
+                                              ctypes.byref(user_time)):
+            raise OSError(ctypes.get_last_error(), "Cannot get process creation time.")
+        return (creation_time.dwHighDateTime << 32) | creation_time.dwLowDateTime
+
+    def get_image_path(self, handle: int) -> Path:
+        size = wintypes.DWORD(self.MAX_PATH_LENGTH)
+        if not self._kernel32.QueryFullProcessImageNameW(handle, 0, self._buffer, ctypes.byref(size)):
+            raise RuntimeError("Cannot get process executable path.")
+        return Path(self._buffer.value[:size.value])
+
+
+class ProcFSProcessInfoBackend(ProcessInfoBackend):
+    """
+    Linux backend (/proc/<pid>/). Used for testing and benchmarking outside of Windows.
+    """
+    def open_process(self, pid: int) -> int:
+        if not os.path.isdir(f"/proc/{pid}"):
+            raise OSError(f"Process {pid} does not exist.")
+        return pid
+
+    def close_process(self, handle: int):
+        pass
+
+    def get_creation_time(self, handle: int) -> int:
+        with open(f"/proc/{handle}/stat", "rb") as f:
+            data = f.read()
+        # Process name (2nd field) can contain spaces and brackets, so fields are counted from the last ')'.
+        # starttime is the 22nd field.
+        return int(data[data.rindex(b")") + 2:].split()[19])
+
+    def get_image_path(self, handle: int) -> Path:
+        return Path(os.readlink(f"/proc/{handle}/exe"))
+
+
+def create_process_info_backend() -> ProcessInfoBackend:
+    """
+    Returns process info backend for the current platform.
+    """
+    if sys.platform == "win32":
+        return WindowsProcessInfoBackend()
+    return ProcFSProcessInfoBackend()
+
+
+class ExecutableResolver:
+    """
+    Resolves process IDs to executable paths.
+
+    Paths are stored in LRU cache keyed by (pid, process creation time), so a reused PID never returns
+    a path of a dead process.
+    If the backend pins PIDs, handles of cached processes are kept open, so their PIDs cannot be reused
+    and a cache hit is a single dict lookup without any system calls.
+    """
+    def __init__(self, backend: ProcessInfoBackend, max_size: int = 64):
+        """
+        :param backend: process info backend.
+        :param max_size: max amount of cached processes.
+        """
+        self.backend = backend
+        self.max_size = max_size
+        self._cache: OrderedDict[tuple[int, int], Path] = OrderedDict()
+        self._pinned: dict[int, tuple[tuple[int, int], Any]] = {}  # {pid: ((pid, creation_time), handle)}
+        self._lock = Lock()
+
+    def resolve(self, pid: int) -> Path:
+        """
+        Returns executable path of the process.
+        Raises OSError if the process cannot be opened.
+        """
+        with self._lock:
+            if (pinned := self._pinned.get(pid)) is not None:
+                self._cache.move_to_end(pinned[0])
+                return self._cache[pinned[0]]
+
+            handle = self.backend.open_process(pid)
+            try:
+                key = (pid, self.backend.get_creation_time(handle))
+                path = self._cache.get(key)
+                if path is None:
+                    path = self.backend.get_image_path(handle)
+                    self._cache[key] = path
+                self._cache.move_to_end(key)
+
+                if self.backend.pins_pid:
+                    self._pinned[pid] = (key, handle)
+                    handle = None
+                self._evict()
+            finally:
+                if handle is not None:
+                    self.backend.close_process(handle)
+            return path
+
+    def clear(self):
+        """
+        Clears the cache and closes all opened handles.
+        """
+        with self._lock:
+            for _, handle in self._pinned.values():
+                self.backend.close_process(handle)
+            self._pinned.clear()
+            self._cache.clear()
+
+    def _evict(self):
+        while len(self._cache) > self.max_size:
+            key, _ = self._cache.popitem(last=False)
+            pinned = self._pinned.get(key[0])
+            if pinned is not None and pinned[0] == key:
+                del self._pinned[key[0]]
+                self.backend.close_process(pinned[1])
+
+
+# -------------------- exe_history.py --------------------
+class ExeHistory:
+    """
+    History of active executables with a fixed amount of samples (1 sample per second).
+
+    Executables are interned into integer ids and stored as run-length segments [exe_id, samples_amount],
+    so memory depends on the amount of app switches, not on the history length.
+    Per-executable sample counters are updated on append and on expiration of old samples,
+    so the most common executable is found in O(distinct executables).
+    """
+    def __init__(self, max_size: int):
+        """
+        :param max_size: max amount of samples (usually replay buffer length in seconds).
+        """
+        self.max_size = max_size
+        self._segments: deque[list[int]] = deque()  # [[exe_id, samples_amount], ...], oldest first
+        self._counts: dict[int, int] = {}  # {exe_id: samples_amount}
+        self._last_seen: dict[int, int] = {}  # {exe_id: number of the last sample}
+        self._ids: dict[Path, int] = {}
+        self._paths: list[Path | None] = []
+        self._free_ids: list[int] = []
+        self._size = 0
+        self._samples_total = 0
+
+    def __len__(self):
+        return self._size
+
+    def append(self, exe: Path):
+        """
+        Adds a new sample. If history is full, the oldest sample expires.
+        """
+        exe_id = self._intern(exe)
+        if self._segments and self._segments[-1][0] == exe_id:
+            self._segments[-1][1] += 1
+        else:
+            self._segments.append([exe_id, 1])
+
+        self._counts[exe_id] = self._counts.get(exe_id, 0) + 1
+        self._samples_total += 1
+        self._last_seen[exe_id] = self._samples_total
+        self._size += 1
+
+        while self._size > self.max_size:
+            self._expire_oldest()
+
+    def most_common(self, last: int | None = None) -> Path | None:
+        """
+        Returns executable with the most samples. If there are several, returns the most recently seen one.
+
+        :param last: count only the last `last` samples (None - the whole history).
+        """
+        if not self._counts:
+            return None
+        if last is None or last >= self._size:
+            counts, last_seen = self._counts, self._last_seen
+        else:
+            counts, last_seen = self._count_last(last)
+        exe_id = max(counts, key=lambda i: (counts[i], last_seen[i]))
+        return self._paths[exe_id]
+
+    def clear(self):
+        self._segments.clear()
+        self._counts.clear()
+        self._last_seen.clear()
+        self._ids.clear()
+        self._paths.clear()
+        self._free_ids.clear()
+        self._size = 0
+
+    def _count_last(self, last: int) -> tuple[dict[int, int], dict[int, int]]:
+        """
+        Counts samples of the last `last` samples. Walks segments from the newest one.
+
+        :return: ({exe_id: samples_amount}, {exe_id: number of the last sample})
+        """
+        counts: dict[int, int] = {}
+        last_seen: dict[int, int] = {}
+        position = self._samples_total
+        remaining = max(last, 1)
+        for exe_id, amount in reversed(self._segments):
+            taken = min(amount, remaining)
+            counts[exe_id] = counts.get(exe_id, 0) + taken
+            last_seen.setdefault(exe_id, position)
+            position -= amount
+            remaining -= taken
+            if not remaining:
+                break
+        return counts, last_seen
+
+    def _intern(self, exe: Path) -> int:
+        exe_id = self._ids.get(exe)
+        if exe_id is not None:
+            return exe_id
+
+        if self._free_ids:
+            exe_id = self._free_ids.pop()
+            self._paths[exe_id] = exe
+        else:
+            exe_id = len(self._paths)
+            self._paths.append(exe)
+        self._ids[exe] = exe_id
+        return exe_id
+
+    def _expire_oldest(self):
+        segment = self._segments[0]
+        exe_id = segment[0]
+        segment[1] -= 1
+        if not segment[1]:
+            self._segments.popleft()
+
+        self._size -= 1
+        self._counts[exe_id] -= 1
+        if not self._counts[exe_id]:
+            # Executable is not in the history anymore, release its id.
+            del self._counts[exe_id]
+            del self._last_seen[exe_id]
+            del self._ids[self._paths[exe_id]]
+            self._paths[exe_id] = None
+            self._free_ids.append(exe_id)
+
+
+# -------------------- obs_related.py --------------------
+def get_obs_config(section_name: str | None = None,
+                   param_name: str | None = None,
+                   value_type: type[str, int, bool, float] = str,
+                   config_type: ConfigTypes = ConfigTypes.PROFILE):
+    """
+    Gets a value from OBS config.
+    If the value is not set, it will use the default value. If there is no default value, it will return NULL.
+    If section_name or param_name are not specified, returns OBS config obj.
+
+    :param section_name: Section name. If not specified, returns the OBS config.
+    :param param_name: Parameter name. If not specified, returns the OBS config.
+    :param value_type: Type of value (str, int, bool, float).
+    :param config_type: Which config search in? (global / profile / user (obs v31 or higher)
+    """
+    if config_type is ConfigTypes.PROFILE:
+        cfg = obs.obs_frontend_get_profile_config()
+    elif config_type is ConfigTypes.APP:
+        cfg = obs.obs_frontend_get_global_config()
+    else:
+        if CONSTANTS.OBS_VERSION[0] < 31:
+            cfg = obs.obs_frontend_get_global_config()
+        else:
+            cfg = obs.obs_frontend_get_user_config()
+
+    if not section_name or not param_name:
+        return cfg
+
+    functions = {
+        str: obs.config_get_string,
+        int: obs.config_get_int,
+        bool: obs.config_get_bool,
+        float: obs.config_get_double
+    }
+
+    if value_type not in functions.keys():
+        raise ValueError("Unsupported type.")
+
+    return functions[value_type](cfg, section_name, param_name)
+
+
+def get_last_replay_file_name() -> str:
+    """
+    Returns the last saved buffer file name.
+    """
+    replay_buffer = obs.obs_frontend_get_replay_buffer_output()
+    cd = obs.calldata_create()
+    proc_handler = obs.obs_output_get_proc_handler(replay_buffer)
+    obs.proc_handler_call(proc_handler, 'get_last_replay', cd)
+    path = obs.calldata_string(cd, 'path')
+    obs.calldata_destroy(cd)
+    obs.obs_output_release(replay_buffer)
+    return path
+
+
+def get_current_scene_name() -> str:
+    """
+    Returns the current OBS scene name.
+    """
+    current_scene = obs.obs_frontend_get_current_scene()
+    name = obs.obs_source_get_name(current_scene)
+    obs.obs_source_release(current_scene)
+    return name
+
+
+class ProfileConfigCache:
+    """
+    Cache of OBS profile config values.
+
+    Values are requested from OBS only on the first access after invalidation.
+    Cache is invalidated on profile change events (see `on_profile_changed_callback`). Every invalidation increases
+    the generation, and a value requested from OBS is stored only if the generation hasn't changed meanwhile,
+    so a value from the previous profile cannot get into the cache after a profile switch.
+    """
+    _MISSING = object()
+
+    def __init__(self):
+        self._values: dict[tuple[str, str, type], Any] = {}
+        self._generation = 0
+        self._lock = Lock()
+
+    def get(self, section_name: str, param_name: str, value_type: type[str, int, bool, float] = str):
+        """
+        Returns a value from OBS profile config (see `get_obs_config`).
+        """
+        key = (section_name, param_name, value_type)
+        value = self._values.get(key, self._MISSING)
+        if value is not self._MISSING:
+            return value
+
+        generation = self._generation
+        value = get_obs_config(section_name, param_name, value_type, ConfigTypes.PROFILE)
+        with self._lock:
+            if generation == self._generation:
+                self._values[key] = value
+        return value
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._values = {}
+
+
+def get_profile_config_value(section_name: str, param_name: str, value_type: type[str, int, bool, float] = str):
+    """
+    Returns a cached value from OBS profile config.
+    """
+    if VARIABLES.profile_config is None:
+        VARIABLES.profile_config = ProfileConfigCache()
+    return VARIABLES.profile_config.get(section_name, param_name, value_type)
+
+
+def get_replay_buffer_max_time() -> int:
+    """
+    Returns replay buffer max time from OBS config (in seconds).
+    """
+    config_mode = get_profile_config_value("Output", "Mode")
+    if config_mode == "Simple":
+        return get_profile_config_value("SimpleOutput", "RecRBTime", int)
+    else:
+        return get_profile_config_value("AdvOut", "RecRBTime", int)
+
+
+def get_base_path(script_settings: ScriptSettings | None = None) -> Path:
+    """
+    Returns the base path for clips, either from the script settings or OBS config.
+
+    :param script_settings: Script settings snapshot. If not provided, base path returns from OBS config.
+    :return: The base path as a `Path` object.
+    """
+    if script_settings is not None:
+        script_path = script_settings.clips_base_path
+        # If PN.PROP_CLIPS_BASE_PATH is not saved in the script config, then it has a default value,
+        # which is the value from the OBS config.
+        if script_path:
+            return Path(script_path)
+
+    config_mode = get_profile_config_value("Output", "Mode")
+    if config_mode == "Simple":
+        return Path(get_profile_config_value("SimpleOutput", "FilePath"))
+    else:
+        return Path(get_profile_config_value("AdvOut", "RecFilePath"))
+
+
+def restart_replay_buffering(stop_timeout: float, stop_retries: int):
+    """
+    Restarts replay buffering, obviously -_-
+    Waits for REPLAY_BUFFER_STOPPED event instead of polling the output.
+    If the buffer doesn't stop in `stop_timeout` seconds, sends stop request again (up to `stop_retries` times).
+
+    :param stop_timeout: max time to wait for replay buffer to stop (in seconds).
+    :param stop_retries: amount of additional stop requests.
+    """
+    if not CONSTANTS.RESTART_BUFFER_LOCK.acquire(blocking=False):
+        log.info("Replay buffering is already restarting.")
+        return
+
+    try:
+        VARIABLES.restart_requested_at = time.perf_counter()
+        if obs.obs_frontend_replay_buffer_active():
+            for attempt in range(stop_retries + 1):
+                log.debug("Stopping replay buffering (attempt %s/%s)...", attempt + 1, stop_retries + 1)
+                VARIABLES.replay_buffer_stopped_event.clear()
+                obs.obs_frontend_replay_buffer_stop()
+
+                if VARIABLES.replay_buffer_stopped_event.wait(stop_timeout):
+                    break
+                log.warning("Replay buffering is not stopped in %ss.", stop_timeout)
+            else:
+                log.error("Failed to stop replay buffering. Restart is cancelled.")
+                VARIABLES.restart_requested_at = None
+                return
+            log.debug("Replay buffering stopped.")
+
+        log.debug("Starting replay buffering...")
+        obs.obs_frontend_replay_buffer_start()
+    finally:
+        CONSTANTS.RESTART_BUFFER_LOCK.release()
+
+
+def on_replay_buffering_restarted():
+    """
+    Records restart gap (time from stop request to replay buffer start), i.e. how many seconds were not buffered.
+    Called on REPLAY_BUFFER_STARTED event.
+    """
+    if VARIABLES.restart_requested_at is None:
+        return
+
+    gap = time.perf_counter() - VARIABLES.restart_requested_at
+    VARIABLES.restart_requested_at = None
+    VARIABLES.restart_gaps.append(gap)
+    log.info("Replay buffering restarted. Restart gap: %.3fs (avg: %.3fs, max: %.3fs, restarts: %s).",
+             gap, sum(VARIABLES.restart_gaps) / len(VARIABLES.restart_gaps),
+             max(VARIABLES.restart_gaps), len(VARIABLES.restart_gaps))
+
+
+def start_replay_buffering_restart():
+    """
+    Starts replay buffering restart in a separate thread.
+    """
+    stop_timeout = VARIABLES.settings.restart_buffer_stop_timeout
+    stop_retries = VARIABLES.settings.restart_buffer_stop_retries
+
+    # IMPORTANT
+    # I don't know why, but it seems like stopping and starting replay buffering should be in the separate thread.
+    # Otherwise it can "stuck" on stopping.
+    Thread(target=restart_replay_buffering, args=(stop_timeout, stop_retries), daemon=True).start()
+
+
+# -------------------- workers.py --------------------
+class BackgroundWorker:
+    """
+    Single thread job queue.
+    Used to take slow work (disk I/O, subprocesses) out of OBS callbacks.
+    """
+    def __init__(self, name: str, max_size: int, put_timeout: float):
+        """
+        :param name: worker name (also used as thread name).
+        :param max_size: max amount of pending jobs.
+        :param put_timeout: how long `submit` can wait for a free slot if the queue is full (in seconds).
+        """
+        self.name = name
+        self.put_timeout = put_timeout
+        self._queue = Queue(maxsize=max_size)
+        self._lock = Lock()
+        self._thread: Thread | None = None
+        self._closed = False
+
+    def start(self):
+        """
+        Starts worker thread (if it's not started yet).
+        """
+        with self._lock:
+            self._closed = False
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def submit(self, fn, *args, **kwargs) -> Future | None:
+        """
+        Adds a job to the queue.
+        If the queue is full, blocks for up to `put_timeout` seconds (back-pressure) and then gives up.
+
+        :return: Future of the job or None if the job wasn't queued.
+        """
+        if self._closed or self._thread is None:
+            log.warning("[%s] Worker is not running, job is dropped.", self.name)
+            return None
+
+        future = Future()
+        try:
+            self._queue.put((future, fn, args, kwargs), timeout=self.put_timeout)
+        except Full:
+            log.warning("[%s] Queue is full (%s jobs), job is dropped.", self.name, self._queue.maxsize)
+            return None
+        return future
+
+    def drain(self, timeout: float | None = None) -> bool:
+        """
+        Stops accepting new jobs, waits until all queued jobs are done and stops the worker thread.
+
+        :param timeout: max time to wait (in seconds). If None, waits forever.
+        :return: True if the worker is stopped, False if it's still busy after timeout.
+        """
+        with self._lock:
+            self._closed = True
+            thread, self._thread = self._thread, None
+
+        if thread is None:
+            return True
+
+        try:
+            self._queue.put(None, timeout=timeout)
+        except Full:
+            log.warning("[%s] Worker is still busy, %s jobs are not processed.", self.name, self._queue.qsize())
+            return False
+
+        thread.join(timeout)
+        if thread.is_alive():
+            log.warning("[%s] Worker is still busy, %s jobs are not processed.", self.name, self._queue.qsize())
+            return False
+        return True
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            future, fn, args, kwargs = item
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                log.error("[%s] An error occurred while processing the job.", self.name, exc_info=True)
+                future.set_exception(e)
+
+
+class CatalogWriter:
+    """
+    Adds clips to the catalog in its own thread.
+    Rows are written in batches: when `batch_size` rows are collected or `flush_interval` seconds passed
+    since the first unwritten row.
+    """
+    def __init__(self, path: Path, batch_size: int, flush_interval: float):
+        """
+        :param path: catalog database path.
+        :param batch_size: max amount of rows in one transaction.
+        :param flush_interval: max time a row can wait for writing (in seconds).
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = Queue()
+        self._thread: Thread | None = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = Thread(target=self._run, name="smart_replays_catalog", daemon=True)
+        self._thread.start()
+
+    def add(self, row: dict):
+        """
+        Queues a row (see `ClipCatalog.COLUMNS`). Never blocks.
+        """
+        self._queue.put(("add", row))
+
+    def remove(self, path: str):
+        """
+        Queues removing a clip from the catalog. Never blocks.
+        """
+        self._queue.put(("remove", path))
+
+    def stop(self, timeout: float | None = None) -> bool:
+        """
+        Writes queued rows and stops the writer thread.
+        """
+        thread, self._thread = self._thread, None
+        if thread is None:
+            return True
+        self._queue.put(None)
+        thread.join(timeout)
+        return not thread.is_alive()
+
+    def _run(self):
+        try:
+            catalog = ClipCatalog(self.path)
+        except Exception:
+            log.error("Failed to open clips catalog %s.", self.path, exc_info=True)
+            return
+
+        batch = []
+        flush_at = None
+        try:
+            while True:
+                try:
+                    item = self._queue.get(timeout=None if flush_at is None else max(flush_at - time.monotonic(), 0))
+                except Empty:
+                    item = ()  # flush interval is over
+
+                if item is None:
+                    return
+                if item:
+                    batch.append(item)
+                    if flush_at is None:
+                        flush_at = time.monotonic() + self.flush_interval
+                if not item or len(batch) >= self.batch_size:
+                    self._write(catalog, batch)
+                    batch = []
+                    flush_at = None
+        finally:
+            if batch:
+                self._write(catalog, batch)
+            catalog.close()
+
+    @staticmethod
+    def _write(catalog: ClipCatalog, batch: list[tuple[str, Any]]):
+        """
+        Writes a batch of ("add", row) and ("remove", path) items. Adds are written first.
+        """
+        try:
+            catalog.add_many([value for kind, value in batch if kind == "add"])
+            catalog.remove_many([value for kind, value in batch if kind == "remove"])
+        except sqlite3.Error:
+            log.error("Failed to add %s clips to the catalog.", len(batch), exc_info=True)
+
+
+# -------------------- retention.py --------------------
+class RetentionRule:
+    """
+    Storage limits. 0 means no limit.
+    """
+    __slots__ = ("max_size", "max_age", "max_count")
+    LIMIT_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(gb|d|clips)", re.IGNORECASE)
+
+    def __init__(self, max_size: int = 0, max_age: float = 0, max_count: int = 0):
+        """
+        :param max_size: max total size of clips (in bytes).
+        :param max_age: max age of clips (in seconds).
+        :param max_count: max amount of clips (the newest ones are kept).
+        """
+        self.max_size = max_size
+        self.max_age = max_age
+        self.max_count = max_count
+
+    def __bool__(self):
+        return bool(self.max_size or self.max_age or self.max_count)
+
+    def is_exceeded(self, count: int, size: int) -> bool:
+        return bool(self.max_count and count > self.max_count or self.max_size and size > self.max_size)
+
+    @staticmethod
+    def parse(value: str) -> tuple[str, "RetentionRule"]:
+        """
+        Parses rule string "ClipName > 20GB 14d 50clips" (any of limits).
+        Raises RetentionRuleInvalidFormat(None) if the format is invalid.
+
+        :return: (clip name, rule)
+        """
+        name, sep, limits = (value or "").rpartition(">")
+        name, limits = name.strip(), limits.strip()
+        if not sep or not name or not limits:
+            raise RetentionRuleInvalidFormat(None)
+
+        rule = RetentionRule()
+        end = 0
+        for match in RetentionRule.LIMIT_RE.finditer(limits):
+            if limits[end:match.start()].strip():
+                raise RetentionRuleInvalidFormat(None)
+            end = match.end()
+            number, unit = float(match.group(1)), match.group(2).lower()
+            if unit == "gb":
+                rule.max_size = int(number * 1024 ** 3)
+            elif unit == "d":
+                rule.max_age = number * 86400
+            else:
+                rule.max_count = int(number)
+
+        if limits[end:].strip() or not rule:
+            raise RetentionRuleInvalidFormat(None)
+        return name, rule
+
+
+class RetentionManager:
+    """
+    Deletes the oldest clips when storage limits are exceeded.
+
+    Totals (amount and size of clips per clip name and overall) are loaded from the clips catalog once
+    and then kept up to date from save events and deletions, so checking limits on each save doesn't depend
+    on the library size. Clips to delete are taken from the catalog index (oldest first).
+    Favorites (clips with a hard link of the same name in the favorites folder) are marked as protected in the catalog
+    when they are met among the oldest clips, so they are not fetched again.
+    Everything runs in a low priority background thread.
+    """
+    def __init__(self, catalog_path: Path, queue_size: int, delete_batch: int):
+        """
+        :param catalog_path: clips catalog path.
+        :param queue_size: max amount of pending events.
+        :param delete_batch: amount of clips fetched from the catalog at once.
+        """
+        self.catalog_path = catalog_path
+        self.delete_batch = delete_batch
+        self._worker = BackgroundWorker(name="smart_replays_retention", max_size=queue_size, put_timeout=0)
+        # State below is used only in the worker thread.
+        self._catalog: ClipCatalog | None = None
+        self._totals: dict[str, list[int]] = {}  # {clip name: [amount, size]}
+        self._total = [0, 0]
+        self._global_rule = RetentionRule()
+        self._rules: dict[str, RetentionRule] = {}
+        self._favorites_path: Path | None = None
+        self._links_folder: str | None = None
+
+    def start(self, global_rule: RetentionRule, rules: dict[str, RetentionRule], favorites_path: str,
+              links_folder: str | None):
+        self._worker.start()
+        self._worker.submit(self._load)
+        self.configure(global_rule, rules, favorites_path, links_folder)
+
+    def stop(self, timeout: float | None = None) -> bool:
+        self._worker.submit(self._close)
+        return self._worker.drain(timeout)
+
+    def configure(self, global_rule: RetentionRule, rules: dict[str, RetentionRule], favorites_path: str,
+                  links_folder: str | None):
+        """
+        Sets new limits and applies them.
+
+        :param global_rule: limits for all clips.
+        :param rules: {casefolded clip name or *: limits for clips with this name}.
+        :param favorites_path: favorites folder path.
+        :param links_folder: folder with hard links of clips (deleted together with clips), None - no links.
+        """
+        self._worker.submit(self._configure, global_rule, rules, favorites_path, links_folder)
+
+    def on_clip_added(self, row: dict, replaced_size: int | None = None):
+        """
+        Accounts a new clip and applies limits.
+
+        :param row: clips catalog row (see `ClipCatalog.COLUMNS`).
+        :param replaced_size: if the clip replaced an accounted clip (with the same path or remuxed from it),
+            size of the replaced file (the clip is not counted as a new one).
+        """
+        self._worker.submit(self._on_clip_added, row, replaced_size)
+
+    def _load(self):
+        set_current_thread_background_priority()
+        self._catalog = ClipCatalog(self.catalog_path)
+        self._totals = {name: [count, size] for name, (count, size) in self._catalog.get_totals().items()}
+        self._total = [sum(i[0] for i in self._totals.values()), sum(i[1] for i in self._totals.values())]
+        log.info("[%s] %s clips, %.1f GB.", self._worker.name, self._total[0], self._total[1] / 1024 ** 3)
+
+    def _close(self):
+        if self._catalog is not None:
+            self._catalog.close()
+            self._catalog = None
+
+    def _configure(self, global_rule: RetentionRule, rules: dict[str, RetentionRule], favorites_path: str,
+                   links_folder: str | None):
+        self._global_rule, self._rules = global_rule, rules
+        self._favorites_path = Path(favorites_path) if favorites_path else None
+        self._links_folder = links_folder or None
+        self._unprotect_removed_favorites()
+        for name in list(self._totals):
+            self._enforce(name)
+        self._enforce(None)
+
+    def _on_clip_added(self, row: dict, replaced_size: int | None):
+        totals = self._totals.setdefault(row["name"], [0, 0])
+        for i in (totals, self._total):
+            if replaced_size is None:
+                i[0] += 1
+            i[1] += (row.get("size") or 0) - (replaced_size or 0)
+        self._enforce(row["name"])
+        self._enforce(None)
+
+    def _is_favorite(self, path: str) -> bool:
+        if self._favorites_path is None:
+            return False
+        path = Path(path)
+        if path.parent == self._favorites_path:
+            return True
+        try:
+            return os.path.samefile(self._favorites_path / path.name, path)
+        except OSError:
+            return False
+
+    def _unprotect_removed_favorites(self):
+        """
+        Removes the protected mark from clips that are not in the favorites folder anymore.
+        Cost depends on the amount of favorites only.
+        """
+        if self._catalog is None:
+            return
+        removed = [i["path"] for i in self._catalog.find(protected=True) if not self._is_favorite(i["path"])]
+        if removed:
+            self._catalog.set_protected(removed, False)
+
+    def _get_rule(self, name: str | None) -> RetentionRule | None:
+        if name is None:
+            return self._global_rule
+        return self._rules.get(name.casefold()) or self._rules.get("*")
+
+    def _enforce(self, name: str | None):
+        """
+        Deletes clips with the given name (or any clips if name is None) that exceed the limits.
+        """
+        rule = self._get_rule(name)
+        if not rule or self._catalog is None:
+            return
+
+        if rule.max_age:
+            while True:
+                rows = self._catalog.find(name=name, until=time.time() - rule.max_age, oldest_first=True,
+                                          protected=False, limit=self.delete_batch)
+                if not self._delete_rows(rows):
+                    break
+
+        totals = self._totals.get(name, [0, 0]) if name is not None else self._total
+        while rule.is_exceeded(*totals):
+            rows = self._catalog.find(name=name, oldest_first=True, protected=False, limit=self.delete_batch)
+            if not self._delete_rows(rows, lambda: rule.is_exceeded(*totals)):
+                break
+
+    def _delete_rows(self, rows: list[dict], condition: Callable[[], bool] = lambda: True) -> int:
+        """
+        Deletes clips (and their hard links in the links folder, so the space is actually freed)
+        while `condition` is true. Favorites are marked as protected instead.
+
+        :return: amount of deleted and protected clips (0 if nothing can be done with these rows).
+        """
+        deleted, protected = [], []
+        for row in rows:
+            if not condition():
+                break
+            if self._is_favorite(row["path"]):
+                protected.append(row["path"])
+                continue
+
+            try:
+                # The link goes first: if it can't be deleted, the clip is kept (and counted) as is.
+                if self._links_folder and (link := find_hard_link(row["path"], self._links_folder)) is not None:
+                    os.remove(link)
+                os.remove(row["path"])
+                with suppress(OSError):
+                    os.remove(get_bookmarks_path(row["path"]))
+                log.info("[%s] Clip %s is deleted (storage limits).", self._worker.name, row["path"])
+            except FileNotFoundError:
+                pass
+            except OSError:
+                log.warning("[%s] Failed to delete %s: %s", self._worker.name, row["path"], traceback.format_exc(limit=0))
+                continue
+
+            deleted.append(row["path"])
+            for totals in (self._totals.setdefault(row["name"], [0, 0]), self._total):
+                totals[0] -= 1
+                totals[1] -= row["size"] or 0
+
+        if deleted:
+            self._catalog.remove_many(deleted)
+        if protected:
+            self._catalog.set_protected(protected)
+        return len(deleted) + len(protected)
+
+
+# -------------------- latency.py --------------------
+class LatencyRecorder:
+    """
+    Collects timing spans of the save pipeline stages.
+
+    Spans are measured with `time.perf_counter_ns` and kept in a ring buffer (for percentiles)
+    and in a queue of unwritten spans, that is appended to a JSONL file every `flush_interval` seconds
+    by the recorder thread. Recording a span never does I/O.
+    """
+    def __init__(self, path: Path, size: int, flush_interval: float, max_file_size: int):
+        """
+        :param path: JSONL file path.
+        :param size: max amount of spans in memory.
+        :param flush_interval: interval of writing spans to the file (in seconds).
+        :param max_file_size: when the file exceeds this size (in bytes), it's renamed to *.1 and a new one is started.
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_file_size = max_file_size
+        self._spans: deque[tuple[str, float]] = deque(maxlen=size)  # (stage, ms)
+        self._pending: deque[dict] = deque(maxlen=size)
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread: Thread | None = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = Thread(target=self._run, name="smart_replays_latency", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float | None = None) -> bool:
+        """
+        Writes unwritten spans and stops the recorder thread.
+        """
+        thread, self._thread = self._thread, None
+        if thread is None:
+            return True
+        self._stop.set()
+        thread.join(timeout)
+        return not thread.is_alive()
+
+    def record(self, stage: str, duration_ns: int):
+        """
+        Adds a span. Can be called from any thread.
+        """
+        ms = duration_ns / 1e6
+        with self._lock:
+            self._spans.append((stage, ms))
+            self._pending.append({"ts": round(time.time(), 3), "stage": stage, "ms": round(ms, 3)})
+
+    @contextmanager
+    def span(self, stage: str):
+        """
+        Measures the time of the `with` block (also if it raises).
+        """
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter_ns() - start)
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        """
+        :return: {stage: {"count": ..., "p50": ..., "p95": ..., "p99": ...}} (in ms) of spans in memory.
+        """
+        with self._lock:
+            spans = list(self._spans)
+
+        by_stage: dict[str, list[float]] = defaultdict(list)
+        for stage, ms in spans:
+            by_stage[stage].append(ms)
+
+        result = {}
+        for stage, values in by_stage.items():
+            values.sort()
+            result[stage] = {"count": len(values)}
+            for p in (50, 95, 99):
+                # nearest-rank percentile
+                result[stage][f"p{p}"] = values[max(-(-len(values) * p // 100) - 1, 0)]
+        return result
+
+    def flush(self):
+        """
+        Appends unwritten spans to the JSONL file.
+        """
+        with self._lock:
+            pending = list(self._pending)
+            self._pending.clear()
+        if not pending:
+            return
+
+        try:
+            os.makedirs(self.path.parent, exist_ok=True)
+            with suppress(FileNotFoundError):
+                if os.path.getsize(self.path) > self.max_file_size:
+                    os.replace(self.path, self.path.with_name(self.path.name + ".1"))
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(i) + "\n" for i in pending)
+        except OSError:
+            log.warning("Failed to write latency spans to %s: %s", self.path, traceback.format_exc(limit=0))
+
+    def _run(self):
+        set_current_thread_background_priority()
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+
+
+def latency_span(stage: str):
+    """
+    Returns a context manager that measures the time of the `with` block as a `stage` span
+    (does nothing if the latency recorder is not started).
+    """
+    if VARIABLES.latency is None:
+        return nullcontext()
+    return VARIABLES.latency.span(stage)
+
+
+def format_latency_summary() -> str:
+    """
+    Formats save pipeline latency percentiles for the script properties.
+    """
+    summary = VARIABLES.latency.summary() if VARIABLES.latency is not None else {}
+    if not summary:
+        return "Save latency: no clips saved yet."
+
+    lines = ["Save latency, ms (p50 / p95 / p99, clips):"]
+    for stage in CONSTANTS.LATENCY_STAGES:
+        if stage in summary:
+            i = summary[stage]
+            lines.append(f"{stage}: {i['p50']:.1f} / {i['p95']:.1f} / {i['p99']:.1f} ({i['count']})")
+    return "\n".join(lines)
+
+
+# -------------------- script_helpers.py --------------------
+class NotificationHostClient:
+    """
+    Starts the notification host process (see `NotificationHost`) on first use and sends notifications to it.
+    If the host dies, it is restarted on the next notification.
+    """
+    def __init__(self):
+        self._process: subprocess.Popen | None = None
+        self._lock = Lock()
+
+    def send(self, python_exe: str, title: str, message: str, color: str, created_at: float | None = None):
+        """
+        Sends notification to the host. If the host can't be started, the notification is dropped (and logged).
+
+        :param python_exe: python executable for the host process.
+        :param created_at: timestamp of the event the notification is about (used for latency measurement).
+        """
+        line = json.dumps({"title": title, "message": message, "color": color, "created_at": created_at})
+
+        with self._lock:
+            for _ in range(2):
+                if self._process is None or self._process.poll() is not None:
+                    try:
+                        self._start(python_exe)
+                    except OSError:
+                        log.error("Failed to start notification host with %s: %s",
+                                  python_exe, traceback.format_exc(limit=0))
+                        self._process = None
+                        return
+
+                try:
+                    self._process.stdin.write(line + "\n")
+                    self._process.stdin.flush()
+                    return
+                except OSError:
+                    log.warning("Notification host is not responding, restarting it...")
+                    self._process.kill()
+                    self._process = None
+
+    def stop(self, timeout: float | None = None):
+        """
+        Closes host's stdin (the host shows queued notifications and exits) and waits for it.
+        """
+        with self._lock:
+            process, self._process = self._process, None
+
+        if process is None:
+            return
+
+        with suppress(OSError):
+            process.stdin.close()
+        try:
+            process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    def _start(self, python_exe: str):
+        log.debug("Starting notification host...")
+        self._process = subprocess.Popen([python_exe, __file__, "--notification-host"],
+                                         stdin=subprocess.PIPE,
+                                         stdout=subprocess.PIPE,
+                                         text=True,
+                                         encoding="utf-8")
+        Thread(target=self._read_reports, args=(self._process,), daemon=True).start()
+
+    @staticmethod
+    def _read_reports(process: subprocess.Popen):
+        for line in process.stdout:
+            with suppress(ValueError):
+                report = json.loads(line)
+                if report.get("latency") is not None:
+                    log.debug("Notification \"%s\" is shown in %.3fs after the event.", report.get("title"), report["latency"])
+
+
+def notify(success: bool,
+           clip_path: Path,
+           settings: ScriptSettings,
+           created_at: float | None = None):
+    """
+    Plays and shows success / failure notification if it's enabled in notifications settings.
+
+    :param settings: settings snapshot.
+    :param created_at: timestamp of clip saving (used for popup latency measurement).
+    """
+    path_display_mode = settings.popup_path_display_mode
+    if path_display_mode == PopupPathDisplayModes.JUST_FILE:
+        clip_path = clip_path.name
+    elif path_display_mode == PopupPathDisplayModes.JUST_FOLDER:
+        clip_path = clip_path.parent.name
+    elif path_display_mode == PopupPathDisplayModes.FOLDER_AND_FILE:
+        clip_path = Path(clip_path.parent.name) / clip_path.name
+
+    if success:
+        if settings.sound_on_success:
+            play_sound(settings.sound_on_success_path)
+
+        if settings.popup_on_success:
+            VARIABLES.notification_host.send(settings.python_exe, "Clip saved", f"Clip saved to {clip_path}",
+                                             "#76B900", created_at=created_at)
+    else:
+        if settings.sound_on_failure:
+            play_sound(settings.sound_on_failure_path)
+
+        if settings.popup_on_failure:
+            VARIABLES.notification_host.send(settings.python_exe, "Clip not saved", "More in the logs.",
+                                             "#C00000", created_at=created_at)
+
+
+@lru_cache(maxsize=CONSTANTS.ALIASES_PARSE_CACHE_SIZE)
+def parse_alias(value: str) -> tuple[str, str]:
+    """
+    Parses alias string (`path > name`) and validates it.
+    Results are cached, so reloading the same aliases doesn't expand variables and validate them again.
+    Raises AliasInvalidFormat or AliasInvalidCharacters (with index None).
+
+    :return: (path with expanded environment variables, name)
+    """
+    spl = value.split(">", 1)
+    try:
+        path, name = spl[0].strip(), spl[1].strip()
+    except IndexError:
+        raise AliasInvalidFormat(None)
+
+    path = os.path.expandvars(path)
+    if not path or not name:
+        raise AliasInvalidFormat(None)
+
+    if name == AliasMatcher.WILDCARD_NAME and AliasMatcher.is_pattern(path):
+        name_is_valid = True
+    else:
+        name_is_valid = not any(i in name for i in CONSTANTS.FILENAME_PROHIBITED_CHARS)
+
+    if any(i in path for i in CONSTANTS.PATH_PROHIBITED_CHARS) or not name_is_valid:
+        raise AliasInvalidCharacters(None)
+    return path, name
+
+
+def load_aliases(script_settings_dict: dict):
+    """
+    Loads aliases to `VARIABLES.aliases`.
+    Raises exception if path or name are invalid.
+
+    :param script_settings_dict: Script settings as dict.
+    """
+    log.debug("Loading aliases...")
+
+    matcher = AliasMatcher()
+    aliases_list = script_settings_dict.get(PN.PROP_ALIASES_LIST)
+    if aliases_list is None:
+        aliases_list = CONSTANTS.DEFAULT_ALIASES
+
+    for index, i in enumerate(aliases_list):
+        try:
+            path, name = parse_alias(i.get("value"))
+        except AliasParsingError as e:
+            raise type(e)(index)
+
+        if not matcher.add(path, name):
+            raise AliasPathAlreadyExists(index)
+
+    VARIABLES.aliases = matcher
+    log.debug("%s aliases are loaded.", len(VARIABLES.aliases))
+
+
+# -------------------- aliases.py --------------------
+class AliasTrieNode:
+    __slots__ = ("children", "patterns", "alias")
+
+    def __init__(self):
+        self.children: dict[str, AliasTrieNode] = {}
+        self.patterns: dict[str, tuple[re.Pattern, AliasTrieNode]] = {}  # {pattern: (compiled pattern, node)}
+        self.alias: str | None = None
+
+
+class AliasMatcher:
+    """
+    Aliases compiled into a trie of normalized (case-folded) path components.
+
+    Path components can contain wildcards (* and ?, brackets are plain characters: "[GOG] Game"). A lookup walks the trie once (O(path depth)),
+    the alias of the deepest matched path wins, a plain component wins over a wildcard on the same depth.
+    Results are memoized per path string, so repeated lookups of the same executable are a single dict lookup.
+    """
+    WILDCARD_NAME = "*"
+    """Alias name that is replaced with the path component matched by the wildcard."""
+    SEPARATORS_RE = re.compile(r"[\\/]+")
+    PATTERN_CHARS_RE = re.compile(r"[*?]")
+
+    def __init__(self):
+        self._root = AliasTrieNode()
+        self._count = 0
+        self._memo: dict[str, str | None] = {}
+
+    def __len__(self):
+        return self._count
+
+    @classmethod
+    def is_pattern(cls, path: str) -> bool:
+        return cls.PATTERN_CHARS_RE.search(path) is not None
+
+    @classmethod
+    def split(cls, path: str) -> list[str]:
+        return [i for i in cls.SEPARATORS_RE.split(path) if i]
+
+    @staticmethod
+    @lru_cache(maxsize=CONSTANTS.ALIASES_PARSE_CACHE_SIZE)
+    def compile_path(path: str) -> tuple[tuple[str, bool], ...]:
+        """
+        Splits alias path into normalized components.
+
+        :return: ((case-folded component, is it a pattern), ...)
+        """
+        return tuple((i.casefold(), AliasMatcher.is_pattern(i)) for i in AliasMatcher.split(path))
+
+    def add(self, path: str, alias: str) -> bool:
+        """
+        Adds alias.
+
+        :return: False if the path already has an alias.
+        """
+        node = self._root
+        for part, is_pattern in self.compile_path(path):
+            if is_pattern:
+                if part not in node.patterns:
+                    # "[[]" is a literal "[" for fnmatch, so brackets don't start a character class.
+                    node.patterns[part] = (re.compile(fnmatch_translate(part.replace("[", "[[]"))), AliasTrieNode())
+                node = node.patterns[part][1]
+            else:
+                node = node.children.setdefault(part, AliasTrieNode())
+
+        if node.alias is not None:
+            return False
+
+        node.alias = alias
+        self._count += 1
+        self._memo.clear()
+        return True
+
+    def match(self, path: str | Path) -> str | None:
+        """
+        Returns an alias of the path or its closest parent.
+        """
+        key = str(path)
+        try:
+            return self._memo[key]
+        except KeyError:
+            pass
+
+        alias = self._match(key)
+        if len(self._memo) >= CONSTANTS.ALIASES_MEMO_SIZE:
+            self._memo.clear()
+        self._memo[key] = alias
+        return alias
+
+    def _match(self, path: str) -> str | None:
+        nodes = [(self._root, None)]  # [(node, path component matched by the last wildcard), ...]
+        alias = None
+
+        for part in self.split(path):
+            folded = part.casefold()
+            next_nodes = []
+            for node, wildcard_part in nodes:
+                if (child := node.children.get(folded)) is not None:
+                    next_nodes.append((child, wildcard_part))
+                for pattern, child in node.patterns.values():
+                    if pattern.match(folded):
+                        next_nodes.append((child, part))
+
+            if not next_nodes:
+                break
+
+            nodes = next_nodes
+            for node, wildcard_part in nodes:
+                if node.alias is not None:
+                    alias = wildcard_part if node.alias == self.WILDCARD_NAME else node.alias
+                    break
+        return alias
+
+
+# -------------------- clipname_gen.py --------------------
+class ClipCapture:
+    """
+    State the clip name depends on, captured in OBS frontend thread at the moment of save request
+    (hotkey press), so the name reflects what was on screen when the key was pressed.
+    Slow parts (resolving executable path, aliases, file name) are done later by the clips worker.
+    """
+    def __init__(self,
+                 mode: ClipNamingModes,
+                 settings: ScriptSettings,
+                 dt: datetime,
+                 base_path: Path,
+                 pid: int | None = None,
+                 executable: Path | None = None,
+                 scene_name: str | None = None,
+                 duration: int | None = None,
+                 length: int | None = None,
+                 bookmarks: list[float] | None = None):
+        """
+        :param mode: clip naming mode.
+        :param settings: settings snapshot at the moment of save request.
+        :param dt: the moment of save request.
+        :param base_path: clips base path.
+        :param pid: PID of the active window process (if the clip name or template depend on it).
+        :param executable: the most recorded executable (MOST_RECORDED_PROCESS mode).
+        :param scene_name: current scene name.
+        :param duration: clip duration in seconds.
+        :param length: requested clip length in seconds (None - the whole buffer).
+        :param bookmarks: bookmarks in the clip (seconds since the clip start).
+        """
+        self.mode = mode
+        self.settings = settings
+        self.dt = dt
+        self.base_path = base_path
+        self.pid = pid
+        self.executable = executable
+        self.scene_name = scene_name
+        self.duration = duration
+        self.length = length
+        self.bookmarks = bookmarks or []
+
+    def get_executable(self) -> Path:
+        """
+        Returns the executable the clip is named after. Resolves it from PID on first call.
+        """
+        if self.executable is None:
+            self.executable = get_executable_path(self.pid)
+        return self.executable
+
+
+def capture_clip(mode: ClipNamingModes | None = None, length: int | None = None) -> ClipCapture:
+    """
+    Captures the state the clip name depends on. Must be called in OBS frontend thread.
+    Active window is queried only if the naming mode or the filename template use it.
+
+    :param mode: Clip naming mode. If None, the mode is fetched from the script config.
+    :param length: requested clip length in seconds (None - the whole buffer).
+        The most recorded executable is searched only in this part of the history.
+    """
+    settings = VARIABLES.settings
+    mode = settings.clips_naming_mode if mode is None else ClipNamingModes(mode)
+    used_variables = settings.clips_filename_template_plan.variables \
+        if settings.clips_filename_template_plan is not None else frozenset()
+
+    capture = ClipCapture(mode=mode, settings=settings, dt=datetime.now(),
+                          base_path=get_base_path(script_settings=settings), length=length)
+
+    if mode is ClipNamingModes.MOST_RECORDED_PROCESS and VARIABLES.clip_exe_history:
+        capture.executable = VARIABLES.clip_exe_history.most_common(last=length)
+    elif mode is not ClipNamingModes.CURRENT_SCENE or "EXE" in used_variables:
+        capture.pid = get_active_window_pid()
+
+    # Scene and duration are cheap and are also needed for the clips catalog.
+    capture.scene_name = get_current_scene_name()
+    capture.duration = get_clip_duration()
+    if length is not None:
+        capture.duration = min(capture.duration, length)
+    capture.bookmarks = take_bookmarks(capture.duration)
+    return capture
+
+
+def get_clip_duration() -> int:
+    """
+    Returns approximate length of the clip (in seconds): time since replay buffer start, limited by max replay time.
+    """
+    max_time = get_replay_buffer_max_time()
+    if VARIABLES.replay_buffer_started_at is None:
+        return max_time
+    return min(round(time.monotonic() - VARIABLES.replay_buffer_started_at), max_time)
+
+
+def gen_clip_base_name(capture: ClipCapture) -> str:
+    """
+    Generates the base name of the clip based on the selected naming mode.
+    It does NOT generate a new path for the clip or filename, only its base name.
+
+    :param capture: State captured at the moment of save request.
+    :return: The base name of the clip based on the selected naming mode.
+    """
+    log.debug("Generating clip base name...")
+    mode = capture.mode
+
+    if mode in [ClipNamingModes.CURRENT_PROCESS, ClipNamingModes.MOST_RECORDED_PROCESS]:
+        if mode is ClipNamingModes.CURRENT_PROCESS:
+            log.debug("Clip file name depends on the name of an active app (.exe file name) at the moment of clip saving.")
+        else:
+            log.debug("Clip file name depends on the name of an app (.exe file name) "
+                      "that was active most of the time during the clip recording.")
+        executable_path = capture.get_executable()
+        log.debug("Executable: %s", executable_path)
+
+        log.debug("Searching for %s in aliases list...", executable_path)
+        with latency_span("alias_lookup"):
+            alias = get_alias(executable_path, VARIABLES.aliases)
+        if alias:
+            log.debug("Alias found: %s.", alias)
+            return alias
+        else:
+            log.debug("%s or its parents weren't found in aliases list. Assigning the name of the executable: %s",
+                      executable_path, executable_path.stem)
+            return executable_path.stem
+
+    else:
+        log.debug("Clip filename depends on the name of the current scene name.")
+        return capture.scene_name
+
+
+def get_alias(executable_path: str | Path, aliases: "AliasMatcher") -> str | None:
+    """
+    Retrieves an alias for the given executable path.
+    The alias of the exact `executable_path` has priority, then the alias of the closest parent directory.
+
+    :param executable_path: A file path or string representing the executable.
+    :param aliases: compiled aliases.
+    :return: The corresponding alias if found, otherwise `None`.
+    """
+    return aliases.match(executable_path)
+
+
+def gen_filename(base_name: str, template: str, dt: datetime | None = None, values: dict | None = None) -> str:
+    """
+    Generates a file name based on the template.
+    If the template is invalid or formatting fails, raises ValueError.
+    If the generated name contains prohibited characters, raises SyntaxError.
+
+    :param base_name: Base name for the file.
+    :param template: Template for generating the file name.
+    :param dt: Optional datetime object; uses current time if None.
+    :param values: Values of other template variables (see `FilenameTemplate.render`).
+    :return: Formatted file name.
+    """
+    return FilenameTemplate.compile(template).render(dt or datetime.now(), {"NAME": base_name, **(values or {})})
+
+
+# -------------------- unique_names.py --------------------
+class UniqueNameAllocator:
+    """
+    Allocates unique file names in folders: "name.ext", "name (1).ext", "name (2).ext", ...
+
+    Taken names of each folder are kept in memory. The index is built with a single `os.scandir`
+    and is rebuilt only if the folder was modified by someone else (folder mtime differs from the one
+    saved after our own last change), so allocating a name costs one `stat` of the folder instead of
+    a `stat` per probed name. Known folders are not re-created.
+
+    The index is only a hint: names are claimed atomically (rename / hard link / exclusive create
+    fail if the name is taken), so another process (e.g. another OBS instance) can't get the same name.
+    """
+    def __init__(self, max_folders: int):
+        """
+        :param max_folders: max amount of folders to keep indexes of.
+        """
+        self.max_folders = max_folders
+        # {folder: [mtime_ns, {normcased names}, {normcased filename: next suffix counter}]}
+        self._folders: OrderedDict[str, list] = OrderedDict()
+        self._lock = Lock()
+
+    def move(self, src: Path | str, folder: Path | str, filename: str) -> Path:
+        """
+        Moves `src` file into `folder` under a unique name. `src` must be on the same volume.
+
+        :return: New file path.
+        """
+        return self._allocate(folder, filename, lambda path: self._rename_no_replace(str(src), path))
+
+    def link(self, src: Path | str, folder: Path | str, filename: str) -> Path:
+        """
+        Creates a hard link for `src` in `folder` under a unique name.
+
+        :return: Link path.
+        """
+        return self._allocate(folder, filename, lambda path: os.link(str(src), path))
+
+    def claim(self, folder: Path | str, filename: str) -> Path:
+        """
+        Creates an empty file in `folder` under a unique name.
+        The file can be replaced later with `os.replace`.
+
+        :return: Created file path.
+        """
+        return self._allocate(folder, filename, lambda path: os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)))
+
+    def prepare(self, folder: Path | str):
+        """
+        Creates the folder (if it doesn't exist) and builds its index in advance.
+        """
+        with self._lock:
+            self._get_folder_entry(os.path.abspath(folder))
+
+    def forget(self, folder: Path | str):
+        """
+        Removes the folder index.
+        """
+        with self._lock:
+            self._folders.pop(os.path.abspath(folder), None)
+
+    def clear(self):
+        with self._lock:
+            self._folders.clear()
+
+    def _allocate(self, folder: Path | str, filename: str, create: Callable[[str], Any]) -> Path:
+        """
+        Tries to `create(path)` with unique names until it succeeds.
+        `create` must raise FileExistsError if the name is already taken.
+        """
+        folder = os.path.abspath(folder)
+        stem, suffix = os.path.splitext(filename)
+
+        with self._lock:
+            entry = self._get_folder_entry(folder)
+            names, counters = entry[1], entry[2]
+            # A burst of saves with the same name continues from the last taken suffix instead of probing from 0.
+            filename_key = os.path.normcase(filename)
+            counter = counters.get(filename_key, 0)
+            while True:
+                name = filename if not counter else f"{stem} ({counter}){suffix}"
+                counter += 1
+                key = os.path.normcase(name)
+                if key in names:
+                    continue
+
+                path = os.path.join(folder, name)
+                try:
+                    create(path)
+                except FileExistsError:
+                    names.add(key)
+                    continue
+                names.add(key)
+                break
+
+            if counter > 1:
+                counters[filename_key] = counter
+            entry[0] = os.stat(folder).st_mtime_ns
+        return Path(path)
+
+    def _get_folder_entry(self, folder: str) -> list:
+        """
+        Returns the folder index. Creates the folder if it doesn't exist.
+        Rebuilds the index if the folder was modified outside the allocator.
+        """
+        try:
+            mtime = os.stat(folder).st_mtime_ns
+        except FileNotFoundError:
+            os.makedirs(folder, exist_ok=True)
+            mtime = os.stat(folder).st_mtime_ns
+
+        entry = self._folders.get(folder)
+        if entry is None or entry[0] != mtime:
+            with os.scandir(folder) as entries:
+                entry = [mtime, {os.path.normcase(i.name) for i in entries}, {}]
+            self._folders[folder] = entry
+
+        self._folders.move_to_end(folder)
+        while len(self._folders) > self.max_folders:
+            self._folders.popitem(last=False)
+        return entry
+
+    @staticmethod
+    def _rename_no_replace(src: str, dst: str):
+        """
+        Renames `src` to `dst`. Raises FileExistsError if `dst` exists.
+        """
+        if sys.platform == "win32":
+            os.rename(src, dst)  # MoveFileEx without MOVEFILE_REPLACE_EXISTING
+            return
+
+        # rename() replaces existing files on POSIX, link() doesn't: link + unlink is a rename without replace.
+        try:
+            os.link(src, dst)
+        except FileExistsError:
+            raise
+        except OSError:  # no hard links on this file system, claim the name with a placeholder
+            pass
+        else:
+            try:
+                os.remove(src)
+            except BaseException:
+                with suppress(OSError):
+                    os.remove(dst)
+                raise
+            return
+
+        os.close(os.open(dst, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        try:
+            os.replace(src, dst)
+        except BaseException:
+            with suppress(OSError):
+                os.remove(dst)
+            raise
+
+
+# -------------------- clips_mover.py --------------------
+class ClipMover:
+    """
+    Moves clips to another volume in the background: copies the file in big chunks
+    with low thread priority and optional speed limit, fsyncs and verifies the copy, and only then
+    removes the source file.
+
+    Every move is saved in the journal before copying starts and removed after the source is deleted,
+    so moves interrupted by OBS closing (or crashing) are resumed on the next script load.
+    The copy goes into `<destination>.part`, which is renamed to the (already claimed) destination when verified.
+    """
+    def __init__(self, journal_path: Path, chunk_size: int, queue_size: int):
+        """
+        :param journal_path: path of the journal file.
+        :param chunk_size: copy chunk size (in bytes).
+        :param queue_size: max amount of pending moves.
+        """
+        self.journal_path = journal_path
+        self.chunk_size = chunk_size
+        self._worker = BackgroundWorker(name="smart_replays_mover", max_size=queue_size, put_timeout=0)
+        self._journal: dict[str, dict] = {}  # {destination path: journal entry}
+        self._journal_lock = Lock()
+        self._stop = Event()
+
+    def start(self, on_resumed: Callable[[dict, Future], Any] | None = None):
+        """
+        Starts the mover thread and resumes moves from the journal.
+
+        :param on_resumed: called with the journal entry and the move Future when a resumed move is done
+            (the entry has the `context` passed to `move`).
+        """
+        self._stop.clear()
+        self._worker.start()
+        self._load_journal()
+
+        for entry in list(self._journal.values()):
+            if not os.path.exists(entry["src"]):
+                log.warning("[%s] %s doesn't exist anymore, removing it from the journal.",
+                            self._worker.name, entry["src"])
+                self._remove_entry(entry)
+                continue
+
+            log.info("[%s] Resuming copying %s -> %s.", self._worker.name, entry["src"], entry["dst"])
+            future = self._worker.submit(self._move, entry)
+            if future is not None and on_resumed is not None:
+                future.add_done_callback(lambda f, e=entry: on_resumed(e, f))
+
+    def stop(self, timeout: float | None = None) -> bool:
+        """
+        Interrupts current copying (it will be resumed on the next start) and stops the mover thread.
+        """
+        self._stop.set()
+        return self._worker.drain(timeout)
+
+    def move(self, src: Path | str, folder: Path | str, filename: str, speed_limit: int = 0,
+             links_folder: Path | str | None = None, context: dict | None = None) -> Future:
+        """
+        Queues a move of `src` into `folder`. The destination name is claimed right away.
+
+        :param speed_limit: max copy speed in MB/s (0 - no limit).
+        :param links_folder: if set, a hard link to the moved file is created in this folder.
+        :param context: JSON-serializable data saved in the journal entry,
+            needed to finish the clip processing if the move is resumed on the next script load.
+        :return: Future with the new file path (None if the move is interrupted and will be resumed later).
+        """
+        dst = get_name_allocator().claim(folder, filename)
+        entry = {
+            "src": str(src),
+            "dst": str(dst),
+            "speed_limit": speed_limit,
+            "links_folder": str(links_folder) if links_folder else None,
+            "context": context,
+        }
+        with self._journal_lock:
+            self._journal[entry["dst"]] = entry
+            self._save_journal()
+
+        future = self._worker.submit(self._move, entry)
+        if future is None:
+            raise RuntimeError(f"Clips mover is not available. {src} will be moved on the next script load.")
+        return future
+
+    def _move(self, entry: dict) -> Path | None:
+        """
+        :return: new file path or None if the move is interrupted.
+        """
+        src, dst = entry["src"], entry["dst"]
+        tmp = dst + CONSTANTS.CLIPS_COPY_TEMP_SUFFIX
+        if self._stop.is_set():
+            return None
+        set_current_thread_background_priority()
+
+        log.debug("[%s] Copying %s -> %s...", self._worker.name, src, dst)
+        start = time.perf_counter()
+        try:
+            src_checksum = self._copy(src, tmp, entry["speed_limit"])
+            if self._checksum(tmp, entry["speed_limit"]) != src_checksum:
+                raise OSError(f"Checksum of the copy doesn't match the checksum of {src}.")
+            os.replace(tmp, dst)
+            self._fsync_folder(os.path.dirname(dst))
+        except ClipMoveInterrupted:
+            log.info("[%s] Copying %s is interrupted, it will be resumed on the next script load.", self._worker.name, src)
+            return None
+        except BaseException:
+            # The source is untouched, drop the copy and the claimed name.
+            for path in (tmp, dst):
+                with suppress(OSError):
+                    os.remove(path)
+            self._remove_entry(entry)
+            raise
+
+        # The clip is already in its place, so failures below are not failures of the move.
+        try:
+            os.remove(src)
+        except OSError:
+            log.warning("[%s] %s is copied, but the source file can't be deleted: %s",
+                        self._worker.name, src, traceback.format_exc(limit=0))
+        self._remove_entry(entry)
+        log.info("[%s] %s is copied in %.1fs.", self._worker.name, src, time.perf_counter() - start)
+
+        if entry["links_folder"]:
+            try:
+                create_hard_link(dst, entry["links_folder"])
+            except OSError:
+                log.warning("[%s] Failed to create a hard link to %s: %s",
+                            self._worker.name, dst, traceback.format_exc(limit=0))
+        return Path(dst)
+
+    def _copy(self, src: str, tmp: str, speed_limit: int) -> bytes:
+        """
+        Copies `src` into `tmp` starting from the last whole chunk already copied to `tmp`.
+
+        :return: checksum of `src`.
+        """
+        checksum = hashlib.blake2b()
+        buffer = bytearray(self.chunk_size)
+        view = memoryview(buffer)
+
+        with open(src, "rb", buffering=0) as src_file, \
+                open(tmp, "r+b" if os.path.exists(tmp) else "wb", buffering=0) as tmp_file:
+            resume_from = os.fstat(tmp_file.fileno()).st_size // self.chunk_size * self.chunk_size
+            if resume_from:
+                log.debug("[%s] Resuming from %.0f MB.", self._worker.name, resume_from / 1024 ** 2)
+                self._hash_file(src_file, checksum, buffer, view, resume_from, speed_limit)
+                tmp_file.seek(resume_from)
+            tmp_file.truncate(resume_from)
+
+            throttle = self._throttle(speed_limit)
+            while read := src_file.readinto(buffer):
+                tmp_file.write(view[:read])
+                checksum.update(view[:read])
+                throttle(read)
+            os.fsync(tmp_file.fileno())
+        return checksum.digest()
+
+    def _checksum(self, path: str, speed_limit: int) -> bytes:
+        checksum = hashlib.blake2b()
+        buffer = bytearray(self.chunk_size)
+        with open(path, "rb", buffering=0) as file:
+            self._hash_file(file, checksum, buffer, memoryview(buffer), None, speed_limit)
+        return checksum.digest()
+
+    def _hash_file(self, file, checksum, buffer: bytearray, view: memoryview, size: int | None, speed_limit: int):
+        """
+        Feeds `size` bytes (or the whole file if None) of `file` into `checksum`.
+        """
+        throttle = self._throttle(speed_limit)
+        left = size
+        while left is None or left > 0:
+            read = file.readinto(buffer if left is None or left >= len(buffer) else view[:left])
+            if not read:
+                break
+            checksum.update(view[:read])
+            throttle(read)
+            if left is not None:
+                left -= read
+
+    def _throttle(self, speed_limit: int) -> Callable[[int], None]:
+        """
+        Returns a function that must be called after each chunk.
+        It sleeps to keep the speed under `speed_limit` MB/s and raises ClipMoveInterrupted if the mover is stopping.
+        """
+        start = time.monotonic()
+        done = 0
+        bytes_per_sec = speed_limit * 1024 ** 2
+
+        def throttle(size: int):
+            nonlocal done
+            done += size
+            if bytes_per_sec:
+                delay = done / bytes_per_sec - (time.monotonic() - start)
+                if delay > 0:
+                    self._stop.wait(delay)
+            if self._stop.is_set():
+                raise ClipMoveInterrupted()
+        return throttle
+
+    @staticmethod
+    def _fsync_folder(folder: str):
+        """
+        Flushes the folder entry (renamed file) on POSIX. On Windows folders can't be opened this way.
+        """
+        if sys.platform == "win32":
+            return
+        fd = os.open(folder, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _load_journal(self):
+        with self._journal_lock:
+            try:
+                with open(self.journal_path, "r", encoding="utf-8") as f:
+                    self._journal = {i["dst"]: i for i in json.load(f)}
+            except FileNotFoundError:
+                self._journal = {}
+            except (OSError, ValueError, KeyError, TypeError):
+                log.error("[%s] Failed to read moves journal %s.", self._worker.name, self.journal_path, exc_info=True)
+                self._journal = {}
+
+    def _save_journal(self):
+        """
+        Writes the journal atomically. Must be called with `_journal_lock` acquired.
+        """
+        os.makedirs(self.journal_path.parent, exist_ok=True)
+        tmp_path = self.journal_path.with_name(self.journal_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(list(self._journal.values()), f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.journal_path)
+
+    def _remove_entry(self, entry: dict):
+        with self._journal_lock:
+            if self._journal.pop(entry["dst"], None) is not None:
+                self._save_journal()
+
+
+# -------------------- remux.py --------------------
+def run_ffmpeg(ffmpeg_path: str, args: list[str], processes: set[subprocess.Popen] | None = None):
+    """
+    Runs ffmpeg with below normal priority and waits for it. Raises RuntimeError if it fails.
+
+    :param ffmpeg_path: ffmpeg executable path.
+    :param args: ffmpeg arguments.
+    :param processes: set the running process is added to (so it can be killed from another thread).
+    """
+    kwargs = {"creationflags": CONSTANTS.BELOW_NORMAL_PRIORITY_CLASS | CONSTANTS.CREATE_NO_WINDOW} \
+        if sys.platform == "win32" else {}
+    process = subprocess.Popen([ffmpeg_path, "-hide_banner", "-nostdin", "-v", "error", *args],
+                               stdin=subprocess.DEVNULL,
+                               stdout=subprocess.DEVNULL,
+                               stderr=subprocess.PIPE,
+                               **kwargs)
+    if sys.platform != "win32":
+        with suppress(OSError):
+            os.setpriority(os.PRIO_PROCESS, process.pid, 10)
+
+    if processes is not None:
+        processes.add(process)
+    try:
+        _, stderr = process.communicate()
+    finally:
+        if processes is not None:
+            processes.discard(process)
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg exited with code {process.returncode}: "
+                           f"{stderr.decode(errors='replace').strip()}")
+
+
+class RemuxPool:
+    """
+    Remuxes clips (stream copy, no re-encoding) to MP4 with ffmpeg subprocesses.
+
+    Up to `max_workers` ffmpeg processes run at the same time with below normal priority.
+    Pending remuxes are saved in the queue file and are resumed on the next start.
+    After the MP4 file is verified (ffmpeg can read it to the end), the source file is deleted,
+    the hard link and the catalog row are moved to the MP4 file.
+    """
+    def __init__(self, ffmpeg_path: str, max_workers: int, queue_path: Path):
+        """
+        :param ffmpeg_path: ffmpeg executable path.
+        :param max_workers: max amount of simultaneous remuxes.
+        :param queue_path: path of the file with pending remuxes.
+        """
+        self.ffmpeg_path = ffmpeg_path
+        self.max_workers = max_workers
+        self.queue_path = queue_path
+        self._executor: ThreadPoolExecutor | None = None
+        self._queue: dict[str, dict] = {}  # {source path: entry}
+        self._queue_lock = Lock()
+        self._processes: set[subprocess.Popen] = set()
+        self._futures: set[Future] = set()
+        self._stop = Event()
+
+    def start(self):
+        """
+        Starts the pool and resumes pending remuxes.
+        """
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="smart_replays_remux")
+        with self._queue_lock:
+            self._queue = self._load_queue()
+        for entry in list(self._queue.values()):
+            log.info("[remux] Resuming remux of %s.", entry["path"])
+            self._submit(entry)
+
+    def stop(self, timeout: float | None = None) -> bool:
+        """
+        Stops running ffmpeg processes (their remuxes stay in the queue) and the pool.
+
+        :param timeout: max time to wait for running remuxes to finish (in seconds), None - no limit.
+        :return: True if the pool threads are finished.
+        """
+        self._stop.set()
+        for process in list(self._processes):
+            with suppress(OSError):
+                process.kill()
+        executor, self._executor = self._executor, None
+        if executor is None:
+            return True
+        executor.shutdown(wait=False, cancel_futures=True)
+        _, not_done = futures_wait(list(self._futures), timeout)
+        return not not_done
+
+    def submit(self, path: Path | str, links_folder: Path | str | None = None, catalog_row: dict | None = None):
+        """
+        Queues a remux.
+
+        :param path: clip path.
+        :param links_folder: folder with a hard link to the clip (the link is moved to the MP4 file).
+        :param catalog_row: catalog row of the clip (the row is moved to the MP4 file).
+        """
+        entry = {
+            "path": str(path),
+            "links_folder": str(links_folder) if links_folder else None,
+            "catalog_row": catalog_row,
+        }
+        with self._queue_lock:
+            self._queue[entry["path"]] = entry
+            self._save_queue()
+        self._submit(entry)
+
+    def _submit(self, entry: dict):
+        """
+        Runs the remux in the pool. If the pool is stopped, the entry stays in the queue until the next start.
+        """
+        executor = self._executor
+        if executor is None or self._stop.is_set():
+            log.info("[remux] Pool is stopped, %s will be remuxed on the next start.", entry["path"])
+            return
+        try:
+            future = executor.submit(self._remux, entry)
+        except RuntimeError:  # shut down after the check
+            log.info("[remux] Pool is stopped, %s will be remuxed on the next start.", entry["path"])
+            return
+        self._futures.add(future)
+        future.add_done_callback(self._futures.discard)
+
+    def _remux(self, entry: dict):
+        src = Path(entry["path"])
+        tmp = src.with_suffix(".mp4.part")
+        if self._stop.is_set():
+            return
+        if not src.exists():
+            log.warning("[remux] %s doesn't exist anymore.", src)
+            self._remove_entry(entry)
+            return
+
+        start = time.perf_counter()
+        try:
+            self._run_ffmpeg(["-y", "-i", str(src), "-map", "0", "-c", "copy",
+                              "-movflags", "+faststart", "-f", "mp4", str(tmp)])
+            self._run_ffmpeg(["-i", str(tmp), "-map", "0", "-c", "copy", "-f", "null", "-"])
+            if not tmp.stat().st_size:
+                raise OSError(f"{tmp} is empty.")
+        except Exception as e:
+            with suppress(OSError):
+                os.remove(tmp)
+            if self._stop.is_set():
+                return  # stays in the queue
+            log.error("[remux] Failed to remux %s: %s", src, e)
+            self._remove_entry(entry)
+            return
+
+        # The clip could be deleted while it was remuxed (e.g. by the retention manager).
+        if not src.exists():
+            log.warning("[remux] %s is deleted while remuxing, the remuxed file is dropped.", src)
+            with suppress(OSError):
+                os.remove(tmp)
+            self._remove_entry(entry)
+            return
+
+        dst = get_name_allocator().claim(src.parent, src.with_suffix(".mp4").name)
+        os.replace(tmp, dst)
+        move_bookmarks(src, dst)
+        self._move_link(src, dst, entry["links_folder"])
+        try:
+            os.remove(src)
+        except OSError as e:
+            # The MP4 is in place, so the entry is removed anyway (otherwise the clip is remuxed again on resume).
+            log.warning("[remux] Failed to delete %s after remuxing: %s", src, e)
+
+        if entry["catalog_row"] is not None:
+            row = {**entry["catalog_row"], "path": str(dst), "size": dst.stat().st_size}
+            if VARIABLES.catalog_writer is not None:
+                VARIABLES.catalog_writer.remove(str(src))
+                VARIABLES.catalog_writer.add(row)
+            if VARIABLES.retention is not None:
+                VARIABLES.retention.on_clip_added(row, replaced_size=entry["catalog_row"].get("size") or 0)
+
+        self._remove_entry(entry)
+        log.info("[remux] %s is remuxed to %s in %.1fs.", src, dst, time.perf_counter() - start)
+
+    @staticmethod
+    def _move_link(src: Path, dst: Path, links_folder: str | None):
+        """
+        Replaces the hard link to `src` in `links_folder` with a hard link to `dst`.
+        """
+        if not links_folder:
+            return
+        if (link := find_hard_link(src, links_folder)) is not None:
+            with suppress(OSError):
+                os.remove(link)
+        try:
+            create_hard_link(dst, links_folder)
+        except OSError as e:
+            log.warning("[remux] Failed to create hard link for %s: %s", dst, e)
+
+    def _run_ffmpeg(self, args: list[str]):
+        run_ffmpeg(self.ffmpeg_path, args, processes=self._processes)
 
-    if not process_handle:
-        raise OSError(f"Process {pid} does not exist.")
+    def _load_queue(self) -> dict[str, dict]:
+        try:
+            with open(self.queue_path, "r", encoding="utf-8") as f:
+                return {i["path"]: i for i in json.load(f)}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, KeyError, TypeError):
+            log.error("[remux] Failed to read remux queue %s.", self.queue_path, exc_info=True)
+            return {}
+
+    def _save_queue(self):
+        """
+        Writes the queue atomically. Must be called with `_queue_lock` acquired.
+        """
+        os.makedirs(self.queue_path.parent, exist_ok=True)
+        tmp_path = self.queue_path.with_name(self.queue_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(list(self._queue.values()), f)
+        os.replace(tmp_path, self.queue_path)
 
-    filename_buffer = ctypes.create_unicode_buffer(260)  # Windows path is 260 characters max.
-    result = ctypes.windll.psapi.GetModuleFileNameExW(process_handle, None, filename_buffer, 260)
-    ctypes.windll.kernel32.CloseHandle(process_handle)
-    if result:
-        return Path(filename_buffer.value)
-    else:
-        raise RuntimeError(f"Cannot get executable path for process {pid}.")
+    def _remove_entry(self, entry: dict):
+        with self._queue_lock:
+            if self._queue.pop(entry["path"], None) is not None:
+                self._save_queue()
 
 
-def play_sound(path: str | Path):
+# -------------------- filename_template.py --------------------
+class FilenameTemplate:
     """
-    Plays sound using windows engine.
+    Filename template compiled into a list of parts:
+    plain text, strftime chunks (one strftime call per chunk) and script variables (%NAME, %SCENE, etc.).
 
-    :param path: path to sound (.wav)
+    Templates are compiled once per template string. Literal text is validated on compiling,
+    so rendering checks only variable values.
     """
-    with suppress(Exception):
-        winsound.PlaySound(str(path), winsound.SND_ASYNC)
+    TEXT = 0
+    TIME = 1
+    VARIABLE = 2
 
+    VARIABLES = ("NAME", "SCENE", "EXE", "DURATION", "SIZE")
+    TIME_DIRECTIVES = "aAwdbBmyYHIpMSfzZjUW"
 
-def get_time_since_last_input() -> int:
+    def __init__(self, template: str, parts: tuple[tuple[int, str], ...]):
+        self.template = template
+        self.parts = parts
+        self.variables = frozenset(value for kind, value in parts if kind == self.VARIABLE)
+
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def compile(template: str) -> "FilenameTemplate":
+        """
+        Compiles template. Raises FilenameTemplateError if template is invalid.
+        """
+        if not template:
+            raise FilenameTemplateError("Template is empty.", 0)
+
+        cls = FilenameTemplate
+        parts = []
+        chunk = []
+        chunk_has_time = False
+
+        def flush_chunk():
+            nonlocal chunk_has_time
+            if chunk:
+                parts.append((cls.TIME if chunk_has_time else cls.TEXT, "".join(chunk)))
+                chunk.clear()
+                chunk_has_time = False
+
+        index = 0
+        while index < len(template):
+            char = template[index]
+            if char != "%":
+                if char in CONSTANTS.FILENAME_PROHIBITED_CHARS:
+                    raise FilenameTemplateError(f"Character {char} is not allowed in file names.", index)
+                chunk.append(char)
+                index += 1
+                continue
+
+            variable = next((i for i in cls.VARIABLES if template.startswith(i, index + 1)), None)
+            if variable is not None:
+                flush_chunk()
+                parts.append((cls.VARIABLE, variable))
+                index += len(variable) + 1
+                continue
+
+            directive = template[index + 1:index + 2]
+            if not directive:
+                raise FilenameTemplateError("Template cannot end with %.", index)
+            if directive not in cls.TIME_DIRECTIVES:
+                raise FilenameTemplateError(f"Unknown variable %{directive}.", index)
+
+            chunk.append(f"%{directive}")
+            chunk_has_time = True
+            index += 2
+
+        flush_chunk()
+        return cls(template, tuple(parts))
+
+    def render(self, dt: datetime, values: dict[str, Any]) -> str:
+        """
+        Generates a file name.
+        Raises ValueError if the value of a used variable is not provided,
+        SyntaxError if a value contains characters that are not allowed in file names.
+
+        :param dt: datetime for time directives.
+        :param values: {variable name: value or function that returns value}.
+                       Functions are called only if the variable is used in the template.
+        """
+        result = []
+        for kind, value in self.parts:
+            if kind == self.TEXT:
+                result.append(value)
+            elif kind == self.TIME:
+                result.append(dt.strftime(value))
+            else:
+                variable_value = values.get(value)
+                if callable(variable_value):
+                    variable_value = variable_value()
+                if variable_value is None:
+                    raise ValueError(f"Value of %{value} is not available.")
+
+                variable_value = str(variable_value)
+                if CONSTANTS.FILENAME_PROHIBITED_CHARS_RE.search(variable_value):
+                    raise SyntaxError(f"Value of %{value} ({variable_value}) contains characters "
+                                      f"that are not allowed in file names.")
+                result.append(variable_value)
+        return "".join(result)
+
+
+# -------------------- bookmarks.py --------------------
+def add_bookmark():
     """
-    Gets the time (in seconds) since the last mouse or keyboard input.
+    Remembers the current moment of the replay buffer. Bookmarks are written to the next saved clip
+    that contains them (see `take_bookmarks`). No I/O is done here.
+    Can only be called using hotkeys.
     """
-    last_input_info = LASTINPUTINFO()
-    last_input_info.cbSize = ctypes.sizeof(LASTINPUTINFO)
-
-    if ctypes.windll.user32.GetLastInputInfo(ctypes.byref(last_input_info)):
-        current_time = ctypes.windll.kernel32.GetTickCount()
-        idle_time_ms = current_time - last_input_info.dwTime
-        return idle_time_ms // 1000
-    return 0
+    if not obs.obs_frontend_replay_buffer_active():
+        return
+    VARIABLES.bookmarks.append(time.monotonic())
+    log.debug("Bookmark is added (%s pending).", len(VARIABLES.bookmarks))
 
 
-def create_hard_link(file_path: Path | str, links_folder: Path | str) -> None:
+def take_bookmarks(duration: int) -> list[float]:
     """
-    Creates a hard link for `file_path`.
+    Removes bookmarks that are in the last `duration` seconds of the buffer and the ones that are already out
+    of the buffer. Must be called in OBS frontend thread.
 
-    :param file_path: Original file path.
-    :param links_folder: Folder where the link will be created.
+    :param duration: clip duration in seconds.
+    :return: taken bookmarks (seconds since the clip start).
     """
-    link_path = Path(links_folder) / Path(file_path).name
-
-    os.makedirs(str(links_folder), exist_ok=True)
-    os.link(str(file_path), link_path)
+    now = time.monotonic()
+    max_age = get_replay_buffer_max_time()
+    taken, kept = [], []
+    for i in VARIABLES.bookmarks:
+        if now - i <= duration:
+            taken.append(round(duration - (now - i), 3))
+        elif now - i <= max_age:
+            kept.append(i)
+    VARIABLES.bookmarks.clear()
+    VARIABLES.bookmarks.extend(kept)
+    return taken
+
+
+def shift_bookmarks(bookmarks: list[float], cut: float) -> list[float]:
+    """
+    Returns bookmarks of the clip after `cut` seconds are cut from its start.
+    """
+    return [round(i - cut, 3) for i in bookmarks if i >= cut]
 
 
-# -------------------- obs_related.py --------------------
-def get_obs_config(section_name: str | None = None,
-                   param_name: str | None = None,
-                   value_type: type[str, int, bool, float] = str,
-                   config_type: ConfigTypes = ConfigTypes.PROFILE):
+def get_bookmarks_path(clip_path: Path | str) -> Path:
     """
-    Gets a value from OBS config.
-    If the value is not set, it will use the default value. If there is no default value, it will return NULL.
-    If section_name or param_name are not specified, returns OBS config obj.
-
-    :param section_name: Section name. If not specified, returns the OBS config.
-    :param param_name: Parameter name. If not specified, returns the OBS config.
-    :param value_type: Type of value (str, int, bool, float).
-    :param config_type: Which config search in? (global / profile / user (obs v31 or higher)
+    Returns the path of the bookmarks file of the clip ("<clip stem>.bookmarks.json").
+    If the clip is renamed (e.g. remuxed under a unique name), the file is moved with `move_bookmarks`.
     """
-    if config_type is ConfigTypes.PROFILE:
-        cfg = obs.obs_frontend_get_profile_config()
-    elif config_type is ConfigTypes.APP:
-        cfg = obs.obs_frontend_get_global_config()
-    else:
-        if CONSTANTS.OBS_VERSION[0] < 31:
-            cfg = obs.obs_frontend_get_global_config()
-        else:
-            cfg = obs.obs_frontend_get_user_config()
+    clip_path = Path(clip_path)
+    return clip_path.with_name(clip_path.stem + CONSTANTS.BOOKMARKS_FILE_SUFFIX)
 
-    if not section_name or not param_name:
-        return cfg
 
-    functions = {
-        str: obs.config_get_string,
-        int: obs.config_get_int,
-        bool: obs.config_get_bool,
-        float: obs.config_get_double
+def write_bookmarks(clip_path: Path, bookmarks: list[float]):
+    """
+    Writes the bookmarks file of the clip (chapters-like list of bookmarks).
+    Runs in the clips worker or clips mover thread.
+    """
+    path = get_bookmarks_path(clip_path)
+    data = {
+        "clip": clip_path.name,
+        "bookmarks": [{"time": i, "title": f"Bookmark {n}"} for n, i in enumerate(sorted(bookmarks), 1)],
     }
-
-    if value_type not in functions.keys():
-        raise ValueError("Unsupported type.")
-
-    return functions[value_type](cfg, section_name, param_name)
+    try:
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, path)
+    except OSError:
+        log.warning("Failed to write bookmarks of %s: %s", clip_path, traceback.format_exc(limit=0))
+        return
+    log.debug("%s bookmarks are written to %s.", len(bookmarks), path)
 
 
-def get_last_replay_file_name() -> str:
+def move_bookmarks(src_clip: Path, dst_clip: Path):
     """
-    Returns the last saved buffer file name.
+    Moves the bookmarks file of `src_clip` to `dst_clip` (if there is one).
     """
-    replay_buffer = obs.obs_frontend_get_replay_buffer_output()
-    cd = obs.calldata_create()
-    proc_handler = obs.obs_output_get_proc_handler(replay_buffer)
-    obs.proc_handler_call(proc_handler, 'get_last_replay', cd)
-    path = obs.calldata_string(cd, 'path')
-    obs.calldata_destroy(cd)
-    obs.obs_output_release(replay_buffer)
-    return path
+    src, dst = get_bookmarks_path(src_clip), get_bookmarks_path(dst_clip)
+    if src == dst:
+        return
+    try:
+        with open(src, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return
+    except (OSError, ValueError):
+        log.warning("Failed to read bookmarks of %s: %s", src_clip, traceback.format_exc(limit=0))
+        return
+
+    data["clip"] = dst_clip.name
+    try:
+        tmp_path = dst.with_name(dst.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, dst)
+        os.remove(src)
+    except OSError:
+        log.warning("Failed to move bookmarks of %s: %s", src_clip, traceback.format_exc(limit=0))
 
 
-def get_current_scene_name() -> str:
+# -------------------- save_buffer.py --------------------
+class ClipSaveJob:
     """
-    Returns the current OBS scene name.
+    Everything that is needed to post-process a saved clip.
+    Planned by the clips worker right after the save request, `replay_path` is set when OBS saves the file.
     """
-    current_scene = obs.obs_frontend_get_current_scene()
-    name = obs.obs_source_get_name(current_scene)
-    obs.obs_source_release(current_scene)
-    return name
-
-
-def get_replay_buffer_max_time() -> int:
+    def __init__(self,
+                 clip_name: str,
+                 dt: datetime,
+                 base_path: Path,
+                 folder: Path,
+                 settings: ScriptSettings,
+                 template_values: dict[str, Any],
+                 filename: str | None = None,
+                 catalog_row: dict | None = None,
+                 trim_to: int | None = None,
+                 bookmarks: list[float] | None = None):
+        """
+        :param clip_name: clip base name.
+        :param dt: the moment of save request.
+        :param base_path: clips base path.
+        :param folder: destination folder.
+        :param settings: settings snapshot at the moment of save request.
+        :param template_values: values of filename template variables (see `FilenameTemplate.render`).
+        :param filename: file name without extension if it could be generated before the file is saved.
+        :param catalog_row: clips catalog row without path and size (see `ClipCatalog.COLUMNS`).
+        :param trim_to: if set, the saved file is trimmed to its last `trim_to` seconds.
+        :param bookmarks: bookmarks in the clip (seconds since the clip start).
+        """
+        self.replay_path: str | None = None
+        self.path: Path | None = None  # final clip path, set when the clip is in its place
+        self.saved_event_at: int | None = None  # time.perf_counter_ns() value of REPLAY_BUFFER_SAVED event
+        self.clip_name = clip_name
+        self.dt = dt
+        self.base_path = base_path
+        self.folder = folder
+        self.settings = settings
+        self.template_values = template_values
+        self.filename = filename
+        self.catalog_row = catalog_row or {}
+        self.trim_to = trim_to
+        self.bookmarks = bookmarks or []
+
+
+def plan_clip_save_job(capture: ClipCapture) -> ClipSaveJob:
     """
-    Returns replay buffer max time from OBS config (in seconds).
+    Generates clip name, destination folder and (if possible) file name and prepares the folder.
+    Runs in the clips worker thread before OBS saves the file.
     """
-    config_mode = get_obs_config("Output", "Mode")
-    if config_mode == "Simple":
-        return get_obs_config("SimpleOutput", "RecRBTime", int)
-    else:
-        return get_obs_config("AdvOut", "RecRBTime", int)
+    settings = capture.settings
+    template_plan = settings.clips_filename_template_plan
+    if template_plan is None:
+        raise ValueError(f"Invalid filename template: {settings.clips_filename_template}")
+
+    with latency_span("name_generation"):
+        clip_name = gen_clip_base_name(capture)
+    template_values = {"NAME": clip_name}
+    if "SCENE" in template_plan.variables:
+        template_values["SCENE"] = capture.scene_name
+    if "EXE" in template_plan.variables:
+        template_values["EXE"] = capture.get_executable().stem
+    if "DURATION" in template_plan.variables:
+        template_values["DURATION"] = capture.duration
+
+    folder = Path(capture.base_path)
+    if settings.clips_save_to_folder:
+        folder = folder / clip_name
+    with latency_span("makedirs"):
+        get_name_allocator().prepare(folder)
+
+    # %SIZE is known only after the file is saved.
+    filename = template_plan.render(capture.dt, template_values) if "SIZE" not in template_plan.variables else None
+    return ClipSaveJob(
+        clip_name=clip_name,
+        dt=capture.dt,
+        base_path=capture.base_path,
+        folder=folder,
+        settings=settings,
+        template_values=template_values,
+        filename=filename,
+        catalog_row={
+            "name": clip_name,
+            "executable": str(capture.executable) if capture.executable is not None else None,
+            "scene": capture.scene_name,
+            "naming_mode": capture.mode.value,
+            "duration": capture.duration,
+            "saved_at": capture.dt.timestamp(),
+        },
+        trim_to=capture.length,
+        bookmarks=capture.bookmarks
+    )
 
 
-def get_base_path(script_settings: Any | None = None) -> Path:
+def submit_clip_planning(mode: ClipNamingModes | None = None, length: int | None = None) -> Future | None:
     """
-    Returns the base path for clips, either from the script settings or OBS config.
+    Captures the clip state and queues clip save job planning in the clips worker.
+    Must be called in OBS frontend thread.
 
-    :param script_settings: Script config. If not provided, base path returns from OBS config.
-    :return: The base path as a `Path` object.
+    :param mode: clip naming mode (None - mode from the settings).
+    :param length: requested clip length in seconds (None - the whole buffer).
+    :return: Future with ClipSaveJob or None if it's failed.
     """
-    if script_settings is not None:
-        script_path = obs.obs_data_get_string(script_settings, PN.PROP_CLIPS_BASE_PATH)
-        # If PN.PROP_CLIPS_BASE_PATH is not saved in the script config, then it has a default value,
-        # which is the value from the OBS config.
-        if script_path:
-            return Path(script_path)
-
-    config_mode = get_obs_config("Output", "Mode")
-    if config_mode == "Simple":
-        return Path(get_obs_config("SimpleOutput", "FilePath"))
-    else:
-        return Path(get_obs_config("AdvOut", "RecFilePath"))
+    try:
+        capture = capture_clip(mode, length)
+    except:
+        log.error("An error occurred while collecting clip data.", exc_info=True)
+        return None
+    return VARIABLES.clips_worker.submit(plan_clip_save_job, capture)
 
 
-def restart_replay_buffering():
+def handle_clip_overlap(job: ClipSaveJob) -> bool:
     """
-    Restarts replay buffering, obviously -_-
+    Compares the clip with the previous one. Clips overlap if the time between saves is less than the clip length.
+
+    If the clip is saved within the merge window after the previous one (and has the same name),
+    its new footage is appended to the previous clip and the clip file is deleted.
+    Otherwise, if overlaps trimming is enabled, the clip is trimmed to the new footage.
+    Runs in the clips worker thread.
+
+    :return: True if the clip is merged into the previous one (nothing left to do with it).
     """
-    _print("Stopping replay buffering...")
-    replay_output = obs.obs_frontend_get_replay_buffer_output()
-    obs.obs_frontend_replay_buffer_stop()
+    previous, VARIABLES.last_clip_job = VARIABLES.last_clip_job, job
+    if previous is None:
+        return False
 
-    while not obs.obs_output_can_begin_data_capture(replay_output, 0):
-        time.sleep(0.1)
-    _print("Replay buffering stopped.")
-    _print("Starting replay buffering...")
-    obs.obs_frontend_replay_buffer_start()
-    _print("Replay buffering started.")
+    gap = round((job.dt - previous.dt).total_seconds())
+    duration = job.catalog_row.get("duration")
+    if duration is None or not 0 < gap < duration:
+        return False
+    log.debug("Clip overlaps with the previous one by %ss.", duration - gap)
+
+    # A clip that is queued for remuxing can't be replaced, the remux pool would delete the merged file.
+    previous_remuxed = previous.settings.clips_remux_to_mp4 and previous.path is not None \
+        and previous.path.suffix.lower() == ".mkv"
+    if gap <= job.settings.clips_merge_window and previous.clip_name == job.clip_name \
+            and previous.path is not None and previous.path.exists() and not previous_remuxed:
+        if merge_clip_files(previous, job, gap, duration):
+            VARIABLES.last_clip_job = previous
+            return True
+
+    if job.settings.clips_trim_overlaps:
+        job.trim_to = gap if job.trim_to is None else min(job.trim_to, gap)
+    return False
 
 
-# -------------------- script_helpers.py --------------------
-def notify(success: bool, clip_path: Path, path_display_mode: PopupPathDisplayModes):
-    """
-    Plays and shows success / failure notification if it's enabled in notifications settings.
+def merge_clip_files(previous: ClipSaveJob, job: ClipSaveJob, gap: int, duration: int) -> bool:
     """
-    sound_notifications = obs.obs_data_get_bool(VARIABLES.script_settings, PN.GR_SOUND_NOTIFICATION_SETTINGS)
-    popup_notifications = obs.obs_data_get_bool(VARIABLES.script_settings, PN.GR_POPUP_NOTIFICATION_SETTINGS)
-    python_exe = os.path.join(get_obs_config("Python", "Path64bit", str, ConfigTypes.USER), "pythonw.exe")
+    Appends the last `gap` seconds of the clip to the previous clip (stream copy), deletes the clip file
+    and updates the previous clip (file, hard link, catalog row, bookmarks).
+    The tail is cut at a keyframe, so a few frames before it can be repeated in the merged clip.
 
-    if path_display_mode == PopupPathDisplayModes.JUST_FILE:
-        clip_path = clip_path.name
-    elif path_display_mode == PopupPathDisplayModes.JUST_FOLDER:
-        clip_path = clip_path.parent.name
-    elif path_display_mode == PopupPathDisplayModes.FOLDER_AND_FILE:
-        clip_path = Path(clip_path.parent.name) / clip_path.name
+    :return: True if the clips are merged.
+    """
+    src = Path(job.replay_path)
+    tail = src.with_name(f"{src.stem}.tail{src.suffix}")
+    concat_list = src.with_name(f"{src.stem}.concat.txt")
+    merged = previous.path.with_name(f"{previous.path.stem}.merge{previous.path.suffix}")
+    ffmpeg_path = job.settings.ffmpeg_path or "ffmpeg"
 
-    if success:
-        if sound_notifications and obs.obs_data_get_bool(VARIABLES.script_settings, PN.PROP_NOTIFY_CLIPS_ON_SUCCESS):
-            path = obs.obs_data_get_string(VARIABLES.script_settings, PN.PROP_NOTIFY_CLIPS_ON_SUCCESS_PATH)
-            play_sound(path)
+    start = time.perf_counter()
+    try:
+        run_ffmpeg(ffmpeg_path, ["-y", "-sseof", f"-{gap}", "-i", str(src), "-map", "0", "-c", "copy",
+                                 "-avoid_negative_ts", "make_zero", str(tail)])
+        with open(concat_list, "w", encoding="utf-8") as f:
+            for i in (previous.path, tail):
+                f.write("file '{}'\n".format(str(i).replace("'", "'\\''")))
+        run_ffmpeg(ffmpeg_path, ["-y", "-f", "concat", "-safe", "0", "-i", str(concat_list),
+                                 "-map", "0", "-c", "copy", str(merged)])
+        if not merged.stat().st_size:
+            raise OSError(f"{merged} is empty.")
+    except Exception as e:
+        log.warning("Failed to merge %s into %s: %s", src, previous.path, e)
+        with suppress(OSError):
+            os.remove(merged)
+        return False
+    finally:
+        for i in (tail, concat_list):
+            with suppress(OSError):
+                os.remove(i)
 
-        if popup_notifications and obs.obs_data_get_bool(VARIABLES.script_settings, PN.PROP_POPUP_CLIPS_ON_SUCCESS):
-            subprocess.Popen([python_exe, __file__, "Clip saved", f"Clip saved to {clip_path}"])
-    else:
-        if sound_notifications and obs.obs_data_get_bool(VARIABLES.script_settings, PN.PROP_NOTIFY_CLIPS_ON_FAILURE):
-            path = obs.obs_data_get_string(VARIABLES.script_settings, PN.PROP_NOTIFY_CLIPS_ON_FAILURE_PATH)
-            play_sound(path)
+    links_folder = previous.settings.clips_links_folder_path if previous.settings.clips_create_links else None
+    link = find_hard_link(previous.path, links_folder) if links_folder else None
+    try:
+        previous_size = previous.path.stat().st_size
+        # Fails if the previous clip is opened (e.g. in a player), then the clip is saved as a separate one.
+        os.replace(merged, previous.path)
+    except OSError as e:
+        log.warning("Failed to replace %s with the merged clip: %s", previous.path, e)
+        with suppress(OSError):
+            os.remove(merged)
+        return False
 
-        if popup_notifications and obs.obs_data_get_bool(VARIABLES.script_settings, PN.PROP_POPUP_CLIPS_ON_FAILURE):
-            subprocess.Popen([python_exe, __file__, "Clip not saved", f"More in the logs.", "#C00000"])
+    try:
+        os.remove(src)
+    except OSError as e:
+        log.warning("Failed to delete %s (it's merged into %s): %s", src, previous.path, e)
+    if link is not None:  # the link still refers to the old file
+        with suppress(OSError):
+            os.remove(link)
+    if links_folder:
+        create_hard_link(previous.path, links_folder)
+
+    previous_duration = previous.catalog_row.get("duration") or 0
+    if job.bookmarks:
+        previous.bookmarks += [previous_duration + i for i in shift_bookmarks(job.bookmarks, duration - gap)]
+        write_bookmarks(previous.path, previous.bookmarks)
+
+    previous.dt = job.dt
+    previous.catalog_row["duration"] = previous_duration + gap
+    record_saved_clip(previous, previous.path, replaced_size=previous_size)
+    log.info("Clip is merged into %s in %.1fs.", previous.path, time.perf_counter() - start)
+    notify(True, previous.path, job.settings, created_at=job.dt.timestamp())
+    return True
 
 
-def load_aliases(script_settings_dict: dict):
+def trim_clip_file(job: ClipSaveJob):
     """
-    Loads aliases to `VARIABLES.aliases`.
-    Raises exception if path or name are invalid.
-
-    :param script_settings_dict: Script settings as dict.
+    Replaces the saved file with its last `job.trim_to` seconds.
+    Streams are copied, so the cut is made at the keyframe before the requested position (the clip can be
+    slightly longer). If ffmpeg fails, the whole clip is kept.
+    Runs in the clips worker thread, before the file is moved (so the mover copies only the trimmed file).
     """
-    _print("Loading aliases...")
+    buffer_length = job.catalog_row.get("duration")
+    if buffer_length is not None and buffer_length < job.trim_to:
+        return
 
-    new_aliases = {}
-    aliases_list = script_settings_dict.get(PN.PROP_ALIASES_LIST)
-    if aliases_list is None:
-        aliases_list = CONSTANTS.DEFAULT_ALIASES
+    src = Path(job.replay_path)
+    tmp = src.with_name(f"{src.stem}.trim{src.suffix}")
+    start = time.perf_counter()
+    try:
+        run_ffmpeg(job.settings.ffmpeg_path or "ffmpeg",
+                   ["-y", "-sseof", f"-{job.trim_to}", "-i", str(src), "-map", "0", "-c", "copy",
+                    "-avoid_negative_ts", "make_zero", str(tmp)])
+        if not tmp.stat().st_size:
+            raise OSError(f"{tmp} is empty.")
+        os.replace(tmp, src)
+    except Exception as e:
+        log.warning("Failed to trim %s to %ss, the whole clip is kept: %s", src, job.trim_to, e)
+        with suppress(OSError):
+            os.remove(tmp)
+        return
+    if buffer_length is not None:
+        job.catalog_row["duration"] = min(buffer_length, job.trim_to)
+        job.bookmarks = shift_bookmarks(job.bookmarks, buffer_length - job.catalog_row["duration"])
+    log.debug("Clip is trimmed to the last %ss in %.1fs.", job.trim_to, time.perf_counter() - start)
 
-    for index, i in enumerate(aliases_list):
-        value = i.get("value")
-        spl = value.split(">", 1)
-        try:
-            path, name = spl[0].strip(), spl[1].strip()
-        except IndexError:
-            raise AliasInvalidFormat(index)
 
-        path = os.path.expandvars(path)
-        if any(i in path for i in CONSTANTS.PATH_PROHIBITED_CHARS) or any(i in name for i in CONSTANTS.FILENAME_PROHIBITED_CHARS):
-            raise AliasInvalidCharacters(index)
+def move_clip_file(job: ClipSaveJob) -> Future:
+    """
+    Renames the clip and moves it to its folder. Creates a hard link if it's enabled.
+    If the folder is on another volume, the clip is copied in the background by the clips mover.
 
-        if Path(path) in new_aliases.keys():
-            raise AliasPathAlreadyExists(index)
+    :return: Future with new clip path.
+    """
+    ext = job.replay_path.split(".")[-1]
+    filename = job.filename
+    if filename is None:
+        replay_path = job.replay_path
+        filename = job.settings.clips_filename_template_plan.render(
+            job.dt, {**job.template_values, "SIZE": lambda: round(os.path.getsize(replay_path) / 1024 ** 2)}
+        )
+    filename += f".{ext}"
+
+    links_folder = job.settings.clips_links_folder_path if job.settings.clips_create_links else None
+
+    if not is_same_volume(job.replay_path, job.folder):
+        log.info("%s is on another volume, the clip will be copied in the background.", job.folder)
+        return VARIABLES.clips_mover.move(job.replay_path, job.folder, filename,
+                                          speed_limit=job.settings.clips_copy_speed_limit,
+                                          links_folder=links_folder,
+                                          context={"catalog_row": job.catalog_row,
+                                                   "bookmarks": job.bookmarks,
+                                                   "remux": job.settings.clips_remux_to_mp4,
+                                                   "created_at": job.dt.timestamp()})
+
+    with latency_span("rename"):
+        new_path = get_name_allocator().move(job.replay_path, job.folder, filename)
+    log.info("Clip is saved: %s", new_path)
+
+    if links_folder:
+        with latency_span("hard_link"):
+            create_hard_link(new_path, links_folder)
+
+    future = Future()
+    future.set_result(new_path)
+    return future
+
+
+def process_clip_save_job(job_future: Future, replay_path: str, saved_event_at: int | None = None):
+    """
+    Moves the clip and notifies about the result (when the clip is in its place).
+    Runs in the clips worker thread, after the job is planned (the worker runs jobs in order).
+
+    :param job_future: Future with planned ClipSaveJob.
+    :param replay_path: path of the file saved by OBS.
+    :param saved_event_at: time.perf_counter_ns() value of REPLAY_BUFFER_SAVED event.
+    """
+    try:
+        job = job_future.result(timeout=0)
+    except:
+        log.error("Clip save job for %s is not planned, the clip is left in the OBS recordings folder.", replay_path)
+        notify(False, Path(), VARIABLES.settings, created_at=time.time())
+        return
 
-        new_aliases[Path(path)] = name
+    job.replay_path = replay_path
+    job.saved_event_at = saved_event_at
+    log.debug("Old clip file path: %s", replay_path)
+    if handle_clip_overlap(job):
+        return
+    if job.trim_to is not None:
+        trim_clip_file(job)
+    try:
+        future = move_clip_file(job)
+    except:
+        log.error("An error occurred while moving file %s to the new destination.", job.replay_path, exc_info=True)
+        notify(False, Path(), job.settings, created_at=job.dt.timestamp())
+        return
 
-    VARIABLES.aliases = new_aliases
-    _print(f"{len(VARIABLES.aliases)} aliases are loaded.")
+    future.add_done_callback(lambda f: on_clip_moved(job, f))
 
 
-# -------------------- clipname_gen.py --------------------
-def gen_clip_base_name(mode: ClipNamingModes | None = None) -> str:
+def on_clip_moved(job: ClipSaveJob, future: Future):
     """
-    Generates the base name of the clip based on the selected naming mode.
-    It does NOT generate a new path for the clip or filename, only its base name.
-
-    :param mode: Clip naming mode. If None, the mode is fetched from the script config.
-                 If a value is provided, it overrides the configs value.
-    :return: The base name of the clip based on the selected naming mode.
+    Notifies about the result of clip moving.
+    Runs in the clips worker or clips mover thread.
     """
-    _print("Generating clip base name...")
-    mode = obs.obs_data_get_int(VARIABLES.script_settings, PN.PROP_CLIPS_NAMING_MODE) if mode is None else mode
-    mode = ClipNamingModes(mode)
+    if future.cancelled():
+        return
 
-    if mode in [ClipNamingModes.CURRENT_PROCESS, ClipNamingModes.MOST_RECORDED_PROCESS]:
-        if mode is ClipNamingModes.CURRENT_PROCESS:
-            _print("Clip file name depends on the name of an active app (.exe file name) at the moment of clip saving.")
-            pid = get_active_window_pid()
-            executable_path = get_executable_path(pid)
-            _print(f"Current active window process ID: {pid}")
-            _print(f"Current active window executable: {executable_path}")
+    if future.exception() is not None:
+        log.error("An error occurred while moving file %s to the new destination: %s", job.replay_path, future.exception())
+        notify(False, Path(), job.settings, created_at=job.dt.timestamp())
+    elif future.result() is not None:
+        links_folder = job.settings.clips_links_folder_path if job.settings.clips_create_links else None
+        finish_clip_save(job, future.result(), job.settings.clips_remux_to_mp4, links_folder)
 
-        else:
-            _print("Clip file name depends on the name of an app (.exe file name) "
-                   "that was active most of the time during the clip recording.")
-            if VARIABLES.clip_exe_history:
-                executable_path = max(VARIABLES.clip_exe_history, key=VARIABLES.clip_exe_history.count)
-            else:
-                executable_path = get_executable_path(get_active_window_pid())
 
-        _print(f'Searching for {executable_path} in aliases list...')
-        if alias := get_alias(executable_path, VARIABLES.aliases):
-            _print(f'Alias found: {alias}.')
-            return alias
-        else:
-            _print(f"{executable_path} or its parents weren't found in aliases list. "
-                   f"Assigning the name of the executable: {executable_path.stem}")
-            return executable_path.stem
+def on_resumed_clip_moved(entry: dict, future: Future):
+    """
+    Finishes processing of a clip whose move is resumed from the clips mover journal.
+    Runs in the clips mover thread.
 
-    else:
-        _print("Clip filename depends on the name of the current scene name.")
-        return get_current_scene_name()
+    :param entry: clips mover journal entry.
+    """
+    context = entry.get("context")
+    if future.cancelled() or context is None:
+        return
 
+    if future.exception() is not None:
+        log.error("An error occurred while moving file %s to the new destination: %s", entry["src"], future.exception())
+    elif future.result() is not None:
+        path = future.result()
+        job = ClipSaveJob(clip_name=context["catalog_row"].get("name") or path.stem,
+                          dt=datetime.fromtimestamp(context["created_at"]),
+                          base_path=path.parent,
+                          folder=path.parent,
+                          settings=VARIABLES.settings,
+                          template_values={},
+                          catalog_row=context["catalog_row"],
+                          bookmarks=context["bookmarks"])
+        job.replay_path = entry["src"]
+        finish_clip_save(job, path, context["remux"], entry["links_folder"])
+
+
+def finish_clip_save(job: ClipSaveJob, path: Path, remux: bool, links_folder: str | None):
+    """
+    Writes bookmarks of the saved clip, adds it to the catalog, queues its remux and notifies about it.
 
-def get_alias(executable_path: str | Path, aliases_dict: dict[Path, str]) -> str | None:
+    :param path: final clip path.
+    :param remux: whether to remux the clip into MP4 (if it's MKV).
+    :param links_folder: folder with the clip hard link (moved along with the remuxed clip), None - no link.
     """
-    Retrieves an alias for the given executable path from the provided dictionary.
+    job.path = path
+    if job.bookmarks:
+        write_bookmarks(path, job.bookmarks)
+    row = record_saved_clip(job, path)
+    if remux and path.suffix.lower() == ".mkv" and VARIABLES.remux_pool is not None:
+        VARIABLES.remux_pool.submit(path, links_folder=links_folder, catalog_row=row)
 
-    The function first checks if the exact `executable_path` exists in `aliases_dict`.
-    If not, it searches for the closest parent directory that is present in the dictionary.
+    # Notification goes last: the clip is already recorded even if it fails.
+    with latency_span("notify"):
+        notify(True, path, job.settings, created_at=job.dt.timestamp())
+    if job.saved_event_at is not None and VARIABLES.latency is not None:
+        VARIABLES.latency.record("total", time.perf_counter_ns() - job.saved_event_at)
 
-    :param executable_path: A file path or string representing the executable.
-    :param aliases_dict: A dictionary where keys are `Path` objects representing executable file paths
-                         or directories, and values are their corresponding aliases.
-    :return: The corresponding alias if found, otherwise `None`.
+
+def record_saved_clip(job: ClipSaveJob, path: Path, replaced_size: int | None = None) -> dict:
     """
-    exe_path = Path(executable_path)
-    if exe_path in aliases_dict:
-        return aliases_dict[exe_path]
+    Queues the clip for adding to the clips catalog and passes it to the retention manager.
 
-    for parent in exe_path.parents:
-        if parent in aliases_dict:
-            return aliases_dict[parent]
+    :param replaced_size: if the clip replaced a clip with the same path (merge), size of the replaced file.
+    :return: catalog row of the clip.
+    """
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        size = None
+    row = {**job.catalog_row, "path": str(path), "size": size}
 
+    if VARIABLES.catalog_writer is not None:
+        VARIABLES.catalog_writer.add(row)
+    if VARIABLES.retention is not None:
+        VARIABLES.retention.on_clip_added(row, replaced_size)
+    return row
 
 
-def gen_filename(base_name: str, template: str, dt: datetime | None = None) -> str:
+def update_remux_pool():
     """
-    Generates a file name based on the template.
-    If the template is invalid or formatting fails, raises ValueError.
-    If the generated name contains prohibited characters, raises SyntaxError.
-
-    :param base_name: Base name for the file.
-    :param template: Template for generating the file name.
-    :param dt: Optional datetime object; uses current time if None.
-    :return: Formatted file name.
+    Starts, restarts (if ffmpeg path or concurrency are changed) or stops the remux pool according to the settings.
+    Pending remuxes of a stopped pool are resumed when it's started again.
     """
-    if not template:
-        raise ValueError
-
-    dt = dt or datetime.now()
-    filename = template.replace("%NAME", base_name)
+    settings = VARIABLES.settings
+    pool = VARIABLES.remux_pool
+    if pool is not None and settings.clips_remux_to_mp4 \
+            and (pool.ffmpeg_path, pool.max_workers) == (settings.ffmpeg_path, settings.clips_remux_concurrency):
+        return
 
-    try:
-        filename = dt.strftime(filename)
-    except Exception as e:
-        _print(f"An error occurred while generating the file name using the template {template}.")
-        _print(traceback.format_exc())
-        raise ValueError from e
+    if pool is not None:
+        pool.stop(timeout=CONSTANTS.REMUX_STOP_TIMEOUT)
+        VARIABLES.remux_pool = None
 
-    if any(i in filename for i in CONSTANTS.FILENAME_PROHIBITED_CHARS):
-        raise SyntaxError
-    return filename
+    if settings.clips_remux_to_mp4:
+        VARIABLES.remux_pool = RemuxPool(ffmpeg_path=settings.ffmpeg_path or "ffmpeg",
+                                         max_workers=max(settings.clips_remux_concurrency, 1),
+                                         queue_path=CONSTANTS.REMUX_QUEUE_PATH)
+        VARIABLES.remux_pool.start()
 
 
-def ensure_unique_filename(file_path: str | Path) -> Path:
+def update_retention():
     """
-    Generates a unique filename by adding a numerical suffix if the file already exists.
-
-    :param file_path: A string or Path object representing the target file.
-    :return: A unique Path object with a modified name if necessary.
+    Starts, reconfigures or stops the retention manager according to the settings.
     """
-    file_path = Path(file_path)
-    parent, stem, suffix = file_path.parent, file_path.stem, file_path.suffix
-    counter = 1
+    settings = VARIABLES.settings
+    if not settings.retention_enabled:
+        if VARIABLES.retention is not None:
+            VARIABLES.retention.stop(timeout=CONSTANTS.WORKERS_DRAIN_TIMEOUT)
+            VARIABLES.retention = None
+        return
 
-    while file_path.exists():
-        file_path = parent / f"{stem} ({counter}){suffix}"
-        counter += 1
+    links_folder = settings.clips_links_folder_path if settings.clips_create_links else None
+    if VARIABLES.retention is None:
+        VARIABLES.retention = RetentionManager(catalog_path=CONSTANTS.CLIPS_CATALOG_PATH,
+                                               queue_size=CONSTANTS.RETENTION_QUEUE_SIZE,
+                                               delete_batch=CONSTANTS.RETENTION_DELETE_BATCH)
+        VARIABLES.retention.start(settings.retention_global_rule, settings.retention_rules,
+                                  settings.retention_favorites_path, links_folder)
+    else:
+        VARIABLES.retention.configure(settings.retention_global_rule, settings.retention_rules,
+                                      settings.retention_favorites_path, links_folder)
 
-    return file_path
 
+class SaveRequest:
+    """
+    Pending request to save the replay buffer with a specific clip naming mode.
+    """
+    __slots__ = ("mode", "pressed_at", "length", "job")
 
-# -------------------- save_buffer.py --------------------
-def move_clip_file(mode: ClipNamingModes | None = None) -> tuple[str, Path]:
-    old_file_path = get_last_replay_file_name()
-    _print(f"Old clip file path: {old_file_path}")
+    def __init__(self, mode: ClipNamingModes | None, pressed_at: float, length: int | None = None):
+        """
+        :param mode: clip naming mode (None - mode from the settings).
+        :param pressed_at: time.monotonic() value of the moment the request was made.
+        :param length: requested clip length in seconds (None - the whole buffer).
+        """
+        self.mode = mode
+        self.pressed_at = pressed_at
+        self.length = length
+        self.job: Future | None = None  # Future with ClipSaveJob planned at the moment of request
 
-    clip_name = gen_clip_base_name(mode)
-    ext = old_file_path.split(".")[-1]
-    filename_template = obs.obs_data_get_string(VARIABLES.script_settings,
-                                                PN.PROP_CLIPS_FILENAME_TEMPLATE)
-    filename = gen_filename(clip_name, filename_template) + f".{ext}"
 
-    new_folder = Path(get_base_path(script_settings=VARIABLES.script_settings))
-    if obs.obs_data_get_bool(VARIABLES.script_settings, PN.PROP_CLIPS_SAVE_TO_FOLDER):
-        new_folder = new_folder / clip_name
+class SaveRequestQueue:
+    """
+    FIFO of pending save requests.
+    Each REPLAY_BUFFER_SAVED event is matched with the oldest pending request.
+    Requests that are not matched in `timeout` seconds (OBS failed to save the buffer) are dropped.
+    """
+    def __init__(self, timeout: float):
+        """
+        :param timeout: max time to wait for REPLAY_BUFFER_SAVED event for a request (in seconds).
+        """
+        self.timeout = timeout
+        self._requests: deque[SaveRequest] = deque()
+        self._last_pressed_at: float | None = None
+        self._lock = Lock()
+
+    def push(self,
+             mode: ClipNamingModes | None,
+             coalesce_interval: float = 0,
+             length: int | None = None) -> SaveRequest | None:
+        """
+        Adds a request.
+
+        :param mode: clip naming mode (None - mode from the settings).
+        :param coalesce_interval: if the previous request was made less than `coalesce_interval` seconds ago,
+                                  the new one is coalesced with it.
+        :param length: requested clip length in seconds (None - the whole buffer).
+        :return: the new request or None if it is coalesced with the previous one.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            if self._last_pressed_at is not None and now - self._last_pressed_at < coalesce_interval:
+                return None
+
+            self._last_pressed_at = now
+            request = SaveRequest(mode, now, length)
+            self._requests.append(request)
+            return request
+
+    def pop(self) -> SaveRequest | None:
+        """
+        Returns the oldest pending request or None if there are no pending requests
+        (buffer is saved not by the script, e.g. by OBS hotkey).
+        """
+        with self._lock:
+            self._expire(time.monotonic())
+            return self._requests.popleft() if self._requests else None
 
-    os.makedirs(str(new_folder), exist_ok=True)
-    new_path = new_folder / filename
-    new_path = ensure_unique_filename(new_path)
-    _print(f"New clip file path: {new_path}")
+    def clear(self):
+        with self._lock:
+            self._requests.clear()
+            self._last_pressed_at = None
 
-    os.rename(old_file_path, str(new_path))
-    _print("Clip file successfully moved.")
-    os.utime(new_folder)
+    def __len__(self):
+        return len(self._requests)
 
-    if obs.obs_data_get_bool(VARIABLES.script_settings, PN.PROP_CLIPS_CREATE_LINKS):
-        links_folder = obs.obs_data_get_string(VARIABLES.script_settings, PN.PROP_CLIPS_LINKS_FOLDER_PATH)
-        create_hard_link(new_path, links_folder)
-    return clip_name, new_path
+    def _expire(self, now: float):
+        while self._requests and now - self._requests[0].pressed_at > self.timeout:
+            request = self._requests.popleft()
+            log.warning("Save request (%s) is not completed in %ss, dropping it.", request.mode, self.timeout)
 
 
-def save_buffer_with_force_mode(mode: ClipNamingModes):
+def save_buffer_with_force_mode(mode: ClipNamingModes | None, length: int | None = None):
     """
     Sends a request to save the replay buffer and setting a specific clip naming mode.
     Can only be called using hotkeys.
+
+    :param mode: clip naming mode (None - mode from the settings).
+    :param length: if set, the clip is trimmed to its last `length` seconds.
     """
     if not obs.obs_frontend_replay_buffer_active():
         return
 
-    if CONSTANTS.CLIPS_FORCE_MODE_LOCK.locked():
+    request = VARIABLES.save_requests.push(mode, VARIABLES.settings.clips_save_coalesce_interval / 1000, length)
+    if request is None:
+        log.debug("Save request (%s) is coalesced with the previous one.", mode)
         return
 
-    CONSTANTS.CLIPS_FORCE_MODE_LOCK.acquire()
-    VARIABLES.force_mode = mode
+    request.job = submit_clip_planning(mode, length)
     obs.obs_frontend_replay_buffer_save()
 
 
 # -------------------- obs_events_callbacks.py --------------------
+@watched_callback()
 def on_buffer_recording_started_callback(event):
     """
     Resets and starts recording executables history.
@@ -1504,57 +5201,92 @@ def on_buffer_recording_started_callback(event):
     if event is not obs.OBS_FRONTEND_EVENT_REPLAY_BUFFER_STARTED:
         return
 
+    on_replay_buffering_restarted()
+    VARIABLES.replay_buffer_started_at = time.monotonic()
+
     # Reset and restart exe history
-    VARIABLES.clip_exe_history = deque([], maxlen=get_replay_buffer_max_time())
-    _print(f"Exe history deque created. Maxlen={VARIABLES.clip_exe_history.maxlen}.")
+    VARIABLES.clip_exe_history = ExeHistory(max_size=get_replay_buffer_max_time())
+    log.debug("Exe history created. Max size=%s.", VARIABLES.clip_exe_history.max_size)
     obs.timer_add(append_clip_exe_history, 1000)
 
     # Start replay buffer auto restart loop.
-    if restart_loop_time := obs.obs_data_get_int(VARIABLES.script_settings, PN.PROP_RESTART_BUFFER_LOOP):
+    if restart_loop_time := VARIABLES.settings.restart_buffer_loop:
         obs.timer_add(restart_replay_buffering_callback, restart_loop_time * 1000)
 
 
+@watched_callback()
 def on_buffer_recording_stopped_callback(event):
     """
     Stops recording executables history.
     Stops replay buffer auto restart loop.
+    Wakes up replay buffering restart (if it's waiting for buffer to stop).
+    Drops pending save requests (they won't be completed).
     """
     if event is not obs.OBS_FRONTEND_EVENT_REPLAY_BUFFER_STOPPED:
         return
 
+    VARIABLES.replay_buffer_stopped_event.set()
+    VARIABLES.replay_buffer_started_at = None
+    if VARIABLES.save_requests is not None:
+        VARIABLES.save_requests.clear()
+
     obs.timer_remove(append_clip_exe_history)
     obs.timer_remove(restart_replay_buffering_callback)
     VARIABLES.clip_exe_history.clear()
+    VARIABLES.bookmarks.clear()
+
+
+@watched_callback()
+def on_profile_changed_callback(event):
+    """
+    Invalidates OBS profile config cache.
+    Replay buffer start is also handled, because OBS applies output settings (replay length, path) on start.
+    """
+    if event not in (obs.OBS_FRONTEND_EVENT_PROFILE_CHANGING,
+                     obs.OBS_FRONTEND_EVENT_PROFILE_CHANGED,
+                     obs.OBS_FRONTEND_EVENT_PROFILE_LIST_CHANGED,
+                     obs.OBS_FRONTEND_EVENT_PROFILE_RENAMED,
+                     obs.OBS_FRONTEND_EVENT_REPLAY_BUFFER_STARTING):
+        return
+
+    if VARIABLES.profile_config is not None:
+        VARIABLES.profile_config.invalidate()
 
 
+@watched_callback()
 def on_buffer_save_callback(event):
+    """
+    Passes the saved file to the clips worker.
+    Clip name and destination are planned at the moment of save request (see `save_buffer_with_force_mode`),
+    if the buffer is saved not by the script, they are planned now.
+    Renaming, moving and notifications are done in the worker, so OBS frontend thread is not blocked by disk I/O.
+    """
     if event is not obs.OBS_FRONTEND_EVENT_REPLAY_BUFFER_SAVED:
         return
 
-    path_display_type = obs.obs_data_get_int(VARIABLES.script_settings,
-                                             PN.PROP_POPUP_PATH_DISPLAY_MODE)
-    path_display_type = PopupPathDisplayModes(path_display_type)
-
-    _print(f"{'SAVING BUFFER':->50}")
+    saved_event_at = time.perf_counter_ns()
+    log.debug("%s", f"{'SAVING BUFFER':->50}")
+
+    job_future = None
+    if request := VARIABLES.save_requests.pop():
+        log.debug("Save request (%s) is completed in %.3fs.", request.mode, time.monotonic() - request.pressed_at)
+        job_future = request.job
+    if job_future is None:
+        job_future = submit_clip_planning(request.mode if request else None, request.length if request else None)
+
+    with latency_span("get_last_replay"):
+        replay_path = get_last_replay_file_name()
+    if job_future is None:
+        log.warning("Clip %s is left in the OBS recordings folder.", replay_path)
+        VARIABLES.clips_worker.submit(notify, False, Path(), VARIABLES.settings, created_at=time.time())
+    elif VARIABLES.clips_worker.submit(process_clip_save_job, job_future, replay_path, saved_event_at) is None:
+        log.warning("Clip %s is left in the OBS recordings folder.", replay_path)
+    else:
+        log.debug("Clip is queued for moving.")
 
-    try:
-        clip_name, path = move_clip_file(mode=VARIABLES.force_mode)
-        if obs.obs_data_get_bool(VARIABLES.script_settings, PN.PROP_RESTART_BUFFER):
-            # IMPORTANT
-            # I don't know why, but it seems like stopping and starting replay buffering should be in the separate thread.
-            # Otherwise it can "stuck" on stopping.
-            Thread(target=restart_replay_buffering, daemon=True).start()
-
-        if VARIABLES.force_mode:
-            VARIABLES.force_mode = None
-            CONSTANTS.CLIPS_FORCE_MODE_LOCK.release()
-
-        notify(True, path, path_display_mode=path_display_type)
-    except:
-        _print("An error occurred while moving file to the new destination.")
-        _print(traceback.format_exc())
-        notify(False, Path(), path_display_mode=path_display_type)
-    _print("-" * 50)
+    if VARIABLES.settings.restart_buffer:
+        start_replay_buffering_restart()
+    log.debug("-" * 50)
 
 
 def on_video_recording_started_callback(event):  # todo: for future updates
@@ -1580,13 +5312,14 @@ def on_video_recording_stopped_callback(event):  # todo: for future updates
 
 
 # -------------------- other_callbacks.py --------------------
+@watched_callback(feature="restart_loop")
 def restart_replay_buffering_callback():
     """
     Restarts replay buffering and adds itself to obs timer.
 
     This callback is only called by the obs timer.
     """
-    _print("Restart replay buffering callback.")
+    log.debug("Restart replay buffering callback.")
     obs.timer_remove(restart_replay_buffering_callback)
 
     replay_length = get_replay_buffer_max_time()
@@ -1595,17 +5328,16 @@ def restart_replay_buffering_callback():
         next_call = int((replay_length - last_input_time) * 1000)
         next_call = next_call if next_call >= 2000 else 2000
 
-        _print(f"Replay length ({replay_length}s) is greater then time since last input ({last_input_time}s). Next call in {next_call / 1000}s.")
+        log.debug("Replay length (%ss) is greater then time since last input (%ss). Next call in %ss.",
+                  replay_length, last_input_time, next_call / 1000)
         obs.timer_add(restart_replay_buffering_callback, next_call)
         return
 
-    # IMPORTANT
-    # I don't know why, but it seems like stopping and starting replay buffering should be in the separate thread.
-    # Otherwise it can "stuck" at stopping state.
-    Thread(target=restart_replay_buffering, daemon=True).start()
+    start_replay_buffering_restart()
     # I don't re-add this callback to timer again, cz it will be automatically added in on buffering start callback.
 
 
+@watched_callback(feature="exe_history")
 def append_clip_exe_history():
     """
     Adds current active executable path in clip exe history.
@@ -1613,7 +5345,7 @@ def append_clip_exe_history():
     with suppress(Exception):
         pid = get_active_window_pid()
         exe = get_executable_path(pid)
-        VARIABLES.clip_exe_history.appendleft(exe)
+        VARIABLES.clip_exe_history.append(exe)
 
 
 def append_video_exe_history():
@@ -1636,11 +5368,23 @@ def load_hotkeys():
          lambda pressed: save_buffer_with_force_mode(ClipNamingModes.MOST_RECORDED_PROCESS) if pressed else None),
 
         (PN.HK_SAVE_BUFFER_MODE_3, "[Smart Replays] Save buffer (active scene)",
-         lambda pressed: save_buffer_with_force_mode(ClipNamingModes.CURRENT_SCENE) if pressed else None)
+         lambda pressed: save_buffer_with_force_mode(ClipNamingModes.CURRENT_SCENE) if pressed else None),
+
+        (PN.HK_SAVE_BUFFER_LAST_15, "[Smart Replays] Save last 15 seconds of buffer",
+         lambda pressed: save_buffer_with_force_mode(None, 15) if pressed else None),
+
+        (PN.HK_SAVE_BUFFER_LAST_30, "[Smart Replays] Save last 30 seconds of buffer",
+         lambda pressed: save_buffer_with_force_mode(None, 30) if pressed else None),
+
+        (PN.HK_SAVE_BUFFER_LAST_60, "[Smart Replays] Save last 60 seconds of buffer",
+         lambda pressed: save_buffer_with_force_mode(None, 60) if pressed else None),
+
+        (PN.HK_ADD_BOOKMARK, "[Smart Replays] Bookmark the moment",
+         lambda pressed: add_bookmark() if pressed else None),
     )
 
     for key_name, key_desc, key_callback in keys:
-        key_id = obs.obs_hotkey_register_frontend(key_name, key_desc, key_callback)
+        key_id = obs.obs_hotkey_register_frontend(key_name, key_desc, watched_callback(name=key_name)(key_callback))
         VARIABLES.hotkey_ids.update({key_name: key_id})
         key_data = obs.obs_data_get_array(VARIABLES.script_settings, key_name)
         obs.obs_hotkey_load(key_id, key_data)
@@ -1649,12 +5393,21 @@ def load_hotkeys():
 
 # -------------------- obs_script_other.py --------------------
 def script_defaults(s):
-    _print("Loading default values...")
+    log.debug("Loading default values...")
     obs.obs_data_set_default_string(s, PN.PROP_CLIPS_BASE_PATH, str(get_base_path()))
     obs.obs_data_set_default_int(s, PN.PROP_CLIPS_NAMING_MODE, ClipNamingModes.CURRENT_PROCESS.value)
     obs.obs_data_set_default_string(s, PN.PROP_CLIPS_FILENAME_TEMPLATE, CONSTANTS.DEFAULT_FILENAME_FORMAT)
     obs.obs_data_set_default_bool(s, PN.PROP_CLIPS_SAVE_TO_FOLDER, True)
     obs.obs_data_set_default_string(s, PN.PROP_CLIPS_LINKS_FOLDER_PATH, str(get_base_path() / '_links'))
+    obs.obs_data_set_default_int(s, PN.PROP_CLIPS_COPY_SPEED_LIMIT, 0)
+    obs.obs_data_set_default_int(s, PN.PROP_CLIPS_SAVE_COALESCE_INTERVAL, 250)
+    obs.obs_data_set_default_int(s, PN.PROP_CLIPS_MERGE_WINDOW, 0)
+    obs.obs_data_set_default_bool(s, PN.PROP_CLIPS_TRIM_OVERLAPS, False)
+    obs.obs_data_set_default_bool(s, PN.GR_RETENTION_SETTINGS, False)
+    obs.obs_data_set_default_string(s, PN.PROP_RETENTION_FAVORITES_PATH, str(get_base_path() / '_favorites'))
+    obs.obs_data_set_default_bool(s, PN.PROP_CLIPS_REMUX_TO_MP4, False)
+    obs.obs_data_set_default_string(s, PN.PROP_FFMPEG_PATH, "ffmpeg")
+    obs.obs_data_set_default_int(s, PN.PROP_CLIPS_REMUX_CONCURRENCY, 1)
 
     # obs.obs_data_set_default_int(s, PN.PROP_VIDEOS_NAMING_MODE, VideoNamingModes.MOST_RECORDED_PROCESS.value)
     # obs.obs_data_set_default_string(s, PN.PROP_VIDEOS_FILENAME_FORMAT, CONSTANTS.DEFAULT_FILENAME_FORMAT)
@@ -1668,6 +5421,12 @@ def script_defaults(s):
 
     obs.obs_data_set_default_int(s, PN.PROP_RESTART_BUFFER_LOOP, 3600)
     obs.obs_data_set_default_bool(s, PN.PROP_RESTART_BUFFER, True)
+    obs.obs_data_set_default_int(s, PN.PROP_RESTART_BUFFER_STOP_TIMEOUT, 10)
+    obs.obs_data_set_default_int(s, PN.PROP_RESTART_BUFFER_STOP_RETRIES, 2)
+    obs.obs_data_set_default_bool(s, PN.PROP_DEBUG_LOGGING, False)
+    obs.obs_data_set_default_bool(s, PN.PROP_LOG_TO_FILE, False)
+    obs.obs_data_set_default_int(s, PN.PROP_CALLBACK_BUDGET, 16)
+    obs.obs_data_set_default_bool(s, PN.PROP_CALLBACK_AUTO_DISABLE, False)
 
     arr = obs.obs_data_array_create()
     for index, i in enumerate(CONSTANTS.DEFAULT_ALIASES):
@@ -1675,34 +5434,72 @@ def script_defaults(s):
         obs.obs_data_array_insert(arr, index, data)
 
     obs.obs_data_set_default_array(s, PN.PROP_ALIASES_LIST, arr)
-    _print("The default values are set.")
+    log.debug("The default values are set.")
 
 
 def script_update(settings):
-    _print("Updating script...")
+    log.debug("Updating script...")
 
     VARIABLES.script_settings = settings
-    _print(obs.obs_data_get_json(VARIABLES.script_settings))
-    _print("Script updated")
+    VARIABLES.settings = ScriptSettings.from_obs_data(settings)
+    update_logging()
+    if VARIABLES.clips_worker is not None:  # script is loaded
+        update_retention()
+        update_remux_pool()
+        VARIABLES.watchdog.configure(VARIABLES.settings.callback_budget, VARIABLES.settings.callback_auto_disable)
+    if log.debug_enabled:
+        log.debug("%s", obs.obs_data_get_json(VARIABLES.script_settings))
+    log.debug("Script updated")
 
 
 def script_save(settings):
-    _print("Saving script...")
+    log.debug("Saving script...")
 
     for key_name in VARIABLES.hotkey_ids:
         k = obs.obs_hotkey_save(VARIABLES.hotkey_ids[key_name])
         obs.obs_data_set_array(settings, key_name, k)
-    _print("Script saved")
+    log.debug("Script saved")
 
 
 def script_load(script_settings):
-    _print("Loading script...")
     VARIABLES.script_settings = script_settings
+    VARIABLES.settings = ScriptSettings.from_obs_data(script_settings)
+    update_logging()
+    log.start()
+    log.debug("Loading script...")
     # VARIABLES.update_available = check_updates(CONSTANTS.VERSION)  # todo: for future updates
 
     json_settings = json.loads(obs.obs_data_get_json(script_settings))
     load_aliases(json_settings)
 
+    VARIABLES.watchdog = CallbackWatchdog(budget_ms=VARIABLES.settings.callback_budget,
+                                          auto_disable=VARIABLES.settings.callback_auto_disable,
+                                          max_overruns=CONSTANTS.WATCHDOG_MAX_OVERRUNS)
+    VARIABLES.watchdog.start()
+    VARIABLES.latency = LatencyRecorder(path=CONSTANTS.LATENCY_LOG_PATH,
+                                        size=CONSTANTS.LATENCY_SPANS_SIZE,
+                                        flush_interval=CONSTANTS.LATENCY_FLUSH_INTERVAL,
+                                        max_file_size=CONSTANTS.LATENCY_LOG_MAX_SIZE)
+    VARIABLES.latency.start()
+    VARIABLES.clips_worker = BackgroundWorker(name="smart_replays_clips",
+                                              max_size=CONSTANTS.CLIPS_QUEUE_SIZE,
+                                              put_timeout=CONSTANTS.CLIPS_QUEUE_PUT_TIMEOUT)
+    VARIABLES.clips_worker.start()
+    VARIABLES.clips_mover = ClipMover(journal_path=CONSTANTS.CLIPS_MOVE_JOURNAL_PATH,
+                                      chunk_size=CONSTANTS.CLIPS_COPY_CHUNK_SIZE,
+                                      queue_size=CONSTANTS.CLIPS_MOVER_QUEUE_SIZE)
+    VARIABLES.catalog_writer = CatalogWriter(path=CONSTANTS.CLIPS_CATALOG_PATH,
+                                             batch_size=CONSTANTS.CATALOG_BATCH_SIZE,
+                                             flush_interval=CONSTANTS.CATALOG_FLUSH_INTERVAL)
+    VARIABLES.catalog_writer.start()
+    update_retention()
+    update_remux_pool()
+    VARIABLES.notification_host = NotificationHostClient()
+    # Resumed moves finish the clip processing, so everything it needs must be ready.
+    VARIABLES.clips_mover.start(on_resumed=on_resumed_clip_moved)
+    VARIABLES.save_requests = SaveRequestQueue(timeout=CONSTANTS.SAVE_REQUEST_TIMEOUT)
+
+    obs.obs_frontend_add_event_callback(on_profile_changed_callback)
     obs.obs_frontend_add_event_callback(on_buffer_save_callback)
     obs.obs_frontend_add_event_callback(on_buffer_recording_started_callback)
     obs.obs_frontend_add_event_callback(on_buffer_recording_stopped_callback)
@@ -1715,14 +5512,56 @@ def script_load(script_settings):
     if obs.obs_frontend_replay_buffer_active():
         on_buffer_recording_started_callback(obs.OBS_FRONTEND_EVENT_REPLAY_BUFFER_STARTED)
 
-    _print("Script loaded.")
+    log.info("Script loaded.")
 
 
 def script_unload():
     obs.timer_remove(append_clip_exe_history)
     obs.timer_remove(restart_replay_buffering_callback)
 
-    _print("Script unloaded.")
+    if VARIABLES.clips_worker is not None:
+        log.debug("Waiting for the clips worker to finish...")
+        VARIABLES.clips_worker.drain(timeout=CONSTANTS.WORKERS_DRAIN_TIMEOUT)
+        VARIABLES.clips_worker = None
+
+    if VARIABLES.clips_mover is not None:
+        VARIABLES.clips_mover.stop(timeout=CONSTANTS.WORKERS_DRAIN_TIMEOUT)
+        VARIABLES.clips_mover = None
+
+    if VARIABLES.remux_pool is not None:
+        VARIABLES.remux_pool.stop(timeout=CONSTANTS.REMUX_STOP_TIMEOUT)
+        VARIABLES.remux_pool = None
+
+    if VARIABLES.catalog_writer is not None:
+        VARIABLES.catalog_writer.stop(timeout=CONSTANTS.WORKERS_DRAIN_TIMEOUT)
+        VARIABLES.catalog_writer = None
+
+    if VARIABLES.retention is not None:
+        VARIABLES.retention.stop(timeout=CONSTANTS.WORKERS_DRAIN_TIMEOUT)
+        VARIABLES.retention = None
+
+    if VARIABLES.latency is not None:
+        VARIABLES.latency.stop(timeout=CONSTANTS.WORKERS_DRAIN_TIMEOUT)
+        VARIABLES.latency = None
+
+    if VARIABLES.watchdog is not None:
+        if log.debug_enabled:
+            log.debug("[watchdog] Callbacks stats: %s", json.dumps(VARIABLES.watchdog.get_stats()))
+        VARIABLES.watchdog.stop(timeout=CONSTANTS.WORKERS_DRAIN_TIMEOUT)
+        VARIABLES.watchdog = None
+
+    if VARIABLES.notification_host is not None:
+        VARIABLES.notification_host.stop(timeout=CONSTANTS.NOTIFICATION_HOST_STOP_TIMEOUT)
+        VARIABLES.notification_host = None
+
+    if VARIABLES.exe_resolver is not None:
+        VARIABLES.exe_resolver.clear()
+
+    if VARIABLES.name_allocator is not None:
+        VARIABLES.name_allocator.clear()
+
+    log.info("Script unloaded.")
+    log.stop(timeout=CONSTANTS.WORKERS_DRAIN_TIMEOUT)
 
 
 def script_description():